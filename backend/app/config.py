@@ -22,11 +22,84 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 # OCR Configuration
 TESSERACT_CMD = os.getenv("TESSERACT_CMD", "/usr/bin/tesseract")
+TESSERACT_TIMEOUT = float(os.getenv("TESSERACT_TIMEOUT", "30"))
+OCR_CPU_THREADS = int(os.getenv("OCR_CPU_THREADS", "10"))
+
+# OCR engine selection: requests pick a speed/accuracy tier (or fall back to
+# OCR_DEFAULT_TIER) and each tier maps to an engine: paddle | onnx | tesseract
+OCR_DEFAULT_TIER = os.getenv("OCR_DEFAULT_TIER", "accurate")
+OCR_TIER_ENGINES = dict(
+    item.split("=", 1)
+    for item in os.getenv("OCR_TIER_ENGINES", "fast=tesseract,balanced=onnx,accurate=paddle").split(",")
+)
+
+# Text-line crops from concurrent requests are recognized in batches of up
+# to OCR_BATCH_MAX_SIZE, waiting at most OCR_BATCH_MAX_WAIT_MS for company
+OCR_BATCH_ENABLED = os.getenv("OCR_BATCH_ENABLED", "true").lower() == "true"
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "16"))
+OCR_BATCH_MAX_WAIT_MS = float(os.getenv("OCR_BATCH_MAX_WAIT_MS", "5"))
+
+# OCR preprocessing: "auto" picks a profile per page from its noise, contrast
+# and skew; a profile name (none | fast_binarize | denoise_binarize |
+# deskew) forces it
+OCR_PREPROCESS_PROFILE = os.getenv("OCR_PREPROCESS_PROFILE", "auto")
+PREPROCESS_NOISE_SIGMA = float(os.getenv("PREPROCESS_NOISE_SIGMA", "4.0"))
+PREPROCESS_MIN_CONTRAST = float(os.getenv("PREPROCESS_MIN_CONTRAST", "0.5"))
+PREPROCESS_DESKEW_MIN_ANGLE = float(os.getenv("PREPROCESS_DESKEW_MIN_ANGLE", "0.5"))
+PREPROCESS_MAX_SKEW = float(os.getenv("PREPROCESS_MAX_SKEW", "10"))
+
+# Text-layer fast path: "auto" reads born-digital text from the PDF and only
+# OCRs scanned pages/regions, "off" always runs OCR
+OCR_TEXT_LAYER_MODE = os.getenv("OCR_TEXT_LAYER_MODE", "auto")
+TEXT_LAYER_MIN_WORDS = int(os.getenv("TEXT_LAYER_MIN_WORDS", "5"))
+TEXT_LAYER_MAX_IMAGE_COVERAGE = float(os.getenv("TEXT_LAYER_MAX_IMAGE_COVERAGE", "0.6"))
+TEXT_LAYER_MIN_REGION_AREA = float(os.getenv("TEXT_LAYER_MIN_REGION_AREA", "0.02"))
+
+# Structured fields (name, course, issuer, date, certificate_id) are only
+# filled when the rule engine's confidence reaches FIELD_MIN_CONFIDENCE
+FIELD_MIN_CONFIDENCE = float(os.getenv("FIELD_MIN_CONFIDENCE", "0.3"))
+
+# QR Detection Configuration
+# "roi" finds finder patterns on the analysis raster (decimated to at most
+# QR_LOCATOR_MAX_DIM) and decodes only those regions, re-rendering them at
+# QR_RERENDER_DPI if needed; pages without candidates skip decoding. "full"
+# runs the decoder over the whole page (original, enhanced, then thresholded)
+QR_DETECTION_MODE = os.getenv("QR_DETECTION_MODE", "roi")
+QR_LOCATOR_MAX_DIM = int(os.getenv("QR_LOCATOR_MAX_DIM", "1200"))
+QR_RERENDER_DPI = int(os.getenv("QR_RERENDER_DPI", "400"))
+
+# QR URL Verification Configuration
+# URLs are checked with async HEAD requests over a pooled client, at most
+# QR_VERIFY_PER_HOST at a time per host; outcomes are cached (failures for
+# less time). URLs of issuers listed in the registry are trusted offline.
+QR_VERIFY_TIMEOUT = float(os.getenv("QR_VERIFY_TIMEOUT", "3"))
+QR_VERIFY_MAX_CONNECTIONS = int(os.getenv("QR_VERIFY_MAX_CONNECTIONS", "20"))
+QR_VERIFY_PER_HOST = int(os.getenv("QR_VERIFY_PER_HOST", "2"))
+QR_VERIFY_CACHE_SIZE = int(os.getenv("QR_VERIFY_CACHE_SIZE", "1024"))
+QR_VERIFY_CACHE_TTL = float(os.getenv("QR_VERIFY_CACHE_TTL", "3600"))  # seconds
+QR_VERIFY_NEGATIVE_TTL = float(os.getenv("QR_VERIFY_NEGATIVE_TTL", "300"))  # seconds
+ISSUER_REGISTRY_PATH = Path(os.getenv("ISSUER_REGISTRY_PATH", str(BASE_DIR / "app" / "assets" / "issuers.json")))
 
 # Logo Detection Configuration
 LOGOS_DIR = BASE_DIR / "app" / "assets" / "logos"
 LOGOS_DIR.mkdir(parents=True, exist_ok=True)
 LOGO_MATCH_THRESHOLD = float(os.getenv("LOGO_MATCH_THRESHOLD", "0.50"))
+# Reference logos are loaded once and kept in memory; LOGOS_DIR is polled
+# every LOGO_RELOAD_INTERVAL seconds for added, changed or removed files
+# (0 disables polling)
+LOGO_RELOAD_INTERVAL = float(os.getenv("LOGO_RELOAD_INTERVAL", "5"))
+# "index" matches ORB descriptors against an LSH index of all logos (lookup
+# cost grows sublinearly with the catalog) and verifies candidates
+# geometrically; "template" runs template matching per logo. Logos with too few
+# keypoints for the index always use template matching. The extracted
+# features are persisted to LOGO_INDEX_PATH so restarts don't recompute them.
+LOGO_MATCHER = os.getenv("LOGO_MATCHER", "index")
+LOGO_INDEX_PATH = Path(os.getenv("LOGO_INDEX_PATH", str(UPLOAD_DIR / "logo_index.npz")))
+
+# Tamper Detection Configuration
+# Block statistics stop after this many milliseconds per page; signals that
+# didn't get to run are left out of the score
+TAMPER_TIME_BUDGET_MS = float(os.getenv("TAMPER_TIME_BUDGET_MS", "250"))
 
 # Trust Scoring Weights
 TRUST_WEIGHTS = {
@@ -37,6 +110,62 @@ TRUST_WEIGHTS = {
     "tamper": float(os.getenv("WEIGHT_TAMPER", "0.25")),
 }
 
+# Analysis Executor Configuration
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", str(min(8, os.cpu_count() or 1))))
+ANALYSIS_EXECUTOR_MODE = os.getenv("ANALYSIS_EXECUTOR_MODE", "thread")  # thread | process
+ANALYSIS_PROCESS_WORKERS = int(os.getenv("ANALYSIS_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+
+# Analyzer Cascade Configuration
+# With the cascade on, metadata, QR and tamper analysis run first; logo
+# detection and then OCR only run while their scores could still change the
+# verdict. Requests can turn it on or off with ?cascade=
+ANALYSIS_CASCADE = os.getenv("ANALYSIS_CASCADE", "false").lower() == "true"
+
+# Startup Warm-up Configuration
+# Models are preloaded in the background at startup; /ready reports 503
+# until the warm-up finishes
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "3"))
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "5"))
+
+# Multi-page Analysis Configuration
+# Pages beyond ANALYSIS_MAX_PAGES are not analyzed (responses report
+# analyzed_pages and add a trust reason); at most PAGE_MAX_CONCURRENCY pages of
+# one upload are rendered and analyzed at a time
+ANALYSIS_MAX_PAGES = int(os.getenv("ANALYSIS_MAX_PAGES", "20"))
+PAGE_MAX_CONCURRENCY = int(os.getenv("PAGE_MAX_CONCURRENCY", "2"))
+
+# Batch Analysis Configuration
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "5000"))
+
+# Job Queue Configuration
+JOB_DB_PATH = UPLOAD_DIR / "jobs.sqlite3"
+JOB_STORAGE_DIR = UPLOAD_DIR / "jobs"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# Result Cache Configuration
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 67108864))  # 64MB default
+RESULT_CACHE_DISK = os.getenv("RESULT_CACHE_DISK", "false").lower() == "true"
+RESULT_CACHE_DIR = UPLOAD_DIR / "cache"
+# Cap on the cache's JSON files; least recently used entries are deleted
+# beyond it (0 = unbounded)
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", 1073741824))  # 1GB default
+
+# Artifact Store Configuration
+# Preview and heatmap are kept WebP-encoded per analysis id (in memory, and
+# next to the result cache's files when RESULT_CACHE_DISK is on) and served
+# from /analyses/{analysis_id}/{artifact}; responses inline them only when
+# asked to (include=preview,heatmap)
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", 67108864))  # 64MB default
+# Cap on the artifact files on disk, like RESULT_CACHE_DISK_MAX_BYTES
+ARTIFACT_STORE_DISK_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_DISK_MAX_BYTES", 1073741824))  # 1GB default
+ARTIFACT_DEFAULT_FORMAT = os.getenv("ARTIFACT_DEFAULT_FORMAT", "webp")  # webp | jpeg | png
+ARTIFACT_DEFAULT_QUALITY = int(os.getenv("ARTIFACT_DEFAULT_QUALITY", "80"))  # also the stored WebP quality
+
 # Environment
 ENV = os.getenv("ENV", "development")
 
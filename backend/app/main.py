@@ -1,14 +1,45 @@
 """
 Main FastAPI application entry point for EduCred.
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import CORS_ORIGINS, API_PREFIX
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the job queue and warm the analyzers up in the background, then
+    release the worker pools and background threads on shutdown.
+    """
+    from app.services.job_queue import get_job_queue
+    from app.services.analysis_executor import shutdown_executor
+    from app.services.warmup import warm_up
+    from app.services.url_verifier import close_url_verifier
+    from app.services.logo_store import shutdown_logo_store
+    from app.ocr_utils import shutdown_ocr_batcher
+
+    get_job_queue().start()
+    warmup_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warmup_task.cancel()
+        await get_job_queue().stop()
+        shutdown_executor()
+        shutdown_ocr_batcher()
+        shutdown_logo_store()
+        await close_url_verifier()
+
+
 app = FastAPI(
     title="EduCred API",
     description="AI-Powered Certificate Authenticity Analyzer",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -29,7 +60,15 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+# Readiness probe: 503 until models are loaded and warmed up
+@app.get("/ready")
+async def ready():
+    from app.services.warmup import get_warmup_state
+    state = get_warmup_state()
+    return JSONResponse(state.to_dict(), status_code=200 if state.ready else 503)
+
 # Import and include routes
-from app.routes import certificate
+from app.routes import certificate, jobs
 app.include_router(certificate.router, prefix=API_PREFIX)
+app.include_router(jobs.router, prefix=API_PREFIX)
 
@@ -1,8 +1,8 @@
 """
 Pydantic models for request/response schemas.
 """
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, PrivateAttr
+from typing import Any, Dict, List, Optional
 
 
 class OCRData(BaseModel):
@@ -12,7 +12,12 @@ class OCRData(BaseModel):
     issuer: str = ""
     date: str = ""
     certificate_id: str = ""
+    field_confidence: Dict[str, float] = {}  # field -> 0..1, for the fields that were found
     raw_text: str = ""
+    source: str = "ocr"  # text_layer | hybrid | ocr
+    engine: str = ""  # OCR engine that ran (empty when the text layer sufficed)
+    preprocess_profile: str = ""  # none | fast_binarize | denoise_binarize | deskew (comma-separated if mixed)
+    preprocess_ms: float = 0.0
 
 
 class MetadataData(BaseModel):
@@ -29,12 +34,17 @@ class QRData(BaseModel):
     found: bool = False
     content: str = ""
     validation: str = "unverifiable"  # valid | invalid | unverifiable
+    issuer: str = ""  # known issuer the URL belongs to (from the issuer registry)
+    source: str = ""  # registry | cache | network; empty if the content isn't a URL
 
 
 class LogoMatch(BaseModel):
     """Logo match result model."""
     name: str
     confidence: float
+    box: List[float] = []  # x0, y0, x1, y1 as fractions of the page size
+    scale: float = 0.0  # page pixels per reference logo pixel, at the analysis resolution
+    page: int = 0  # index of the page the logo was found on
 
 
 class LogoDetectionData(BaseModel):
@@ -43,10 +53,24 @@ class LogoDetectionData(BaseModel):
     flag: bool = False
 
 
+class CopyMoveRegion(BaseModel):
+    """A page region that was copied to another place on the same page."""
+    source: List[float] = []  # x0, y0, x1, y1 as fractions of the page size
+    target: List[float] = []  # where the copy was placed, same units
+    pairs: int = 0  # matched blocks supporting the pair
+
+
 class TamperReport(BaseModel):
     """Tamper detection report model."""
     score: float = 0.0
-    heatmap: str = ""  # base64 encoded image
+    heatmap: str = ""  # base64 encoded PNG, only inlined on request (include=heatmap)
+    grid: List[List[float]] = []  # anomaly 0..1 per page cell, rows top to bottom
+    signals: Dict[str, float] = {}  # strongest robust z-score per signal (noise, ela), copy_move score
+    copy_move: List[CopyMoveRegion] = []  # duplicated regions, strongest first
+    page_scores: List[float] = []  # per page, for multi-page certificates
+    # Heatmap pixels (RGB) and anomaly grid (uint8) for the artifact store;
+    # never serialized
+    _artifacts: Dict[str, Any] = PrivateAttr(default_factory=dict)
 
 
 class TrustEvaluation(BaseModel):
@@ -56,13 +80,47 @@ class TrustEvaluation(BaseModel):
     reasons: List[str] = []
 
 
+class AnalysisDiagnostics(BaseModel):
+    """Where the analysis time went."""
+    feature_maps: Dict[str, float] = {}  # shared page map -> compute time (ms), summed over pages
+
+
 class CertificateAnalysisResponse(BaseModel):
     """Complete certificate analysis response model."""
-    certificate_preview: str = ""  # base64 encoded PNG
+    analysis_id: str = ""  # key of the preview and heatmap artifacts (/analyses/{analysis_id}/...)
+    certificate_preview: str = ""  # base64 encoded PNG, only inlined on request (include=preview)
     ocr: OCRData
     metadata: MetadataData
     qr: QRData
     logo_detection: LogoDetectionData
     tamper_report: TamperReport
     trust_evaluation: TrustEvaluation
-
+    page_count: int = 1
+    analyzed_pages: int = 1  # pages checked: the first ANALYSIS_MAX_PAGES of page_count
+    skipped_stages: List[str] = []  # analyzers that didn't run: not selected, or settled by the cascade
+    diagnostics: AnalysisDiagnostics = AnalysisDiagnostics()
+
+
+class BatchAnalysisItem(BaseModel):
+    """One line of the batch analysis NDJSON stream."""
+    filename: str
+    result: Optional[CertificateAnalysisResponse] = None
+    error: str = ""
+
+
+class JobSubmission(BaseModel):
+    """Response to an asynchronous analysis submission."""
+    job_id: str
+    status: str = "queued"
+
+
+class JobStatus(BaseModel):
+    """Asynchronous analysis job status model."""
+    job_id: str
+    filename: str
+    status: str  # queued | running | done | failed
+    progress: Dict[str, str] = {}  # stage -> pending | running | done | cached | skipped
+    attempts: int = 0
+    error: str = ""
+    created_at: float
+    updated_at: float
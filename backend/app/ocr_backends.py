@@ -0,0 +1,180 @@
+"""
+OCR engine backends.
+Every engine takes a preprocessed grayscale page (or page region) and
+returns its text lines as (box, text, confidence), so the rest of the
+pipeline doesn't care which engine ran. Engines are picked per deployment
+or per request through a speed/accuracy tier (see OCR_TIER_ENGINES):
+
+- paddle: PaddleOCR with batched recognition (most accurate, heaviest)
+- onnx: the PaddleOCR det/cls/rec models on ONNX Runtime CPU, through
+  rapidocr_onnxruntime (optional dependency)
+- tesseract: the Tesseract CLI (lightest, no Python model in memory)
+"""
+import abc
+import csv
+import io
+import os
+import shutil
+import subprocess
+import threading
+from typing import List, Optional
+import cv2
+import numpy as np
+from app.ocr_utils import get_ocr, run_ocr_lines
+from app.utils.line_table import Line
+from app.config import (
+    TESSERACT_CMD, TESSERACT_TIMEOUT, OCR_DEFAULT_TIER, OCR_TIER_ENGINES
+)
+
+try:
+    from rapidocr_onnxruntime import RapidOCR
+except ImportError:
+    RapidOCR = None
+
+
+class OCRBackend(abc.ABC):
+    """Interface of an OCR engine."""
+
+    name = ""
+
+    def available(self) -> bool:
+        """Whether the engine is installed in this deployment."""
+        return True
+
+    def load(self):
+        """Build the engine's models (idempotent); used for warm-up."""
+
+    @abc.abstractmethod
+    def recognize_lines(self, image: np.ndarray) -> List[Line]:
+        """Text lines of a preprocessed grayscale page, in reading order."""
+
+    def recognize(self, image: np.ndarray) -> str:
+        """Text of a preprocessed grayscale page, lines joined with spaces."""
+        return " ".join(text for _, text, _ in self.recognize_lines(image)).strip()
+
+
+class PaddleBackend(OCRBackend):
+    name = "paddle"
+
+    def load(self):
+        get_ocr()
+
+    def recognize_lines(self, image: np.ndarray) -> List[Line]:
+        return run_ocr_lines(image)
+
+
+class OnnxBackend(OCRBackend):
+    name = "onnx"
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return RapidOCR is not None
+
+    def load(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = RapidOCR()
+        return self._engine
+
+    def recognize_lines(self, image: np.ndarray) -> List[Line]:
+        engine = self.load()
+        img = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        result, _ = engine(img)
+        if not result:
+            return []
+        return [(box, text, float(score)) for box, text, score in result]
+
+
+class TesseractBackend(OCRBackend):
+    name = "tesseract"
+
+    def available(self) -> bool:
+        return shutil.which(TESSERACT_CMD) is not None
+
+    def recognize_lines(self, image: np.ndarray) -> List[Line]:
+        ok, png = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Could not encode page for Tesseract")
+        # Requests already run in parallel; keep each Tesseract single-threaded
+        env = dict(os.environ, OMP_THREAD_LIMIT="1")
+        completed = subprocess.run(
+            [TESSERACT_CMD, "stdin", "stdout", "-l", "eng", "--psm", "3", "tsv"],
+            input=png.tobytes(),
+            capture_output=True,
+            timeout=TESSERACT_TIMEOUT,
+            env=env,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.decode("utf-8", errors="replace").strip())
+        return self._parse_tsv(completed.stdout.decode("utf-8", errors="replace"))
+
+    @staticmethod
+    def _parse_tsv(tsv: str) -> List[Line]:
+        """Group Tesseract's word rows into lines with a box and mean confidence."""
+        lines = {}
+        reader = csv.DictReader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE)
+        for row in reader:
+            text = (row.get("text") or "").strip()
+            if row.get("level") != "5" or not text:
+                continue
+            left, top = int(row["left"]), int(row["top"])
+            right, bottom = left + int(row["width"]), top + int(row["height"])
+            key = (row["page_num"], row["block_num"], row["par_num"], row["line_num"])
+            if key not in lines:
+                lines[key] = [[left, top, right, bottom], [], []]
+            box, words, confidences = lines[key]
+            box[0], box[1] = min(box[0], left), min(box[1], top)
+            box[2], box[3] = max(box[2], right), max(box[3], bottom)
+            words.append(text)
+            confidences.append(max(0.0, float(row["conf"])) / 100)
+        # Dicts keep insertion order, which is Tesseract's reading order
+        return [
+            (tuple(box), " ".join(words), sum(confidences) / len(confidences))
+            for box, words, confidences in lines.values()
+        ]
+
+
+_backends = {
+    backend.name: backend
+    for backend in (PaddleBackend(), OnnxBackend(), TesseractBackend())
+}
+DEFAULT_ENGINE = PaddleBackend.name
+
+
+def get_backend(engine: str) -> OCRBackend:
+    """Backend by engine name."""
+    try:
+        return _backends[engine]
+    except KeyError:
+        raise ValueError(f"Unknown OCR engine: {engine}")
+
+
+def resolve_engine(tier: Optional[str] = None) -> str:
+    """
+    Engine for a speed/accuracy tier (the deployment default if None).
+    Engines that aren't installed fall back to PaddleOCR.
+
+    Raises:
+        ValueError: If the tier is unknown
+    """
+    tier = tier or OCR_DEFAULT_TIER
+    if tier not in OCR_TIER_ENGINES:
+        raise ValueError(f"Unknown OCR tier: {tier} (expected one of {', '.join(OCR_TIER_ENGINES)})")
+    engine = OCR_TIER_ENGINES[tier]
+    if not get_backend(engine).available():
+        print(f"OCR engine {engine} is not installed, using {DEFAULT_ENGINE}")
+        return DEFAULT_ENGINE
+    return engine
+
+
+def run_ocr_engine(image: np.ndarray, engine: str = DEFAULT_ENGINE) -> List[Line]:
+    """Run OCR on a preprocessed page with the given engine; errors yield no lines."""
+    try:
+        return get_backend(engine).recognize_lines(image)
+    except Exception as e:
+        print(f"OCR error ({engine}): {str(e)}")
+        return []
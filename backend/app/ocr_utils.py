@@ -2,15 +2,26 @@
 OCR utilities using PaddleOCR for high-accuracy text extraction.
 Lazy initialization is used so app startup stays fast.
 """
-import fitz  # PyMuPDF
 import numpy as np
 import cv2
 from paddleocr import PaddleOCR
-from PIL import Image
-import io
+import threading
+from app.config import (
+    OCR_CPU_THREADS, OCR_BATCH_ENABLED, OCR_BATCH_MAX_SIZE, OCR_BATCH_MAX_WAIT_MS
+)
+from app.utils.page_raster import PageRaster
+from app.services.pdf_document import PdfDocumentSession
+from app.services.ocr_batcher import OCRBatcher
+from app.utils.ocr_preprocess import denoise_binarize
 
 # Lazy-initialized OCR instance (created on first use instead of import time)
 _ocr = None
+# PaddleOCR predictors are not safe to call from several threads at once;
+# with batching on, recognition only ever runs on the batcher thread and
+# this lock guards detection
+_ocr_lock = threading.Lock()
+# Lazy-initialized recognition batcher
+_batcher = None
 
 
 def get_ocr():
@@ -20,49 +31,157 @@ def get_ocr():
   """
   global _ocr
   if _ocr is None:
-      # use_gpu=False is usually more stable on Windows laptops
-      _ocr = PaddleOCR(use_angle_cls=True, lang="en", use_gpu=False)
+      with _ocr_lock:
+          if _ocr is None:
+              # use_gpu=False is usually more stable on Windows laptops
+              _ocr = PaddleOCR(
+                  use_angle_cls=True, lang="en", use_gpu=False,
+                  cpu_threads=OCR_CPU_THREADS,
+                  # Let a whole micro-batch through the predictors in one go
+                  rec_batch_num=OCR_BATCH_MAX_SIZE,
+                  cls_batch_num=OCR_BATCH_MAX_SIZE,
+              )
   return _ocr
 
 
+def get_ocr_batcher():
+    """Get the singleton recognition batcher, created on first call."""
+    global _batcher
+    if _batcher is None:
+        with _ocr_lock:
+            if _batcher is None:
+                _batcher = OCRBatcher(
+                    recognize_lines,
+                    max_batch_size=OCR_BATCH_MAX_SIZE,
+                    max_wait_ms=OCR_BATCH_MAX_WAIT_MS,
+                )
+    return _batcher
+
+
+def shutdown_ocr_batcher():
+    """Stop the batcher thread (called on application shutdown)."""
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
+
+
 def pdf_to_images(file_bytes):
-    """Convert PDF pages to high-quality PNG images."""
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    images = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=300)
-        images.append(pix.pil_tobytes(format="PNG"))
-    doc.close()
-    return images
-
-
-def preprocess_image(image_bytes):
-    """Preprocessing steps for maximizing OCR accuracy."""
-    img = Image.open(io.BytesIO(image_bytes))
-    img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    # Bilateral filter for noise reduction while preserving edges
-    gray = cv2.bilateralFilter(gray, 11, 17, 17)
-    # Otsu thresholding for optimal binarization
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return thresh
-
-
-def run_ocr(image_bytes):
-    """Execute OCR on a preprocessed image using PaddleOCR."""
+    """
+    Render PDF pages to high-quality page rasters (300 DPI), one at a time.
+    Pages are yielded as they're rendered so only one is held at once.
+    """
+    with PdfDocumentSession(file_bytes) as session:
+        yield from session.render_pages(dpi=300)
+
+
+def preprocess_image(image):
+    """
+    Full denoise + binarize preprocessing. The analysis pipeline picks a
+    cheaper profile per page instead (see app.utils.ocr_preprocess).
+    """
+    return denoise_binarize(PageRaster.from_any(image).gray)
+
+
+def sort_text_boxes(boxes):
+    """Order detected line boxes top to bottom, then left to right within a line."""
+    boxes = sorted(boxes, key=lambda b: (b[0][1], b[0][0]))
+    # Boxes whose tops are within a few pixels belong to the same line
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_text_line(img, box):
+    """Perspective-crop one detected (possibly rotated) text line to an upright strip."""
+    points = np.asarray(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(
+        img, matrix, (width, height),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC,
+    )
+    # Vertical strips are lines of rotated text
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def detect_text_lines(img):
+    """
+    Run text detection on a page.
+
+    Returns:
+        (boxes, crops): detected line quadrilaterals in reading order and
+        their upright crops
+    """
+    ocr = get_ocr()
+    with _ocr_lock:
+        boxes, _ = ocr.text_detector(img)
+    if boxes is None or len(boxes) == 0:
+        return [], []
+    boxes = sort_text_boxes(list(boxes))
+    return boxes, [crop_text_line(img, box) for box in boxes]
+
+
+def recognize_lines(crops):
+    """Angle-classify and recognize a batch of line crops (batcher thread only)."""
+    ocr = get_ocr()
+    if ocr.use_angle_cls:
+        crops, _, _ = ocr.text_classifier(crops)
+    results, _ = ocr.text_recognizer(crops)
+    return results
+
+
+def run_ocr_lines(img):
+    """
+    Execute OCR on a preprocessed (grayscale) image using PaddleOCR.
+
+    Returns:
+        List of (box, text, confidence) per text line, box being the four
+        corner points of the line
+    """
     try:
-        img = preprocess_image(image_bytes)
+        if OCR_BATCH_ENABLED:
+            return _run_ocr_batched(img)
+
         ocr = get_ocr()
-        result = ocr.ocr(img, cls=True)
+        with _ocr_lock:
+            result = ocr.ocr(img, cls=True)
         
-        text = ""
+        lines = []
         if result and result[0]:
             for line in result[0]:
                 if line and len(line) > 1:
-                    text += line[1][0] + " "
+                    lines.append((line[0], line[1][0], line[1][1]))
         
-        return text.strip()
+        return lines
     except Exception as e:
         print(f"OCR error: {str(e)}")
-        return ""
+        return []
+
+
+def run_ocr(img):
+    """Execute OCR on a preprocessed (grayscale) image and return its text."""
+    return " ".join(text for _, text, _ in run_ocr_lines(img)).strip()
+
 
+def _run_ocr_batched(img):
+    """Detect lines here, recognize them through the shared batcher."""
+    # The predictors expect 3-channel input, as PaddleOCR.ocr does for us
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    boxes, crops = detect_text_lines(img)
+    results = get_ocr_batcher().recognize(crops)
+    drop_score = get_ocr().drop_score
+    return [
+        (box, text, score)
+        for box, (text, score) in zip(boxes, results)
+        if score >= drop_score
+    ]
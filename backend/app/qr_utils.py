@@ -1,25 +1,60 @@
 """
 QR code detection utilities using OpenCV QRCodeDetector (no external DLLs).
+
+Rather than running the decoder over the whole page (several times, with
+different enhancements), finder patterns - the three nested squares in a QR
+code's corners - are located on the low-resolution analysis raster (larger
+images are decimated first) with contour and area-ratio tests, and only
+those regions are decoded, upscaled, or re-rendered from the PDF at a higher
+DPI if that fails.
+Pages without candidate regions never reach the decoder.
 """
+import math
+from typing import Callable, List, Optional, Tuple
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import fitz
+import threading
+from app.config import QR_DETECTION_MODE, QR_LOCATOR_MAX_DIM
+from app.utils.page_raster import PageRaster
+from app.services.pdf_document import PdfDocumentSession
+
+# (x0, y0, x1, y1) in page raster pixels
+Region = Tuple[int, int, int, int]
+# Renders a page region at a higher resolution than the analysis raster
+RegionRenderer = Callable[[Region], PageRaster]
+
+# A finder pattern is three nested squares 7, 5 and 3 modules wide, so each
+# contour encloses (7/5)^2 and (5/3)^2 times the area of the next one in
+FINDER_AREA_RATIOS = ((7 / 5) ** 2, (5 / 3) ** 2)
+FINDER_RATIO_TOLERANCE = math.log(2.0)  # accepted log-deviation from those ratios
+FINDER_MIN_SIDE = 6  # pixels, on the locator copy
+# Finder centres of one code are at most this many finder widths apart
+# (about version 20)
+FINDER_MAX_SPREAD = 14
+QR_MAX_REGIONS = 6
+# Crops are upscaled until their shorter side is at least this many pixels
+QR_MIN_DECODE_SIDE = 400
+
+# One detector per analysis thread (QRCodeDetector keeps internal state)
+_local = threading.local()
+
 
-# Initialize one detector to reuse
-qr_detector = cv2.QRCodeDetector()
+def get_qr_detector():
+    """Get the QR detector for the current thread, created on first use."""
+    detector = getattr(_local, "qr_detector", None)
+    if detector is None:
+        detector = cv2.QRCodeDetector()
+        _local.qr_detector = detector
+    return detector
 
 
 def pdf_to_images_for_qr(file_bytes):
-    """Convert PDF pages into images for QR detection."""
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    images = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=300)
-        images.append(pix.pil_tobytes(format="PNG"))
-    doc.close()
-    return images
+    """
+    Render PDF pages into page rasters for QR detection (300 DPI), yielding
+    one page at a time instead of holding the whole document in memory.
+    """
+    with PdfDocumentSession(file_bytes) as session:
+        yield from session.render_pages(dpi=300)
 
 
 def enhance_for_qr(img):
@@ -48,46 +83,216 @@ def enhance_for_qr(img):
     return blur
 
 
-def decode_qr_from_image(image_bytes):
-    """Detect and decode QR code from image using OpenCV QRCodeDetector."""
-    try:
-        pil_img = Image.open(io.BytesIO(image_bytes))
-        img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-
-        qr_results = []
-
-        # Attempt 1: original image
-        decoded = decode_with_detector(img)
-        if decoded:
-            qr_results.extend(decoded)
-
-        # Attempt 2: enhanced image
-        if not qr_results:
-            enhanced = enhance_for_qr(img)
-            decoded = decode_with_detector(enhanced)
-            if decoded:
-                qr_results.extend(decoded)
-
-        # Attempt 3: adaptive threshold
-        if not qr_results:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-            )
-            decoded = decode_with_detector(thresh)
-            if decoded:
-                qr_results.extend(decoded)
-
-        return qr_results
+def find_finder_patterns(binary: np.ndarray) -> np.ndarray:
+    """
+    Boxes (x, y, w, h) of finder-pattern candidates in a binary image (ink
+    255). Candidates are contours with a child and a grandchild; the area,
+    squareness and nesting-ratio tests run on all of them at once.
+    """
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    empty = np.empty((0, 4), dtype=np.int32)
+    if hierarchy is None:
+        return empty
+    first_child = hierarchy[0][:, 2]
+    has_child = first_child >= 0
+    grandchild = np.where(has_child, first_child[np.where(has_child, first_child, 0)], -1)
+    outer = np.nonzero(grandchild >= 0)[0]
+    if outer.size == 0:
+        return empty
+
+    boxes = np.array([cv2.boundingRect(contours[i]) for i in outer], dtype=np.int32).reshape(-1, 4)
+    nested = np.concatenate([outer, first_child[outer], grandchild[outer]])
+    areas = np.array([cv2.contourArea(contours[i]) for i in nested], dtype=np.float64).reshape(3, -1)
+    areas = np.maximum(areas, 1.0)
+
+    widths, heights = boxes[:, 2], boxes[:, 3]
+    keep = (
+        (np.minimum(widths, heights) >= FINDER_MIN_SIDE)
+        & (np.maximum(widths, heights) <= 2 * np.minimum(widths, heights))
+        # A square (even seen at an angle) fills most of its bounding box
+        & (areas[0] >= 0.5 * widths * heights)
+        & (np.abs(np.log(areas[0] / areas[1] / FINDER_AREA_RATIOS[0])) <= FINDER_RATIO_TOLERANCE)
+        & (np.abs(np.log(areas[1] / areas[2] / FINDER_AREA_RATIOS[1])) <= FINDER_RATIO_TOLERANCE)
+    )
+    return boxes[keep]
+
+
+def group_finder_patterns(boxes: np.ndarray, width: int, height: int) -> List[Region]:
+    """
+    Group finder patterns of similar size that are close enough to belong to
+    one code, and return the region each group's code can occupy, largest
+    groups first.
+    """
+    if len(boxes) == 0:
+        return []
+    centers = boxes[:, :2] + boxes[:, 2:] / 2
+    sizes = boxes[:, 2:].max(axis=1).astype(np.float64)
+    distances = np.linalg.norm(centers[:, None, :] - centers[None, :, :], axis=2)
+    similar = np.maximum(sizes[:, None], sizes[None, :]) <= 1.6 * np.minimum(sizes[:, None], sizes[None, :])
+    linked = similar & (distances <= FINDER_MAX_SPREAD * np.maximum(sizes[:, None], sizes[None, :]))
+
+    # Connected components of the link graph (a handful of nodes)
+    labels = np.full(len(boxes), -1)
+    for start in range(len(boxes)):
+        if labels[start] >= 0:
+            continue
+        labels[start] = start
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in np.nonzero(linked[node] & (labels < 0))[0]:
+                labels[neighbour] = start
+                stack.append(neighbour)
+
+    regions = []
+    for label in np.unique(labels):
+        members = np.nonzero(labels == label)[0]
+        size = sizes[members].max()
+        x0, y0 = boxes[members, :2].min(axis=0)
+        x1, y1 = (boxes[members, :2] + boxes[members, 2:]).max(axis=0)
+        if len(members) >= 3:
+            # Three corners found: the code is their bounding box
+            margin = size * 0.5
+        elif len(members) == 2:
+            # Two corners: the code extends as far again to one side
+            margin = max(x1 - x0, y1 - y0)
+        else:
+            # A single corner: allow for a large code on any side of it
+            margin = size * 8
+        region = (
+            int(max(0, x0 - margin)), int(max(0, y0 - margin)),
+            int(min(width, x1 + margin)), int(min(height, y1 + margin)),
+        )
+        regions.append((len(members), region))
+    regions.sort(key=lambda item: item[0], reverse=True)
+    return [region for _, region in regions[:QR_MAX_REGIONS]]
+
+
+def locate_qr_regions(gray: np.ndarray, max_dim: int = QR_LOCATOR_MAX_DIM) -> List[Region]:
+    """Candidate QR code regions of a grayscale page, in its own pixel coordinates."""
+    height, width = gray.shape[:2]
+    scale = min(1.0, max_dim / max(height, width))
+    small = gray
+    if scale < 1.0:
+        small = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    # Local threshold: codes on tinted backgrounds still separate, and the
+    # offset keeps paper grain and scan noise from becoming contours
+    binary = cv2.adaptiveThreshold(
+        small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 51, 20
+    )
+    boxes = find_finder_patterns(binary)
+    regions = group_finder_patterns(boxes, small.shape[1], small.shape[0])
+    return [
+        (int(x0 / scale), int(y0 / scale), int(math.ceil(x1 / scale)), int(math.ceil(y1 / scale)))
+        for x0, y0, x1, y1 in regions
+    ]
+
 
+def page_qr_regions(raster: PageRaster) -> List[Region]:
+    """Candidate QR code regions of a page raster, located once and shared."""
+    return raster.feature("qr_regions", lambda: locate_qr_regions(raster.gray))
+
+
+def _decode_crop(crop: np.ndarray, origin: Tuple[float, float], scale: float) -> list:
+    """
+    Decode a crop (upscaled if small, then also Otsu-thresholded) and map
+    the result rectangles back to page coordinates; scale is crop pixels
+    per page pixel.
+    """
+    short_side = min(crop.shape[:2])
+    if short_side == 0:
+        return []
+    if short_side < QR_MIN_DECODE_SIDE:
+        factor = min(4.0, QR_MIN_DECODE_SIDE / short_side)
+        crop = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+        scale *= factor
+
+    results = decode_with_detector(crop)
+    if not results:
+        _, binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        results = decode_with_detector(binary)
+    for result in results:
+        rect = result["rect"]
+        result["rect"] = {
+            "left": origin[0] + rect["left"] / scale,
+            "top": origin[1] + rect["top"] / scale,
+            "width": rect["width"] / scale,
+            "height": rect["height"] / scale,
+        }
+    return results
+
+
+def decode_qr_regions(
+    gray: np.ndarray,
+    render_region: Optional[RegionRenderer] = None,
+    regions: Optional[List[Region]] = None,
+) -> list:
+    """
+    Decode QR codes found by the locator (or in regions, when the caller
+    already located them). Each region is decoded from the page raster,
+    then from a higher-resolution rendering if render_region is given and
+    the raster wasn't sharp enough.
+    """
+    qr_results = []
+    if regions is None:
+        regions = locate_qr_regions(gray)
+    for region in regions:
+        x0, y0, x1, y1 = region
+        decoded = _decode_crop(gray[y0:y1, x0:x1], (x0, y0), 1.0)
+        if not decoded and render_region is not None:
+            try:
+                sharper = render_region(region)
+                decoded = _decode_crop(sharper.gray, (x0, y0), sharper.width / max(1, x1 - x0))
+            except Exception as e:
+                print(f"QR region re-render error: {str(e)}")
+        qr_results.extend(decoded)
+    return qr_results
+
+
+def decode_qr_from_image(image, render_region: Optional[RegionRenderer] = None):
+    """
+    Detect and decode QR codes in a page using OpenCV QRCodeDetector.
+
+    Args:
+        image: Page raster (PIL images and arrays are also accepted)
+        render_region: Optional callback rendering a raster region of the
+            page at a higher DPI, used when a located code can't be decoded
+            from the raster itself
+    """
+    try:
+        # The detector works on grayscale internally, so share the page's gray copy
+        raster = PageRaster.from_any(image)
+        if QR_DETECTION_MODE == "full":
+            return decode_full_page(raster.gray)
+        return decode_qr_regions(raster.gray, render_region, page_qr_regions(raster))
     except Exception as e:
         print(f"QR decoding error: {str(e)}")
         return []
 
 
+def decode_full_page(gray: np.ndarray) -> list:
+    """Run the decoder on the whole page: original, enhanced, then thresholded."""
+    # Attempt 1: original image
+    qr_results = decode_with_detector(gray)
+
+    # Attempt 2: enhanced image
+    if not qr_results:
+        qr_results = decode_with_detector(enhance_for_qr(gray))
+
+    # Attempt 3: adaptive threshold
+    if not qr_results:
+        thresh = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        )
+        qr_results = decode_with_detector(thresh)
+
+    return qr_results
+
+
 def decode_with_detector(image):
     """Helper to decode QR using OpenCV detector and format results."""
     results = []
+    qr_detector = get_qr_detector()
     try:
         # Try multi detection first
         retval, decoded_info, points, _ = qr_detector.detectAndDecodeMulti(image)
@@ -102,7 +307,7 @@ def decode_with_detector(image):
                     })
         else:
             # Fallback to single detection
-            data, pts = qr_detector.detectAndDecode(image)
+            data, pts, _ = qr_detector.detectAndDecode(image)
             if data:
                 rect = points_to_rect(pts)
                 results.append({
@@ -1,26 +1,92 @@
 """
 Certificate analysis & hashing routes - unified module
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional
 from app.models.schemas import CertificateAnalysisResponse
-from app.services.pdf_to_png import convert_pdf_to_png
-from app.services.ocr_extraction import extract_ocr_data
-from app.services.metadata_parser import parse_metadata
-from app.services.qr_verification import verify_qr_code
-from app.services.logo_detection import detect_logos
-from app.services.tamper_detection import detect_tampering
-from app.services.trust_scoring import calculate_trust_score
-from app.services.blockchain_hash import generate_sha256_hash
-
-import base64
-import io
-from PIL import Image
+from app.services.analysis_executor import run_blocking
+from app.services.analysis_pipeline import (
+    analyze_pdf, analyze_batch, extract_document_text, AnalysisError, ANALYZERS
+)
+from app.services.pdf_document import PdfDocumentSession
+from app.services.blockchain_hash import generate_sha256_hash, generate_fields_hash
+from app.services.field_extraction import FIELDS
+from app.services.result_cache import get_result_cache
+from app.services.artifact_store import (
+    get_artifact_store, decode_artifact, render_artifact, ARTIFACTS, IMAGE_FORMATS, GRID_FORMAT
+)
+from app.ocr_utils import get_ocr_batcher
+from app.ocr_backends import resolve_engine
+from app.config import (
+    RESULT_CACHE_ENABLED, MAX_UPLOAD_SIZE, BATCH_MAX_FILES, OCR_BATCH_ENABLED,
+    ARTIFACT_DEFAULT_FORMAT, ARTIFACT_DEFAULT_QUALITY, ANALYSIS_CASCADE
+)
+
+import threading
+import zipfile
 
 router = APIRouter(tags=["certificate"])
 
 
+def ocr_engine_param(
+    ocr_tier: Optional[str] = Query(
+        None, description="OCR speed/accuracy tier: fast, balanced or accurate"
+    ),
+) -> str:
+    """Resolve the requested OCR tier to an engine (400 if the tier is unknown)."""
+    try:
+        return resolve_engine(ocr_tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def include_param(
+    include: Optional[str] = Query(
+        None, description="Comma-separated artifacts to inline as base64 PNG: preview, heatmap"
+    ),
+) -> List[str]:
+    """Parse the artifacts to inline (400 if one is unknown)."""
+    names = [name.strip() for name in (include or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in ARTIFACTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown artifact: {unknown[0]}")
+    return names
+
+
+def analyzers_param(
+    analyzers: Optional[str] = Query(
+        None, description="Comma-separated analyzers to run: metadata, qr, tamper, logo, ocr (default all)"
+    ),
+) -> Optional[List[str]]:
+    """Parse the analyzer selection (400 if one is unknown or none is given); None selects all."""
+    if analyzers is None:
+        return None
+    names = [name.strip() for name in analyzers.split(",") if name.strip()]
+    if not names:
+        raise HTTPException(status_code=400, detail="Select at least one analyzer")
+    unknown = [name for name in names if name not in ANALYZERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown analyzer: {unknown[0]}")
+    return names
+
+
+def cascade_param(
+    cascade: bool = Query(
+        ANALYSIS_CASCADE, description="Skip logo detection and OCR once they can't change the verdict"
+    ),
+) -> bool:
+    return cascade
+
+
 @router.post("/analyze-certificate", response_model=CertificateAnalysisResponse)
-async def analyze_certificate(file: UploadFile = File(...)):
+async def analyze_certificate(
+    file: UploadFile = File(...),
+    ocr_engine: str = Depends(ocr_engine_param),
+    include: List[str] = Depends(include_param),
+    analyzers: Optional[List[str]] = Depends(analyzers_param),
+    cascade: bool = Depends(cascade_param),
+):
     """
     Analyze a PDF certificate for authenticity - optimized for speed.
     """
@@ -32,88 +98,170 @@ async def analyze_certificate(file: UploadFile = File(...)):
         # Read file content
         file_content = await file.read()
 
-        # Step 1: Convert PDF to PNG
-        certificate_image = convert_pdf_to_png(file_content)
-        if not certificate_image:
-            raise HTTPException(status_code=400, detail="Failed to convert PDF to image")
-
-        # Resize image for faster processing
-        original_image = certificate_image.copy()
-        img_array = certificate_image.size
-        max_dim = 1200
-        if max(img_array) > max_dim:
-            ratio = max_dim / max(img_array)
-            new_size = (int(img_array[0] * ratio), int(img_array[1] * ratio))
-            certificate_image = certificate_image.resize(new_size, Image.Resampling.LANCZOS)
-
-        # Encode original image to base64 for preview
-        img_buffer = io.BytesIO()
-        original_image.save(img_buffer, format='PNG', optimize=True)
-        preview_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-
-        # Step 2: Extract OCR data
-        ocr_data = extract_ocr_data(certificate_image)
-
-        # Step 3: Parse metadata
-        metadata = parse_metadata(file_content)
-
-        # Step 4: Verify QR code
-        qr_data = verify_qr_code(certificate_image)
-
-        # Step 5: Detect logos
-        logo_data = detect_logos(certificate_image)
-
-        # Step 6: Detect tampering
-        tamper_report = detect_tampering(certificate_image)
-
-        # Step 7: Calculate trust score
-        trust_evaluation = calculate_trust_score(
-            ocr_data=ocr_data,
-            metadata=metadata,
-            qr_data=qr_data,
-            logo_data=logo_data,
-            tamper_report=tamper_report
-        )
-
-        # Build response
-        response = CertificateAnalysisResponse(
-            certificate_preview=preview_base64,
-            ocr=ocr_data,
-            metadata=metadata,
-            qr=qr_data,
-            logo_detection=logo_data,
-            tamper_report=tamper_report,
-            trust_evaluation=trust_evaluation
+        return await analyze_pdf(
+            file_content, ocr_engine=ocr_engine, include=include, analyzers=analyzers, cascade=cascade
         )
 
-        return response
-
+    except AnalysisError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+def _upload_sources(files: List[UploadFile]) -> list:
+    """Batch sources for plain multipart PDF uploads."""
+    sources = []
+    for upload in files:
+        if not upload.filename.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail=f"File must be a PDF: {upload.filename}")
+        sources.append((upload.filename, upload.read))
+    return sources
+
+
+def _zip_sources(upload: UploadFile) -> list:
+    """Batch sources for the PDFs inside an uploaded zip archive."""
+    try:
+        archive = zipfile.ZipFile(upload.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive")
+
+    # ZipFile reads share one file handle, so members are read one at a time
+    archive_lock = threading.Lock()
+
+    def read_member(info: zipfile.ZipInfo) -> bytes:
+        if info.file_size > MAX_UPLOAD_SIZE:
+            raise ValueError("File exceeds maximum upload size")
+        with archive_lock:
+            return archive.read(info)
+
+    sources = []
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or not name.lower().endswith('.pdf') or name.startswith('__MACOSX/'):
+            continue
+        sources.append((name, lambda info=info: run_blocking(read_member, info)))
+    return sources
+
+
+@router.post("/analyze-certificates")
+async def analyze_certificates(
+    files: List[UploadFile] = File(...),
+    ocr_engine: str = Depends(ocr_engine_param),
+    analyzers: Optional[List[str]] = Depends(analyzers_param),
+    cascade: bool = Depends(cascade_param),
+):
+    """
+    Analyze many PDF certificates, uploaded as multipart files or as a single
+    zip archive. Results stream back as newline-delimited JSON, one
+    BatchAnalysisItem per certificate, in completion order.
+    """
+    if len(files) == 1 and files[0].filename.lower().endswith('.zip'):
+        sources = _zip_sources(files[0])
+    else:
+        sources = _upload_sources(files)
+
+    if not sources:
+        raise HTTPException(status_code=400, detail="No PDF files found in upload")
+    if len(sources) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_FILES} files")
+
+    async def stream():
+        async for item in analyze_batch(sources, ocr_engine=ocr_engine, analyzers=analyzers, cascade=cascade):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/analyses/{analysis_id}/{artifact}")
+async def get_analysis_artifact(
+    analysis_id: str,
+    artifact: str,
+    format: str = Query(ARTIFACT_DEFAULT_FORMAT, description="webp, jpeg, png, or grid (heatmap only)"),
+    quality: int = Query(ARTIFACT_DEFAULT_QUALITY, ge=1, le=100, description="webp/jpeg quality"),
+    max_dim: Optional[int] = Query(None, ge=16, description="Scale down to this longest side"),
+):
+    """
+    The preview or tamper heatmap of an analysis, encoded on request. With
+    format=grid the heatmap comes back as its raw anomaly grid: row-major
+    uint8 (0..255), its shape in the X-Grid-Rows and X-Grid-Cols headers.
+    """
+    if artifact not in ARTIFACTS:
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+    artifacts = await run_blocking(get_artifact_store().get, analysis_id)
+    if artifacts is None or artifact not in artifacts:
+        raise HTTPException(status_code=404, detail="Artifact not found (unknown or expired analysis)")
+    # Artifacts of an analysis never change
+    headers = {"Cache-Control": "private, max-age=86400, immutable"}
+
+    if format == GRID_FORMAT:
+        if artifact != "heatmap" or "grid" not in artifacts:
+            raise HTTPException(status_code=400, detail="format=grid is only available for the heatmap")
+        grid = await run_blocking(decode_artifact, "grid", artifacts["grid"])
+        headers.update({"X-Grid-Rows": str(grid.shape[0]), "X-Grid-Cols": str(grid.shape[1])})
+        return Response(content=grid.tobytes(), media_type="application/octet-stream", headers=headers)
+
+    if format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    content, media_type = await run_blocking(render_artifact, artifact, artifacts[artifact], format, quality, max_dim)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Result cache hit/miss counters and memory usage.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_result_cache().stats()}
+
+
+@router.get("/ocr/stats")
+async def ocr_batching_stats():
+    """
+    OCR recognition batching metrics: queue depth and batch sizes.
+    """
+    if not OCR_BATCH_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_ocr_batcher().stats()}
+
+
 @router.post("/generate-hash")
-async def generate_certificate_hash(file: UploadFile = File(...)):
+async def generate_certificate_hash(
+    file: UploadFile = File(...),
+    ocr_engine: str = Depends(ocr_engine_param),
+):
     """
     Generate SHA-256 hash of certificate text.
     """
     try:
         file_bytes = await file.read()
 
-        # Extract text (OCR or fallback)
-        result = extract_ocr_data(file_bytes)
-        text = result.get("text", "")
+        # Extract text of every page (embedded text layer, falling back to OCR)
+        session = PdfDocumentSession(file_bytes)
+        try:
+            result = await run_blocking(extract_document_text, session, ocr_engine)
+        finally:
+            await run_blocking(session.close)
+        text = result.raw_text
 
         # Generate hash
         sha_value = generate_sha256_hash(text)
 
+        # Layout-independent hash of the structured fields (empty if not found)
+        fields = {field: getattr(result, field) for field in FIELDS}
+
         return {
             "sha256": sha_value,
             "text_length": len(text),
-            "source_used": result.get("source", "unknown")
+            "source_used": result.source,
+            "fields": fields,
+            "fields_sha256": generate_fields_hash(fields),
         }
 
+    except AnalysisError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Hash generation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Hash generation failed: {str(e)}")
@@ -0,0 +1,100 @@
+"""
+Asynchronous analysis job routes - submit, poll and stream progress.
+"""
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.models.schemas import JobSubmission, JobStatus
+from app.services.analysis_executor import run_blocking
+from app.services.job_queue import get_job_queue
+from app.routes.certificate import ocr_engine_param
+
+import asyncio
+
+router = APIRouter(tags=["jobs"])
+
+# How often the SSE stream checks the queue for changes
+EVENT_POLL_INTERVAL = 0.5
+
+
+def _job_status(job: dict) -> JobStatus:
+    return JobStatus(
+        job_id=job["id"],
+        filename=job["filename"],
+        status=job["status"],
+        progress=job["progress"],
+        attempts=job["attempts"],
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+async def _get_job(job_id: str) -> dict:
+    job = await run_blocking(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs", response_model=JobSubmission, status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    ocr_engine: str = Depends(ocr_engine_param),
+):
+    """
+    Queue a PDF certificate for analysis and return its job id immediately.
+    """
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+
+    file_content = await file.read()
+    job_id = await run_blocking(get_job_queue().submit, file.filename, file_content, ocr_engine)
+    return JobSubmission(job_id=job_id)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str):
+    """
+    Job status with per-stage progress.
+    """
+    return _job_status(await _get_job(job_id))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Final CertificateAnalysisResponse of a finished job. Returns 202 with the
+    job status while it is still queued or running.
+    """
+    job = await _get_job(job_id)
+    if job["status"] == "done":
+        return Response(content=job["result"], media_type="application/json")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=422, detail=job["error"])
+    return JSONResponse(status_code=202, content=_job_status(job).model_dump())
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-sent events: a "status" event whenever the job changes, then a
+    final "result" or "error" event.
+    """
+    await _get_job(job_id)
+
+    async def events():
+        last_update = None
+        while True:
+            job = await _get_job(job_id)
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield f"event: status\ndata: {_job_status(job).model_dump_json()}\n\n"
+            if job["status"] == "done":
+                yield f"event: result\ndata: {job['result']}\n\n"
+                return
+            if job["status"] == "failed":
+                yield f"event: error\ndata: {_job_status(job).model_dump_json()}\n\n"
+                return
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
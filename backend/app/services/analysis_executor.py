@@ -0,0 +1,215 @@
+"""
+Concurrent analysis executor.
+Runs the blocking analyzers on a bounded thread pool so the event loop stays
+responsive while a certificate is being analyzed. With
+ANALYSIS_EXECUTOR_MODE=process the CPU-bound page analyzers run on a pool of
+pre-warmed worker processes instead.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Collection, Dict, Optional
+from app.config import (
+    ANALYSIS_MAX_WORKERS, ANALYSIS_EXECUTOR_MODE, ANALYSIS_PROCESS_WORKERS
+)
+from app.services.ocr_extraction import extract_ocr_data
+from app.ocr_backends import DEFAULT_ENGINE
+from app.services.metadata_parser import parse_metadata
+from app.services.qr_verification import detect_qr_code, verify_qr_data
+from app.models.schemas import QRData
+from app.services.logo_detection import detect_logos
+from app.services.tamper_detection import detect_tampering
+from app.services.process_workers import SharedPage, init_worker, run_page_stage
+from app.services.pdf_document import PdfDocumentSession
+from app.services.text_layer import TextLayer
+from app.qr_utils import RegionRenderer
+from app.utils.page_raster import PageRaster
+
+# Optional per-stage progress hook: progress(stage, state), state is
+# "running" or "done", "cached" when the result came from the result cache,
+# or "skipped" for analyzers that weren't selected or that the cascade settled
+ProgressCallback = Callable[[str, str], None]
+
+# Page analyzers in ascending order of cost, and the result key of each
+PAGE_ANALYZERS = ("qr", "tamper", "logo", "ocr")
+PAGE_RESULT_KEYS = {
+    "ocr": "ocr_data",
+    "qr": "qr_data",
+    "logo": "logo_data",
+    "tamper": "tamper_report",
+}
+
+# Shared pool (OpenCV and Paddle release the GIL in their hot loops)
+_executor = None
+# Worker processes, only created in process mode
+_process_pool = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the shared analysis thread pool, created on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=ANALYSIS_MAX_WORKERS,
+            thread_name_prefix="analyzer",
+        )
+    return _executor
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the analysis worker process pool, created on first use."""
+    global _process_pool
+    if _process_pool is None:
+        # Split the cores between workers so Paddle/OpenCV don't oversubscribe
+        cpu_threads = max(1, (os.cpu_count() or 1) // ANALYSIS_PROCESS_WORKERS)
+        _process_pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_PROCESS_WORKERS,
+            # spawn: forking a process that holds Paddle/OpenCV threads can deadlock
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(cpu_threads,),
+        )
+    return _process_pool
+
+
+def shutdown_executor():
+    """Stop the analysis pools (called on application shutdown)."""
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Run a blocking callable on the analysis pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+async def run_in_process(func: Callable, *args):
+    """Run a picklable callable on the worker process pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+async def track_stage(stage: str, work: Awaitable, progress: Optional[ProgressCallback] = None):
+    """Await one pipeline stage, reporting its start and end to progress."""
+    if progress is not None:
+        progress(stage, "running")
+    result = await work
+    if progress is not None:
+        progress(stage, "done")
+    return result
+
+
+async def _detect_and_verify_qr(detection: Awaitable[QRData]) -> QRData:
+    """Decode the QR code on a worker, then verify its content on the event loop."""
+    return await verify_qr_data(await detection)
+
+
+async def run_page_analyzers(
+    raster: PageRaster,
+    progress: Optional[ProgressCallback] = None,
+    text_layer: Optional[TextLayer] = None,
+    ocr_engine: str = DEFAULT_ENGINE,
+    render_region: Optional[RegionRenderer] = None,
+    analyzers: Collection[str] = PAGE_ANALYZERS,
+) -> dict:
+    """
+    Run the page analyzers concurrently on one rendered page.
+
+    Args:
+        raster: Rendered certificate page, shared by all analyzers
+        progress: Optional per-stage progress callback
+        text_layer: Embedded PDF text of the page, for the OCR fast path
+        ocr_engine: OCR engine for text the text layer doesn't cover
+        render_region: Optional high-DPI renderer for regions of the page,
+            used for QR codes too small to decode from the raster (thread
+            mode only: the PDF isn't shared with worker processes)
+        analyzers: Which of PAGE_ANALYZERS to run
+
+    Returns:
+        Dict with ocr_data, qr_data, logo_data and tamper_report for the
+        analyzers that ran, and feature_maps: compute time (ms) of the shared
+        page maps built by this call
+    """
+    if ANALYSIS_EXECUTOR_MODE == "process":
+        feature_maps = {}
+        results = await _run_page_analyzers_in_processes(
+            raster, progress, text_layer, ocr_engine, feature_maps, analyzers
+        )
+    else:
+        # The raster may come with maps built by an earlier call (maps are
+        # memoized, so those weren't built again)
+        before = raster.feature_timings()
+        results = await _run_stages({
+            "ocr": lambda: run_blocking(extract_ocr_data, raster, text_layer, ocr_engine),
+            "qr": lambda: _detect_and_verify_qr(run_blocking(detect_qr_code, raster, render_region)),
+            "logo": lambda: run_blocking(detect_logos, raster),
+            "tamper": lambda: run_blocking(detect_tampering, raster),
+        }, analyzers, progress)
+        feature_maps = {
+            name: ms for name, ms in raster.feature_timings().items() if name not in before
+        }
+
+    return {
+        **{PAGE_RESULT_KEYS[name]: result for name, result in results.items()},
+        "feature_maps": feature_maps,
+    }
+
+
+async def _run_stages(
+    stages: Dict[str, Callable[[], Awaitable]],
+    analyzers: Collection[str],
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """Run the selected stages concurrently; name -> result."""
+    names = [name for name in PAGE_ANALYZERS if name in analyzers]
+    results = await asyncio.gather(*(track_stage(name, stages[name](), progress) for name in names))
+    return dict(zip(names, results))
+
+
+async def run_metadata_analyzer(
+    session: PdfDocumentSession,
+    progress: Optional[ProgressCallback] = None,
+):
+    """Parse document-level metadata from the already-parsed PDF."""
+    return await track_stage("metadata", run_blocking(parse_metadata, session), progress)
+
+
+async def _run_page_analyzers_in_processes(
+    raster: PageRaster,
+    progress: Optional[ProgressCallback] = None,
+    text_layer: Optional[TextLayer] = None,
+    ocr_engine: str = DEFAULT_ENGINE,
+    feature_maps: Optional[dict] = None,
+    analyzers: Collection[str] = PAGE_ANALYZERS,
+) -> dict:
+    """
+    Fan the selected page analyzers out to worker processes over one shared
+    page buffer. Each worker builds the feature maps its analyzer needs;
+    their costs are added up into feature_maps.
+    """
+    feature_maps = {} if feature_maps is None else feature_maps
+
+    async def stage(name: str, *args):
+        result, timings = await run_in_process(run_page_stage, name, page.handle, *args)
+        for map_name, ms in timings.items():
+            feature_maps[map_name] = feature_maps.get(map_name, 0.0) + ms
+        return result
+
+    page = await run_blocking(SharedPage, raster)
+    try:
+        return await _run_stages({
+            "ocr": lambda: stage("ocr", text_layer, ocr_engine),
+            "qr": lambda: _detect_and_verify_qr(stage("qr")),
+            "logo": lambda: stage("logo"),
+            "tamper": lambda: stage("tamper"),
+        }, analyzers, progress)
+    finally:
+        page.close()
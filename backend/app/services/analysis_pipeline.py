@@ -0,0 +1,455 @@
+"""
+Certificate analysis pipeline.
+Shared by the single-upload and batch endpoints: result cache lookup, PDF
+rendering, concurrent per-page analyzers, multi-page aggregation and trust
+scoring.
+
+Requests may select which analyzers run. In cascade mode the cheap ones run
+first and the expensive ones (CASCADE_STAGES) follow one at a time, each only
+if its score could still change the verdict; the others are skipped.
+"""
+import asyncio
+import base64
+import uuid
+from collections import Counter
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Collection, Iterable, List, Optional, Tuple
+from app.models.schemas import (
+    CertificateAnalysisResponse, BatchAnalysisItem, OCRData, MetadataData, QRData,
+    LogoDetectionData, TamperReport, AnalysisDiagnostics
+)
+from app.services.pdf_document import PdfDocumentSession
+from app.services.text_layer import TextLayer
+from app.services.ocr_extraction import extract_ocr_data
+from app.ocr_backends import resolve_engine, DEFAULT_ENGINE
+from app.services.analysis_executor import (
+    run_page_analyzers, run_metadata_analyzer, run_blocking, track_stage, ProgressCallback,
+    PAGE_ANALYZERS
+)
+from app.services.page_aggregation import (
+    aggregate_ocr, aggregate_qr, aggregate_logos, aggregate_tamper, aggregate_feature_maps
+)
+from app.services.trust_scoring import calculate_trust_score, stage_scores, verdict_settled
+from app.services.result_cache import get_result_cache, make_cache_key
+from app.services.artifact_store import get_artifact_store, encode_image, decode_artifact
+from app.utils.page_raster import PageRaster
+from app.config import (
+    RESULT_CACHE_ENABLED, BATCH_MAX_CONCURRENCY, OCR_TEXT_LAYER_MODE,
+    ANALYSIS_MAX_PAGES, PAGE_MAX_CONCURRENCY, QR_RERENDER_DPI, ANALYSIS_CASCADE
+)
+
+# Longest side of the page raster rendered for the analyzers
+ANALYSIS_MAX_DIM = 1200
+
+
+class AnalysisError(Exception):
+    """Raised when an upload can't be analyzed because of its content."""
+
+
+def inline_artifacts(response: CertificateAnalysisResponse, include: Collection[str]) -> CertificateAnalysisResponse:
+    """
+    Copy of a response with the requested artifacts ("preview", "heatmap")
+    inlined as base64 PNGs, for clients that can't fetch them separately.
+    """
+    artifacts = get_artifact_store().get(response.analysis_id) if include else None
+    if not artifacts:
+        return response
+
+    def inline(name: str) -> str:
+        encoded, _ = encode_image(decode_artifact(name, artifacts[name]), "png")
+        return base64.b64encode(encoded).decode('utf-8')
+
+    update = {}
+    if "preview" in include and "preview" in artifacts:
+        update["certificate_preview"] = inline("preview")
+    if "heatmap" in include and "heatmap" in artifacts:
+        update["tamper_report"] = response.tamper_report.model_copy(update={"heatmap": inline("heatmap")})
+    return response.model_copy(update=update)
+
+
+# Pipeline stages in execution order, as reported to progress callbacks
+PIPELINE_STAGES = ["render", "ocr", "metadata", "qr", "logo", "tamper", "scoring"]
+
+# Analyzers in ascending order of cost (metadata is read once per document)
+ANALYZERS = ("metadata",) + PAGE_ANALYZERS
+# Run last by the cascade, in this order, and skipped once the verdict is settled
+CASCADE_STAGES = ("logo", "ocr")
+
+
+def analyzer_selection(analyzers: Optional[Collection[str]], cascade: bool) -> str:
+    """Canonical form of an analyzer selection, for the cache key ("" for the default)."""
+    selected = [name for name in ANALYZERS if analyzers is None or name in analyzers]
+    if len(selected) == len(ANALYZERS) and not cascade:
+        return ""
+    return ",".join(selected) + ("+cascade" if cascade else "")
+
+
+def aggregate_pages(page_results: List[dict]) -> dict:
+    """
+    Per-page analyzer results combined into one result per analyzer (None
+    for the analyzers that didn't run), keyed like calculate_trust_score's
+    arguments.
+    """
+    aggregators = {
+        "ocr_data": aggregate_ocr,
+        "qr_data": aggregate_qr,
+        "logo_data": aggregate_logos,
+        "tamper_report": aggregate_tamper,
+    }
+    return {
+        key: aggregate([page[key] for page in page_results]) if key in page_results[0] else None
+        for key, aggregate in aggregators.items()
+    }
+
+
+def count_pages(session: PdfDocumentSession) -> int:
+    """
+    Number of pages in the upload.
+
+    Raises:
+        AnalysisError: If the PDF can't be opened or has no pages
+    """
+    try:
+        page_count = session.page_count
+    except Exception as e:
+        print(f"Error opening PDF: {str(e)}")
+        raise AnalysisError("Failed to convert PDF to image")
+    if page_count == 0:
+        raise AnalysisError("Failed to convert PDF to image")
+    return page_count
+
+
+def render_certificate(
+    session: PdfDocumentSession,
+    page_number: int = 0,
+) -> Tuple[PageRaster, Optional[TextLayer]]:
+    """
+    Render one page straight at the resolution the analyzers use, and read
+    its embedded text layer from the same parsed document.
+
+    Returns:
+        (certificate_raster, text_layer)
+
+    Raises:
+        AnalysisError: If the PDF can't be rendered
+    """
+    try:
+        if page_number >= session.page_count:
+            raise AnalysisError("Failed to convert PDF to image")
+        certificate_raster = session.render_page(page_number, max_dim=ANALYSIS_MAX_DIM)
+        text_layer = None
+        if OCR_TEXT_LAYER_MODE != "off":
+            text_layer = session.text_layer(page_number, certificate_raster)
+        return certificate_raster, text_layer
+    except AnalysisError:
+        raise
+    except Exception as e:
+        print(f"Error converting PDF to PNG: {str(e)}")
+        raise AnalysisError("Failed to convert PDF to image")
+
+
+def extract_document_text(session: PdfDocumentSession, ocr_engine: str = DEFAULT_ENGINE) -> OCRData:
+    """
+    Text of every analyzed page, one page rendered at a time.
+
+    Raises:
+        AnalysisError: If the PDF can't be rendered
+    """
+    page_count = min(count_pages(session), ANALYSIS_MAX_PAGES)
+    pages = []
+    for page_number in range(page_count):
+        certificate_raster, text_layer = render_certificate(session, page_number)
+        pages.append(extract_ocr_data(certificate_raster, text_layer, ocr_engine))
+    return aggregate_ocr(pages)
+
+
+class PageProgress:
+    """
+    Folds per-page stage updates into one state per stage: a stage is
+    "running" once any page starts it and "done" once every page finished it.
+    """
+
+    def __init__(self, progress: Optional[ProgressCallback], pages: int):
+        self.progress = progress
+        self.pages = pages
+        self.started = set()
+        self.finished = Counter()
+
+    def __call__(self, stage: str, state: str):
+        if self.progress is None:
+            return
+        if state == "running":
+            if stage not in self.started:
+                self.started.add(stage)
+                self.progress(stage, state)
+        elif state == "done":
+            self.finished[stage] += 1
+            if self.finished[stage] == self.pages:
+                self.progress(stage, state)
+        else:
+            self.progress(stage, state)
+
+
+async def _analyze_page(
+    session: PdfDocumentSession,
+    page_number: int,
+    progress: Optional[ProgressCallback] = None,
+    ocr_engine: str = DEFAULT_ENGINE,
+    analyzers: Collection[str] = PAGE_ANALYZERS,
+    retained: Optional[dict] = None,
+) -> dict:
+    """
+    Render one page (unless retained holds it from an earlier round) and run
+    the selected page analyzers on it.
+    """
+    if retained is not None and page_number in retained:
+        raster, text_layer = retained[page_number]
+    else:
+        raster, text_layer = await track_stage(
+            "render", run_blocking(render_certificate, session, page_number), progress
+        )
+        if retained is not None:
+            retained[page_number] = (raster, text_layer)
+    # Small QR codes are re-rendered from the PDF at a higher DPI
+    render_region = partial(
+        session.render_region, page_number, raster_size=raster.size, dpi=QR_RERENDER_DPI
+    )
+    results = await run_page_analyzers(raster, progress, text_layer, ocr_engine, render_region, analyzers)
+    if page_number == 0:
+        # The first page doubles as the preview (a copy: the raster may point
+        # into a pixmap that is freed with it)
+        results["preview"] = raster.rgb.copy()
+    return results
+
+
+async def analyze_pages(
+    session: PdfDocumentSession,
+    page_count: int,
+    progress: Optional[ProgressCallback] = None,
+    max_concurrency: int = PAGE_MAX_CONCURRENCY,
+    ocr_engine: str = DEFAULT_ENGINE,
+    analyzers: Collection[str] = PAGE_ANALYZERS,
+    retained: Optional[dict] = None,
+) -> List[dict]:
+    """
+    Render and analyze pages with bounded parallelism. A page is only
+    rendered once a slot frees up and its raster is dropped as soon as its
+    analyzers finish, so memory stays bounded by max_concurrency pages
+    whatever the page count. Rendering is serialized by the document's lock;
+    the analyzers of different pages overlap.
+
+    A retained dict (page number -> raster, text layer) keeps the rasters
+    for a later round over the same pages instead; only pass one when there
+    are no more pages than max_concurrency.
+
+    Returns:
+        Per-page analyzer results, in page order
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def run(page_number: int) -> dict:
+        async with slots:
+            return await _analyze_page(session, page_number, progress, ocr_engine, analyzers, retained)
+
+    tasks = [asyncio.ensure_future(run(page_number)) for page_number in range(page_count)]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        # One failed page fails the upload: stop analyzing the rest
+        for task in tasks:
+            task.cancel()
+
+
+async def analyze_pdf(
+    file_content: bytes,
+    progress: Optional[ProgressCallback] = None,
+    ocr_engine: Optional[str] = None,
+    include: Collection[str] = (),
+    analyzers: Optional[Collection[str]] = None,
+    cascade: bool = ANALYSIS_CASCADE,
+) -> CertificateAnalysisResponse:
+    """
+    Run the full analysis pipeline on one PDF.
+
+    Args:
+        file_content: PDF file content as bytes
+        progress: Optional callback receiving (stage, state) updates
+        ocr_engine: OCR engine (see app.ocr_backends); None for the
+            deployment's default tier
+        include: Artifacts to inline in the response ("preview",
+            "heatmap"); the others are only fetchable by analysis id
+        analyzers: Analyzers to run (see ANALYZERS); None for all. The
+            others are skipped and left out of the trust score.
+        cascade: Run CASCADE_STAGES last, one at a time, skipping them once
+            they can't change the verdict
+
+    Returns:
+        CertificateAnalysisResponse (possibly served from the result cache)
+
+    Raises:
+        AnalysisError: If the PDF can't be rendered
+    """
+    ocr_engine = ocr_engine or resolve_engine()
+    selected = [name for name in ANALYZERS if analyzers is None or name in analyzers]
+    deferred = [name for name in CASCADE_STAGES if name in selected] if cascade else []
+    skipped = [name for name in ANALYZERS if name not in selected]
+
+    # Serve repeat uploads straight from the result cache
+    cache = get_result_cache() if RESULT_CACHE_ENABLED else None
+    artifact_store = get_artifact_store()
+    if cache is not None:
+        cache_key = await run_blocking(
+            make_cache_key, file_content, ocr_engine, analyzer_selection(analyzers, cascade)
+        )
+        cached = await run_blocking(cache.get, cache_key)
+        # Served whether or not its artifacts are still stored (fetching
+        # expired ones 404s), unless they are to be inlined and are gone
+        if cached is not None and include and await run_blocking(artifact_store.get, cached.analysis_id) is None:
+            cached = None
+        if cached is not None:
+            if progress is not None:
+                for stage in PIPELINE_STAGES:
+                    progress(stage, "cached")
+            return await run_blocking(inline_artifacts, cached, include)
+
+    # One parsed document serves rendering, text layer and metadata
+    session = PdfDocumentSession(file_content)
+    try:
+        page_count = await run_blocking(count_pages, session)
+        analyzed_pages = min(page_count, ANALYSIS_MAX_PAGES)
+        # Pages analyzed in several rounds keep their raster in between if
+        # they fit in the concurrency slots anyway, else they are re-rendered
+        retained = {} if deferred and analyzed_pages <= PAGE_MAX_CONCURRENCY else None
+
+        # Steps 1-6: Metadata parsing runs alongside the page stream; each
+        # page is rendered, then OCR, QR, logo and tamper analyzers run on
+        # it concurrently on the analysis pool (all but the deferred ones)
+        metadata, page_results = await asyncio.gather(
+            run_metadata_analyzer(session, progress) if "metadata" in selected else asyncio.sleep(0),
+            analyze_pages(
+                session, analyzed_pages, PageProgress(progress, analyzed_pages),
+                ocr_engine=ocr_engine,
+                analyzers=[name for name in selected if name not in deferred],
+                retained=retained,
+            ),
+        )
+
+        # Cascade: each deferred stage runs only if the scores so far (and
+        # the full range of the stages still pending) leave the verdict open
+        for index, stage in enumerate(deferred):
+            scores = stage_scores(metadata=metadata, **aggregate_pages(page_results))
+            if verdict_settled(scores, deferred[index:]):
+                skipped.extend(deferred[index:])
+                break
+            stage_results = await analyze_pages(
+                session, analyzed_pages, PageProgress(progress, analyzed_pages),
+                ocr_engine=ocr_engine, analyzers=[stage], retained=retained,
+            )
+            for page, results in zip(page_results, stage_results):
+                feature_maps = results.pop("feature_maps")
+                for name, ms in feature_maps.items():
+                    page["feature_maps"][name] = page["feature_maps"].get(name, 0.0) + ms
+                page.update(results)
+        retained = None
+    finally:
+        # Closing takes the document's lock, so keep it off the event loop
+        await run_blocking(session.close)
+    results = aggregate_pages(page_results)
+    if progress is not None:
+        for stage in skipped:
+            progress(stage, "skipped")
+
+    # Step 7: Calculate trust score (over the analyzers that ran)
+    if progress is not None:
+        progress("scoring", "running")
+    trust_evaluation = calculate_trust_score(metadata=metadata, **results)
+    if analyzed_pages < page_count:
+        # Nothing past the limit was checked, so say so with the verdict
+        trust_evaluation.reasons.append(f"Only the first {analyzed_pages} of {page_count} pages were analyzed")
+    if progress is not None:
+        progress("scoring", "done")
+
+    # Build response; the images go to the artifact store (the cache key
+    # doubles as the analysis id, so cached results find their artifacts)
+    tamper_report = results["tamper_report"] or TamperReport()
+    analysis_id = cache_key if cache is not None else uuid.uuid4().hex
+    await run_blocking(
+        artifact_store.put, analysis_id, {"preview": page_results[0]["preview"], **tamper_report._artifacts}
+    )
+    response = CertificateAnalysisResponse(
+        analysis_id=analysis_id,
+        ocr=results["ocr_data"] or OCRData(),
+        metadata=metadata or MetadataData(),
+        qr=results["qr_data"] or QRData(),
+        logo_detection=results["logo_data"] or LogoDetectionData(),
+        tamper_report=tamper_report,
+        trust_evaluation=trust_evaluation,
+        page_count=page_count,
+        analyzed_pages=analyzed_pages,
+        skipped_stages=[name for name in ANALYZERS if name in skipped],
+        diagnostics=AnalysisDiagnostics(
+            feature_maps=aggregate_feature_maps([page["feature_maps"] for page in page_results]),
+        ),
+    )
+
+    if cache is not None:
+        await run_blocking(cache.put, cache_key, response)
+
+    return await run_blocking(inline_artifacts, response, include)
+
+
+# A batch source is a filename plus a coroutine factory that loads its bytes,
+# so uploads are only read once a concurrency slot is free
+BatchSource = Tuple[str, Callable[[], Awaitable[bytes]]]
+
+
+async def _analyze_source(
+    source: BatchSource,
+    ocr_engine: Optional[str] = None,
+    analyzers: Optional[Collection[str]] = None,
+    cascade: bool = ANALYSIS_CASCADE,
+) -> BatchAnalysisItem:
+    filename, load = source
+    try:
+        file_content = await load()
+        result = await analyze_pdf(file_content, ocr_engine=ocr_engine, analyzers=analyzers, cascade=cascade)
+        return BatchAnalysisItem(filename=filename, result=result)
+    except AnalysisError as e:
+        return BatchAnalysisItem(filename=filename, error=str(e))
+    except Exception as e:
+        return BatchAnalysisItem(filename=filename, error=f"Analysis failed: {str(e)}")
+
+
+async def analyze_batch(
+    sources: Iterable[BatchSource],
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    ocr_engine: Optional[str] = None,
+    analyzers: Optional[Collection[str]] = None,
+    cascade: bool = ANALYSIS_CASCADE,
+) -> AsyncIterator[BatchAnalysisItem]:
+    """
+    Analyze many PDFs with bounded parallelism, yielding each result as soon
+    as it finishes (completion order, not submission order).
+    """
+    source_iter = iter(sources)
+    pending = set()
+
+    def fill():
+        while len(pending) < max_concurrency:
+            source = next(source_iter, None)
+            if source is None:
+                return
+            pending.add(asyncio.ensure_future(_analyze_source(source, ocr_engine, analyzers, cascade)))
+
+    try:
+        fill()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                yield task.result()
+            fill()
+    finally:
+        # Client went away: don't keep analyzing for nobody
+        for task in pending:
+            task.cancel()
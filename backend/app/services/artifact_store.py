@@ -0,0 +1,231 @@
+"""
+Per-analysis artifact store.
+The images an analysis produces (the page preview and the tamper heatmap)
+and the tamper anomaly grid are kept under the analysis id instead of being
+PNG-encoded into every response. They are stored encoded (images as WebP at
+ARTIFACT_DEFAULT_QUALITY, the grid as lossless PNG), in a memory LRU bounded
+by ARTIFACT_STORE_MAX_BYTES and, when the result cache keeps its entries on
+disk, in files next to them (bounded by ARTIFACT_STORE_DISK_MAX_BYTES), so
+artifacts of cached results survive evictions and restarts. Fetches in
+another format or size are transcoded.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+from app.utils.disk_budget import DiskBudget
+from app.config import (
+    ARTIFACT_STORE_MAX_BYTES, ARTIFACT_STORE_DISK_MAX_BYTES, ARTIFACT_DEFAULT_QUALITY,
+    RESULT_CACHE_DISK, RESULT_CACHE_DIR
+)
+
+# Artifacts a client can fetch; the heatmap can also be fetched as its raw
+# anomaly grid (format=grid)
+ARTIFACTS = ("preview", "heatmap")
+IMAGE_FORMATS = {
+    "webp": (".webp", "image/webp"),
+    "jpeg": (".jpg", "image/jpeg"),
+    "png": (".png", "image/png"),
+}
+GRID_FORMAT = "grid"
+
+
+def encode_image(rgb: np.ndarray, fmt: str, quality: int = 80, max_dim: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    Encode RGB pixels, optionally scaled down to max_dim (longest side).
+
+    Returns:
+        (encoded bytes, media type)
+
+    Raises:
+        ValueError: If the format is unknown or encoding fails
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {fmt}")
+    height, width = rgb.shape[:2]
+    if max_dim is not None and max(height, width) > max_dim:
+        ratio = max_dim / max(height, width)
+        rgb = cv2.resize(
+            rgb, (max(1, int(width * ratio)), max(1, int(height * ratio))), interpolation=cv2.INTER_AREA
+        )
+    extension, media_type = IMAGE_FORMATS[fmt]
+    if fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif fmt == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    else:
+        # Fast deflate: the size gain of a slow search isn't worth its time
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    ok, encoded = cv2.imencode(extension, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes(), media_type
+
+
+# File extension of each artifact's stored encoding
+STORED_FORMATS = {"preview": ".webp", "heatmap": ".webp", "grid": ".png"}
+
+
+def encode_artifact(name: str, pixels: np.ndarray) -> bytes:
+    """Encode an artifact for storage (see STORED_FORMATS)."""
+    if name == "grid":
+        ok, encoded = cv2.imencode(".png", pixels)
+        if not ok:
+            raise ValueError("Could not encode anomaly grid")
+        return encoded.tobytes()
+    encoded, _ = encode_image(pixels, "webp", ARTIFACT_DEFAULT_QUALITY)
+    return encoded
+
+
+def decode_artifact(name: str, data: bytes) -> np.ndarray:
+    """Pixels of a stored artifact (RGB for images, uint8 rows x cols for the grid)."""
+    buffer = np.frombuffer(data, np.uint8)
+    if name == "grid":
+        return cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+    return cv2.cvtColor(cv2.imdecode(buffer, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def render_artifact(name: str, data: bytes, fmt: str, quality: int = 80, max_dim: Optional[int] = None) -> Tuple[bytes, str]:
+    """
+    A stored image artifact in the requested format and size; the stored
+    bytes themselves when they already are what was asked for.
+
+    Raises:
+        ValueError: If the format is unknown or encoding fails
+    """
+    if fmt == "webp" and quality == ARTIFACT_DEFAULT_QUALITY and max_dim is None:
+        return data, IMAGE_FORMATS["webp"][1]
+    return encode_image(decode_artifact(name, data), fmt, quality, max_dim)
+
+
+class ArtifactStore:
+    """
+    Encoded artifacts per analysis id: an in-memory LRU bounded by total
+    size, backed by an optional directory of files bounded by disk_max_bytes
+    (0 = unbounded), where an analysis's files are kept or pruned together.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[Path] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._disk = None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            # Files are named {analysis id}.{artifact}{ext}
+            self._disk = DiskBudget(self.disk_dir, disk_max_bytes, lambda file_name: file_name.split(".", 1)[0])
+        self._entries = OrderedDict()  # analysis id -> {artifact name: encoded bytes}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.disk_hits = 0
+
+    def put(self, analysis_id: str, artifacts: Dict[str, np.ndarray]):
+        """Encode and store (or replace) the artifact pixels of an analysis."""
+        encoded = {name: encode_artifact(name, pixels) for name, pixels in artifacts.items()}
+        self._store_memory(analysis_id, encoded)
+        if self.disk_dir is not None:
+            self._write_disk(analysis_id, encoded)
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, bytes]]:
+        """Encoded artifacts of an analysis, or None if unknown or expired."""
+        with self._lock:
+            artifacts = self._entries.get(analysis_id)
+            if artifacts is not None:
+                self._entries.move_to_end(analysis_id)
+                return artifacts
+        if self.disk_dir is None:
+            return None
+        artifacts = self._read_disk(analysis_id)
+        if artifacts:
+            with self._lock:
+                self.disk_hits += 1
+            self._store_memory(analysis_id, artifacts)
+        return artifacts or None
+
+    def stats(self) -> dict:
+        """Entry count and current memory usage."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "disk_enabled": self.disk_dir is not None,
+                **self._disk_stats(),
+            }
+
+    def _disk_stats(self) -> dict:
+        if self._disk is None:
+            return {}
+        return {
+            "disk_size_bytes": self._disk.size,
+            "disk_max_bytes": self._disk.max_bytes,
+            "disk_evictions": self._disk.evictions,
+        }
+
+    def _store_memory(self, analysis_id: str, artifacts: Dict[str, bytes]):
+        size = sum(len(data) for data in artifacts.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(analysis_id, None)
+            if previous is not None:
+                self._size -= sum(len(data) for data in previous.values())
+            self._entries[analysis_id] = artifacts
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= sum(len(data) for data in evicted.values())
+                self.evictions += 1
+
+    def _disk_path(self, analysis_id: str, name: str) -> Path:
+        return self.disk_dir / f"{analysis_id}.{name}{STORED_FORMATS[name]}"
+
+    def _read_disk(self, analysis_id: str) -> Dict[str, bytes]:
+        artifacts = {}
+        for name in STORED_FORMATS:
+            path = self._disk_path(analysis_id, name)
+            try:
+                artifacts[name] = path.read_bytes()
+                self._disk.touch(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"Error reading artifact: {str(e)}")
+        return artifacts
+
+    def _write_disk(self, analysis_id: str, artifacts: Dict[str, bytes]):
+        for name, data in artifacts.items():
+            path = self._disk_path(analysis_id, name)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            try:
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing artifact: {str(e)}")
+                continue
+            self._disk.added(len(data))
+
+
+# Lazy-initialized shared store
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Get the shared artifact store, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(
+                    max_bytes=ARTIFACT_STORE_MAX_BYTES,
+                    # Next to the result cache's files, so cached results keep them
+                    disk_dir=RESULT_CACHE_DIR / "artifacts" if RESULT_CACHE_DISK else None,
+                    disk_max_bytes=ARTIFACT_STORE_DISK_MAX_BYTES,
+                )
+    return _store
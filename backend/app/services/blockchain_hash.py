@@ -1,4 +1,5 @@
 import hashlib
+import json
 
 def generate_sha256_hash(text: str) -> str:
     """
@@ -7,3 +8,14 @@ def generate_sha256_hash(text: str) -> str:
     sha = hashlib.sha256()
     sha.update(text.encode("utf-8"))
     return sha.hexdigest()
+
+
+def generate_fields_hash(fields: dict) -> str:
+    """
+    Generates SHA-256 hash of structured certificate fields.
+    Fields are serialized as canonical JSON (sorted keys, no whitespace,
+    surrounding whitespace and case of values normalized), so the hash
+    doesn't depend on layout or OCR spacing.
+    """
+    canonical = {key: " ".join(str(value).split()).lower() for key, value in fields.items()}
+    return generate_sha256_hash(json.dumps(canonical, sort_keys=True, separators=(",", ":")))
@@ -0,0 +1,330 @@
+"""
+Copy-move forgery detection.
+Finds regions of a page that were copied from another part of the same page
+(a duplicated seal, a name pasted over another). Every overlapping
+BLOCK x BLOCK block of a downscaled page gets a compact hash: its
+lowest-frequency DCT coefficients, quantized and hashed to one int64.
+Blocks are then sorted by hash, so duplicates end up next to each other and
+are found by comparing each block with its few sorted neighbours: O(n log n)
+in the block count instead of comparing all pairs.
+
+A copied region shows up as many matched block pairs sharing one shift
+vector; isolated coincidences (repeated letters, plain texture) don't. At
+this size lines of small text all look alike, so every candidate region is
+finally compared with its source pixel by pixel at full resolution, over the
+pixels its matched blocks cover.
+"""
+from typing import List, Tuple
+import cv2
+import numpy as np
+from app.qr_utils import page_qr_regions
+from app.utils.page_raster import PageRaster
+
+# Pages are searched at this size (longest side); blocks overlap with stride 1
+MAX_DIM = 400
+# 16px blocks: at MAX_DIM no single letter fills one, so repeated letters
+# don't match the way repeated regions do
+BLOCK = 16
+# Zig-zag DCT coefficients kept per block and their quantization step. A
+# copy rarely lands on whole pixels of the analysis raster, so its blocks'
+# coefficients differ slightly from the original's; blocks are hashed under
+# two quantization grids half a step apart, and a pair matching under
+# either counts
+COEFFICIENTS = 6
+QUANT_STEP = 32.0
+QUANT_OFFSETS = (0.0, 0.5)
+# Blocks flatter than this (gray level standard deviation) match everywhere
+MIN_BLOCK_STD = 12.0
+# Sorted neighbours each block is compared with
+NEIGHBOURS = 4
+# Blocks sharing one hash beyond this are texture, not copies
+MAX_GROUP = 4
+# A copy must be moved at least this far (pixels at MAX_DIM)
+MIN_SHIFT = 12
+# Matched block pairs sharing a shift needed to report a region pair
+MIN_PAIRS = 120
+# Matched blocks this close (pixels) belong to one region
+CLUSTER_GAP = 9
+MAX_REGIONS = 4
+# Largest share of the smaller box a source and its target may have in common
+MAX_OVERLAP = 0.2
+# A candidate must correlate this well with its source at full resolution,
+# over the pixels its matched blocks cover (see _support) and within
+# VERIFY_MARGIN pixels; text merely set twice in the same font stays around
+# 0.9 there, a pasted copy above 0.99 (0.95 once re-saved and downscaled).
+# A block of text typeset verbatim twice is pixel-identical and passes too.
+MIN_CORRELATION = 0.95
+VERIFY_MARGIN = 4
+# Shift peaks examined before giving up
+MAX_CANDIDATES = 12
+# Candidate QR regions larger than this share of the page are a lone
+# finder-like glyph's generous search area (see group_finder_patterns), not
+# a code: they would exclude most of a text page
+MAX_QR_SHARE = 0.25
+
+Box = Tuple[int, int, int, int]
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def _zigzag(n: int) -> np.ndarray:
+    """Flat indices of an n x n block in zig-zag (low to high frequency) order."""
+    order = sorted(
+        ((i, j) for i in range(n) for j in range(n)),
+        key=lambda ij: (ij[0] + ij[1], ij[1] if (ij[0] + ij[1]) % 2 else ij[0]),
+    )
+    return np.array([i * n + j for i, j in order])
+
+
+_DCT = _dct_matrix(BLOCK)
+_ZIGZAG = _zigzag(BLOCK)[:COEFFICIENTS]
+_HASH_MULTIPLIER = np.int64(1_000_003)
+
+
+def block_features(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Low-frequency DCT coefficients of every overlapping textured block.
+
+    Each coefficient of all blocks at once is one separable correlation of
+    the page with that DCT basis function, so no block is ever copied out.
+
+    Returns:
+        (positions, coefficients): (N, 2) int32 block top-left x, y and (N,
+        COEFFICIENTS) float32 coefficients
+    """
+    height, width = gray.shape[:2]
+    if height < BLOCK or width < BLOCK:
+        return np.empty((0, 2), np.int32), np.empty((0, COEFFICIENTS), np.float32)
+    pixels = gray.astype(np.float32)
+    rows, cols = height - BLOCK + 1, width - BLOCK + 1
+
+    def block_filter(kernel_x: np.ndarray, kernel_y: np.ndarray, image: np.ndarray) -> np.ndarray:
+        # Anchored at the kernel's top-left: value (y, x) covers the block at (x, y)
+        filtered = cv2.sepFilter2D(
+            image, cv2.CV_32F, kernel_x, kernel_y, anchor=(0, 0), borderType=cv2.BORDER_CONSTANT
+        )
+        return filtered[:rows, :cols]
+
+    # Texture check from box sums before any DCT work
+    box = np.full(BLOCK, 1.0 / BLOCK, np.float32)
+    variance = block_filter(box, box, pixels * pixels) - block_filter(box, box, pixels) ** 2
+    ys, xs = np.nonzero(variance >= MIN_BLOCK_STD ** 2)
+    if len(ys) == 0:
+        return np.empty((0, 2), np.int32), np.empty((0, COEFFICIENTS), np.float32)
+    coefficients = np.empty((len(ys), COEFFICIENTS), np.float32)
+    for column, index in enumerate(_ZIGZAG):
+        u, v = divmod(int(index), BLOCK)
+        coefficients[:, column] = block_filter(_DCT[v], _DCT[u], pixels)[ys, xs]
+    positions = np.stack([xs, ys], axis=1).astype(np.int32)
+    return positions, coefficients
+
+
+def matched_pairs(positions: np.ndarray, coefficients: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs of blocks with equal hashes (under either quantization grid) at
+    least MIN_SHIFT apart.
+
+    Returns:
+        (first, second) index arrays into positions, with the shift from first
+        to second normalized to point right (or straight down)
+    """
+    if len(coefficients) < 2:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    firsts, seconds = [], []
+    for offset in QUANT_OFFSETS:
+        # One int64 per block: a polynomial hash of its quantized
+        # coefficients (wrapping overflow; collisions are negligible)
+        quantized = np.floor(coefficients / QUANT_STEP + offset).astype(np.int64)
+        hashes = np.zeros(len(quantized), np.int64)
+        with np.errstate(over="ignore"):
+            for column in range(quantized.shape[1]):
+                hashes = hashes * _HASH_MULTIPLIER + quantized[:, column]
+        order = np.argsort(hashes, kind="stable")
+        ordered = hashes[order]
+        # A hash shared by many blocks is plain texture (a line of small
+        # text, a fill pattern), not a copy: drop its whole group
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        sizes = np.diff(np.r_[starts, len(ordered)])
+        common = np.repeat(sizes > MAX_GROUP, sizes)
+        order, ordered = order[~common], ordered[~common]
+        for distance in range(1, min(NEIGHBOURS, len(order) - 1) + 1):
+            equal = ordered[:-distance] == ordered[distance:]
+            a, b = order[:-distance][equal], order[distance:][equal]
+            far = np.abs(positions[b] - positions[a]).max(axis=1) >= MIN_SHIFT
+            firsts.append(a[far])
+            seconds.append(b[far])
+    first = np.concatenate(firsts) if firsts else np.empty(0, np.intp)
+    second = np.concatenate(seconds) if seconds else np.empty(0, np.intp)
+    if len(first) == 0:
+        return first, second
+    shift = positions[second] - positions[first]
+    flip = (shift[:, 0] < 0) | ((shift[:, 0] == 0) & (shift[:, 1] < 0))
+    first[flip], second[flip] = second[flip], first[flip].copy()
+    # A pair found under both grids counts once
+    pairs = np.unique(first.astype(np.int64) * len(positions) + second)
+    return pairs // len(positions), pairs % len(positions)
+
+
+def _inside(positions: np.ndarray, boxes: List[Box]) -> np.ndarray:
+    inside = np.zeros(len(positions), dtype=bool)
+    for x0, y0, x1, y1 in boxes:
+        inside |= (
+            (positions[:, 0] >= x0) & (positions[:, 0] + BLOCK <= x1)
+            & (positions[:, 1] >= y0) & (positions[:, 1] + BLOCK <= y1)
+        )
+    return inside
+
+
+def detect_copy_move(page: PageRaster) -> List[dict]:
+    """
+    Copied regions of a page, strongest first.
+
+    Returns:
+        List of dicts with source and target (x0, y0, x1, y1 as fractions of
+        the page size) and pairs (matched blocks supporting them)
+    """
+    gray = page.downscaled(MAX_DIM).gray
+    small_h, small_w = gray.shape[:2]
+
+    positions, coefficients = block_features(gray)
+    first, second = matched_pairs(positions, coefficients)
+    if len(first) < MIN_PAIRS:
+        return []
+
+    # QR codes repeat their finder patterns by design (the located regions
+    # are shared with the QR analyzer)
+    scale = small_w / page.width
+    qr_boxes = [
+        (int(x0 * scale), int(y0 * scale), int(np.ceil(x1 * scale)), int(np.ceil(y1 * scale)))
+        for x0, y0, x1, y1 in page_qr_regions(page)
+        if (x1 - x0) * (y1 - y0) <= MAX_QR_SHARE * page.width * page.height
+    ]
+    if qr_boxes:
+        keep = ~(_inside(positions[first], qr_boxes) & _inside(positions[second], qr_boxes))
+        first, second = first[keep], second[keep]
+
+    # Votes per shift, each counting its +-1 neighbours too: a copy's offset
+    # rarely lands on whole pixels, so its pairs spread over adjacent shifts
+    shifts = positions[second] - positions[first]
+    dx, dy = shifts[:, 0], shifts[:, 1] + small_h  # dx >= 0, dy may be negative
+    votes = np.zeros((2 * small_h + 1, small_w + 1), np.float32)
+    np.add.at(votes, (dy, dx), 1)
+    votes = cv2.boxFilter(votes, -1, (3, 3), normalize=False, borderType=cv2.BORDER_CONSTANT)
+
+    regions = []
+    for _ in range(MAX_CANDIDATES):
+        peak_y, peak_x = np.unravel_index(int(np.argmax(votes)), votes.shape)
+        if votes[peak_y, peak_x] < MIN_PAIRS or len(regions) == MAX_REGIONS:
+            break
+        votes[max(0, peak_y - 2):peak_y + 3, max(0, peak_x - 2):peak_x + 3] = 0
+        near = np.nonzero((np.abs(dx - peak_x) <= 1) & (np.abs(dy - peak_y) <= 1))[0]
+        # A copied region's pairs are contiguous; text that merely repeats
+        # at some spacing scatters its pairs over the page
+        near = near[_largest_cluster(positions[first[near]], small_w, small_h)]
+        if len(near) < MIN_PAIRS:
+            continue
+        source = _box(positions[first[near]], small_w, small_h)
+        target = _box(positions[second[near]], small_w, small_h)
+        # A copy pasted over its own source would hide it; a region matching
+        # itself a little further on is a repeating pattern (a line of text)
+        if _overlap(source, target) > MAX_OVERLAP:
+            continue
+        shift = (positions[second[near]] - positions[first[near]]).mean(axis=0)
+        support = _support(positions[first[near]], small_w, small_h, page.width, page.height)
+        if _correlation(page.gray, support, shift * page.width / small_w) < MIN_CORRELATION:
+            continue
+        regions.append({"source": source, "target": target, "pairs": int(len(near))})
+    return regions
+
+
+def _largest_cluster(points: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Mask of the points in the biggest group of (nearly) touching points."""
+    canvas = np.zeros((height, width), np.uint8)
+    canvas[points[:, 1], points[:, 0]] = 1
+    canvas = cv2.dilate(canvas, np.ones((CLUSTER_GAP, CLUSTER_GAP), np.uint8))
+    _, labels = cv2.connectedComponents(canvas, connectivity=8)
+    point_labels = labels[points[:, 1], points[:, 0]]
+    largest = np.bincount(point_labels).argmax()
+    return point_labels == largest
+
+
+def _support(positions: np.ndarray, width: int, height: int, full_width: int, full_height: int) -> np.ndarray:
+    """
+    Full-resolution mask of the pixels the matched blocks vouch for: the
+    central half of each block. A block only partly over the copy can still
+    match (its other part being blank), so the rims of its box may be page
+    content that differs between source and target.
+    """
+    inset = BLOCK // 4
+    cores = np.zeros((height, width), np.int32)
+    np.add.at(cores, (positions[:, 1] + inset, positions[:, 0] + inset), 1)
+    # Each block's core is a BLOCK/2 square anchored at its marked corner
+    side = BLOCK - 2 * inset
+    cores = cv2.boxFilter(
+        cores.astype(np.float32), -1, (side, side), anchor=(0, 0), normalize=False,
+        borderType=cv2.BORDER_CONSTANT,
+    )
+    shifted = np.zeros_like(cores)
+    shifted[side - 1:, side - 1:] = cores[:height - side + 1, :width - side + 1]
+    mask = (shifted > 0).astype(np.uint8)
+    return cv2.resize(mask, (full_width, full_height), interpolation=cv2.INTER_NEAREST)
+
+
+def _correlation(gray: np.ndarray, support: np.ndarray, shift: np.ndarray) -> float:
+    """
+    How well the supported source pixels match the pixels shift away at full
+    resolution: the best normalized correlation over the support mask within
+    VERIFY_MARGIN pixels of the shift.
+    """
+    ys, xs = np.nonzero(support)
+    if len(ys) == 0:
+        return 0.0
+    y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    height, width = gray.shape[:2]
+    tx0, ty0 = int(round(x0 + shift[0])), int(round(y0 + shift[1]))
+    patch = gray[y0:y1, x0:x1]
+    mask = support[y0:y1, x0:x1]
+    window_x0, window_y0 = max(0, tx0 - VERIFY_MARGIN), max(0, ty0 - VERIFY_MARGIN)
+    window = gray[window_y0:ty0 + (y1 - y0) + VERIFY_MARGIN, window_x0:tx0 + (x1 - x0) + VERIFY_MARGIN]
+    if window.shape[0] < patch.shape[0] or window.shape[1] < patch.shape[1]:
+        return 0.0
+    selected = mask.astype(bool)
+    reference = patch[selected].astype(np.float32)
+    reference -= reference.mean()
+    reference_norm = float(np.sqrt((reference * reference).sum()))
+    if reference_norm == 0:
+        return 0.0
+    best = 0.0
+    for dy in range(window.shape[0] - patch.shape[0] + 1):
+        for dx in range(window.shape[1] - patch.shape[1] + 1):
+            candidate = window[dy:dy + patch.shape[0], dx:dx + patch.shape[1]][selected].astype(np.float32)
+            candidate -= candidate.mean()
+            norm = float(np.sqrt((candidate * candidate).sum()))
+            if norm > 0:
+                best = max(best, float((reference * candidate).sum()) / (reference_norm * norm))
+    return best
+
+
+def _overlap(a: List[float], b: List[float]) -> float:
+    """Intersection of two normalized boxes over the smaller one's area."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return width * height / max(smaller, 1e-9)
+
+
+def _box(positions: np.ndarray, width: int, height: int) -> List[float]:
+    x0, y0 = positions.min(axis=0)
+    x1, y1 = positions.max(axis=0) + BLOCK
+    return [
+        round(float(x0) / width, 4), round(float(y0) / height, 4),
+        round(min(float(x1) / width, 1.0), 4), round(min(float(y1) / height, 1.0), 4),
+    ]
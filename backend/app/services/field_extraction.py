@@ -0,0 +1,162 @@
+"""
+Structured certificate field extraction.
+Fills name, course, issuer, date and certificate_id from the text lines of a
+page (a LineTable) in one pass. Every line is scanned once with a single
+precompiled alternation of cue phrases ("certify that", "Certificate ID:",
+"issued by", ...); a field's value is the rest of the cue's line, or else the
+nearest line to its right or below it. Dates, ID-like tokens and issuer names
+without a cue are picked up as weaker fallbacks.
+
+Each field gets a confidence (rule score times the line's OCR confidence);
+fields below FIELD_MIN_CONFIDENCE stay empty.
+"""
+import re
+from typing import Dict, Optional, Tuple
+from app.config import FIELD_MIN_CONFIDENCE
+from app.utils.line_table import LineTable
+
+FIELDS = ("name", "course", "issuer", "date", "certificate_id")
+
+# Order matters where cues share a prefix: "issued by" before "issued"
+_CUES = re.compile(
+    r"""
+    (?P<issuer_cue>\b(?:issued|offered|authorized|provided|awarded)\s+by\b)
+    |(?P<date_cue>\b(?:date\s+of\s+(?:issue|completion|award)|issued\s+on|issue\s+date|completed\s+on|awarded\s+on|dated?|issued)\b)
+    |(?P<id_cue>\b(?:(?:certificate|credential|cert\.?)\s*(?:id|no\.?|number|\#)|(?:serial|registration|reg\.?)\s*(?:no\.?|number|\#)|id\s*[:\#])\s*[:\#]?)
+    |(?P<name_cue>\b(?:certif(?:y|ies)\s+that|presented\s+to|awarded\s+to|granted\s+to|conferred\s+(?:up)?on)\b)
+    |(?P<course_cue>\b(?:(?:has\s+)?(?:successfully\s+)?completed(?:\s+the(?:\s+course)?)?|(?:for\s+)?(?:the\s+)?(?:successful\s+)?completion\s+of(?:\s+the(?:\s+course)?)?)\b)
+    |(?P<name_label>\b(?:name|student|recipient|candidate|participant)\s*[:\-])
+    |(?P<course_label>\b(?:course|program(?:me)?|subject|specialization)(?:\s+name)?\s*[:\-])
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Cue group -> (field, score); labels ("Name:") are stronger than prose cues
+_CUE_FIELDS = {
+    "name_label": ("name", 0.95),
+    "course_label": ("course", 0.95),
+    "id_cue": ("certificate_id", 0.95),
+    "date_cue": ("date", 0.9),
+    "name_cue": ("name", 0.9),
+    "course_cue": ("course", 0.85),
+    "issuer_cue": ("issuer", 0.9),
+}
+# A value found on a neighbouring line rather than after the cue
+NEIGHBOUR_FACTOR = 0.9
+
+_MONTHS = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+)
+_DATE = re.compile(
+    rf"""\b(?:
+        \d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTHS},?\s+\d{{4}}
+        |{_MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}
+        |{_MONTHS}\s+\d{{4}}
+        |\d{{4}}[-/.]\d{{1,2}}[-/.]\d{{1,2}}
+        |\d{{1,2}}[-/.]\d{{1,2}}[-/.]\d{{2,4}}
+    )\b""",
+    re.IGNORECASE | re.VERBOSE,
+)
+# At least 6 characters of letters, digits and separators with a digit in it
+_ID_TOKEN = re.compile(r"\b(?=[A-Z0-9\-/]*\d)[A-Z0-9][A-Z0-9\-/]{4,}[A-Z0-9]\b", re.IGNORECASE)
+_ID_HAS_LETTER = re.compile(r"[A-Z]", re.IGNORECASE)
+_ISSUER = re.compile(
+    r"\b(?:university|universit[ée]|institute|institution|academy|college|school|board|council"
+    r"|foundation|association|society|corporation|inc|ltd|llc|gmbh|limited|polytechnic|ministry)\b",
+    re.IGNORECASE,
+)
+_NAME_WORD = re.compile(r"^[^\W\d_][^\W\d_.'\-]*(?:[.'\-][^\W\d_]*)*\.?$")
+_TRAILING_CONNECTOR = re.compile(r"\s+(?:on|in|dated)\s*$", re.IGNORECASE)
+_STRIP = " \t:;,|-–—"
+
+
+def _clean(value: str) -> str:
+    return " ".join(value.split()).strip(_STRIP)
+
+
+def _validate(field: str, value: str) -> Optional[str]:
+    """The field value contained in value, or None if it doesn't look like one."""
+    value = _clean(value)
+    if not value:
+        return None
+    if field == "name":
+        words = value.split()
+        if 1 <= len(words) <= 5 and all(_NAME_WORD.match(w) and w[0].isupper() for w in words):
+            return value
+        return None
+    if field == "date":
+        match = _DATE.search(value)
+        return match.group(0) if match else None
+    if field == "certificate_id":
+        match = _ID_TOKEN.search(value)
+        return match.group(0) if match else None
+    # course / issuer: a short phrase with some letters, without a trailing date
+    date = _DATE.search(value)
+    if date:
+        value = _TRAILING_CONNECTOR.sub("", value[:date.start()]).strip(_STRIP)
+    letters = sum(c.isalpha() for c in value)
+    if letters >= 3 and len(value) <= 120:
+        return value
+    return None
+
+
+def extract_fields(table: LineTable) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """
+    Fill the structured certificate fields from the lines of a page.
+
+    Returns:
+        (fields, confidences): field name -> value and field name -> 0..1
+        confidence, for the fields that were found
+    """
+    best = {}  # field -> (confidence, value)
+
+    def offer(field: str, value: str, score: float, index: int):
+        confidence = round(float(score) * float(table.confidences[index]), 3)
+        if confidence >= FIELD_MIN_CONFIDENCE and confidence > best.get(field, (0.0, ""))[0]:
+            best[field] = (confidence, value)
+
+    if len(table):
+        tops = table.relative_tops
+        heights = table.heights
+        tall = float(heights.max()) * 0.8
+
+    for index, text in enumerate(table.texts):
+        cues = list(_CUES.finditer(text))
+        for n, match in enumerate(cues):
+            field, score = _CUE_FIELDS[match.lastgroup]
+            last = n + 1 == len(cues)
+            value = _validate(field, text[match.end():len(text) if last else cues[n + 1].start()])
+            if value:
+                offer(field, value, score, index)
+                continue
+            if not last:
+                continue
+            # Nothing after the cue: the value sits beside or under it
+            neighbours = list(table.right_of(index)[:1]) + list(table.below(index)[:2])
+            for neighbour in neighbours:
+                neighbour_text = table.texts[neighbour]
+                next_cue = _CUES.search(neighbour_text)
+                value = _validate(field, neighbour_text[:next_cue.start()] if next_cue else neighbour_text)
+                if value:
+                    offer(field, value, score * NEIGHBOUR_FACTOR, neighbour)
+                    break
+
+        # Fallbacks without a cue; offer() keeps the cue-based value if stronger
+        date = _DATE.search(text)
+        if date:
+            offer("date", date.group(0), 0.6, index)
+        for token in _ID_TOKEN.finditer(text):
+            if _ID_HAS_LETTER.search(token.group(0)) and not _DATE.search(token.group(0)):
+                offer("certificate_id", token.group(0), 0.5, index)
+                break
+        if _ISSUER.search(text) and not cues:
+            issuer = _validate("issuer", text)
+            if issuer and len(issuer.split()) <= 10:
+                # Issuers usually head the page in large type
+                score = 0.45 + 0.25 * (tops[index] < 0.3) + 0.15 * (heights[index] >= tall)
+                offer("issuer", issuer, score, index)
+
+    fields = {field: value for field, (_, value) in best.items()}
+    confidences = {field: confidence for field, (confidence, _) in best.items()}
+    return fields, confidences
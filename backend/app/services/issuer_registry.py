@@ -0,0 +1,89 @@
+"""
+Offline registry of known certificate issuers.
+Maps verification URL patterns (host plus path prefix) to issuer names, so
+QR codes pointing at a known issuer's verification pages are recognized
+without a network call. The registry is a JSON file (ISSUER_REGISTRY_PATH):
+
+    {"issuers": [{"name": "Coursera", "hosts": ["coursera.org"],
+                  "path_prefixes": ["/verify/"]}]}
+
+A host entry also covers its subdomains (www.coursera.org). The file is
+reloaded when it changes.
+"""
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from app.config import ISSUER_REGISTRY_PATH
+
+
+class IssuerRegistry:
+    """Issuer names indexed by host, then by path prefix (longest first)."""
+
+    def __init__(self, entries: List[dict]):
+        self._index: Dict[str, List[Tuple[str, str]]] = {}
+        for entry in entries:
+            name = entry.get("name", "")
+            prefixes = entry.get("path_prefixes") or ["/"]
+            for host in entry.get("hosts", []):
+                rules = self._index.setdefault(normalize_host(host), [])
+                rules.extend((prefix, name) for prefix in prefixes)
+        for rules in self._index.values():
+            rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Issuer whose registered host and path prefix match url, if any."""
+        try:
+            parsed = urlparse(url)
+        except ValueError:
+            return None
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return None
+        path = parsed.path or "/"
+        # Try the host itself, then each parent domain: a.b.example.org,
+        # b.example.org, example.org
+        labels = normalize_host(parsed.hostname).split(".")
+        for i in range(len(labels) - 1):
+            for prefix, name in self._index.get(".".join(labels[i:]), ()):
+                if path.startswith(prefix):
+                    return name
+        return None
+
+
+def normalize_host(host: str) -> str:
+    host = host.strip().lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def load_issuer_registry() -> IssuerRegistry:
+    """Read the registry file; a missing or broken file gives an empty registry."""
+    try:
+        with open(ISSUER_REGISTRY_PATH, encoding="utf-8") as f:
+            return IssuerRegistry(json.load(f).get("issuers", []))
+    except FileNotFoundError:
+        return IssuerRegistry([])
+    except Exception as e:
+        print(f"Error loading issuer registry: {str(e)}")
+        return IssuerRegistry([])
+
+
+_registry = None
+_registry_mtime = None
+_registry_lock = threading.Lock()
+
+
+def get_issuer_registry() -> IssuerRegistry:
+    """Get the cached issuer registry, loading it on first use or after changes."""
+    global _registry, _registry_mtime
+    try:
+        mtime = ISSUER_REGISTRY_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    with _registry_lock:
+        if _registry is None or mtime != _registry_mtime:
+            _registry = load_issuer_registry()
+            _registry_mtime = mtime
+        return _registry
@@ -0,0 +1,321 @@
+"""
+Local persistent job queue for asynchronous certificate analysis.
+Jobs live in a SQLite database under UPLOAD_DIR with their PDFs stored next
+to it, so no external broker is needed. A fixed number of worker tasks run
+jobs through the analysis pipeline and renew the leases of their running
+jobs every HEARTBEAT_FRACTION of the lease; jobs left running by a crashed
+process are picked up again once their lease expires.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Collection, Dict, Optional
+from app.services.analysis_executor import run_blocking
+from app.services.analysis_pipeline import analyze_pdf, AnalysisError, PIPELINE_STAGES
+from app.config import (
+    JOB_DB_PATH, JOB_STORAGE_DIR, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_LEASE_SECONDS
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress TEXT NOT NULL,
+    result TEXT,
+    error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    heartbeat_at REAL,
+    ocr_engine TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Running jobs' leases are renewed this often (as a fraction of the lease)
+HEARTBEAT_FRACTION = 1 / 3
+
+# Columns added after the first release: (name, definition) for ALTER TABLE
+_ADDED_COLUMNS = [
+    ("ocr_engine", "TEXT NOT NULL DEFAULT ''"),
+]
+
+
+class JobQueue:
+    """SQLite-backed job queue with a bounded pool of asyncio workers."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        storage_dir: Path,
+        concurrency: int = JOB_WORKERS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self.storage_dir = storage_dir
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+        self._workers = []
+        self._heartbeat = None
+        self._running = set()
+        self._loop = None
+        self._wakeup = None
+
+    def _migrate(self):
+        """Add columns missing from databases created by older versions."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in _ADDED_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    # -- storage -----------------------------------------------------------
+
+    def _pdf_path(self, job_id: str) -> Path:
+        return self.storage_dir / f"{job_id}.pdf"
+
+    def submit(self, filename: str, file_content: bytes, ocr_engine: str = "") -> str:
+        """Persist an upload and enqueue it. Returns the new job id."""
+        job_id = uuid.uuid4().hex
+        self._pdf_path(job_id).write_bytes(file_content)
+        progress = json.dumps({stage: "pending" for stage in PIPELINE_STAGES})
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, filename, status, progress, created_at, updated_at, ocr_engine) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, filename, progress, now, now, ocr_engine),
+            )
+        if self._loop is not None:
+            # submit() runs on a pool thread; asyncio.Event isn't thread-safe
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Job status, progress and (when finished) the serialized result."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        return job
+
+    def claim(self) -> Optional[dict]:
+        """Atomically move the oldest queued job to running."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, filename, ocr_engine FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                        "updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                        (now, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def update_progress(self, job_id: str, states: Dict[str, str]):
+        """Record stage transitions (stage -> state); also renews the job's lease."""
+        now = time.time()
+        paths = ", '$.' || ?, ?" * len(states)
+        values = [value for item in states.items() for value in item]
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET progress = json_set(progress{paths}), "
+                "updated_at = ?, heartbeat_at = ? WHERE id = ?",
+                (*values, now, now, job_id),
+            )
+
+    def renew_leases(self, job_ids: Collection[str]):
+        """Heartbeat: extend the leases of jobs this process is running."""
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" * len(job_ids))
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND id IN ({placeholders})",
+                (time.time(), *job_ids),
+            )
+
+    def complete(self, job_id: str, result_json: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = '', updated_at = ? "
+                "WHERE id = ?",
+                (result_json, time.time(), job_id),
+            )
+        self._pdf_path(job_id).unlink(missing_ok=True)
+
+    def fail(self, job_id: str, error: str, retry: bool = False):
+        """Mark a job failed, or requeue it if retries are left."""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            requeue = retry and row is not None and row["attempts"] < self.max_attempts
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                ("queued" if requeue else "failed", error, time.time(), job_id),
+            )
+        if not requeue:
+            self._pdf_path(job_id).unlink(missing_ok=True)
+
+    def recover_stale(self, exclude: Collection[str] = ()) -> int:
+        """
+        Requeue running jobs whose lease expired (their worker crashed or the
+        process was killed), failing those that have used all their attempts.
+        Jobs in exclude (the ones this process is running) are left alone.
+        One UPDATE, so a job can't be recovered twice by concurrent callers.
+        """
+        cutoff = time.time() - self.lease_seconds
+        placeholders = ", ".join("?" * len(exclude))
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "error = ?, updated_at = ? "
+                f"WHERE status = 'running' AND heartbeat_at < ? AND id NOT IN ({placeholders}) "
+                "RETURNING id, status",
+                (self.max_attempts, "Worker stopped while processing job", time.time(), cutoff, *exclude),
+            ).fetchall()
+        for row in rows:
+            if row["status"] == "failed":
+                self._pdf_path(row["id"]).unlink(missing_ok=True)
+        if rows and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return len(rows)
+
+    # -- workers -----------------------------------------------------------
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.recover_stale()
+        self._workers = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._heartbeat = asyncio.ensure_future(self._renew_leases())
+
+    async def stop(self):
+        """Cancel the worker tasks and requeue the jobs they were running."""
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat = None
+        for job_id in list(self._running):
+            self.fail(job_id, "Server shut down while processing job", retry=True)
+        self._running.clear()
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            job = await run_blocking(self.claim)
+            if job is None:
+                await run_blocking(self.recover_stale, tuple(self._running))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running.add(job["id"])
+            try:
+                await self._run_job(job["id"], job["ocr_engine"] or None)
+            finally:
+                self._running.discard(job["id"])
+
+    async def _renew_leases(self):
+        """Heartbeat task: renew the running jobs' leases while they run."""
+        interval = max(0.1, self.lease_seconds * HEARTBEAT_FRACTION)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_blocking(self.renew_leases, tuple(self._running))
+            except Exception as e:
+                print(f"Error renewing job leases: {str(e)}")
+
+    async def _run_job(self, job_id: str, ocr_engine: Optional[str] = None):
+        progress = ProgressWriter(self, job_id)
+        try:
+            file_content = await run_blocking(self._pdf_path(job_id).read_bytes)
+            response = await analyze_pdf(file_content, progress=progress, ocr_engine=ocr_engine)
+            await progress.flushed()
+            await run_blocking(self.complete, job_id, response.model_dump_json())
+        except asyncio.CancelledError:
+            raise
+        except FileNotFoundError:
+            await run_blocking(self.fail, job_id, "Uploaded file is missing")
+        except AnalysisError as e:
+            await run_blocking(self.fail, job_id, str(e))
+        except Exception as e:
+            print(f"Error running analysis job {job_id}: {str(e)}")
+            await run_blocking(self.fail, job_id, f"Analysis failed: {str(e)}", True)
+
+
+class ProgressWriter:
+    """
+    Progress callback for one job. The pipeline calls it on the event loop,
+    so it only records the transition; a single flush task writes what has
+    accumulated on the analysis pool, in order, one UPDATE per batch.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self._pending: Dict[str, str] = {}
+        self._task = None
+
+    def __call__(self, stage: str, state: str):
+        self._pending[stage] = state
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            states, self._pending = self._pending, {}
+            try:
+                await run_blocking(self.queue.update_progress, self.job_id, states)
+            except Exception as e:
+                print(f"Error recording job progress: {str(e)}")
+
+    async def flushed(self):
+        """Wait until every recorded transition is written."""
+        if self._task is not None:
+            await self._task
+
+
+# Lazy-initialized shared queue
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get the shared job queue, created on first use."""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(JOB_DB_PATH, JOB_STORAGE_DIR)
+    return _queue
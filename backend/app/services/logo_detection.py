@@ -1,116 +1,273 @@
 """
 Logo detection - Optimized for speed.
+Logos are looked up in the descriptor index (see logo_index), verified
+geometrically and scored by correlating each logo with the page region its
+fit maps it to. Logos with too few keypoints to index, and the index's
+misses (see FALLBACK_MAX_LOGOS), are searched by coarse-to-fine template
+matching on an image pyramid of the page, as is every logo when
+LOGO_MATCHER=template.
 """
+import math
+from typing import List, Optional, Tuple
 import cv2
 import numpy as np
-from PIL import Image
-import os
-from pathlib import Path
 from app.models.schemas import LogoDetectionData, LogoMatch
-from app.config import LOGOS_DIR, LOGO_MATCH_THRESHOLD
+from app.config import LOGO_MATCH_THRESHOLD, LOGO_MATCHER
+from app.services.logo_store import ReferenceLogo, get_logo_store, DETECTION_WIDTH
+from app.services.logo_index import get_logo_index
+from app.utils.page_raster import PageRaster
 
+# Pyramid matching: the page at DETECTION_WIDTH, halved PYRAMID_LEVELS - 1
+# times. Each logo width in LOGO_SCALES (as a fraction of the page width) is
+# searched exhaustively on the coarsest level where the logo is still
+# MIN_TEMPLATE_SIDE pixels; only the TOP_K best locations are refined on the
+# finer levels, with a narrower scale step and a small window each time, and
+# then on the full-resolution level until the step is down to FINE_SCALE_STEP.
+PYRAMID_LEVELS = 3
+LOGO_SCALES = tuple(float(s) for s in np.geomspace(0.05, 0.6, 8))
+SCALE_STEP = float(LOGO_SCALES[1] / LOGO_SCALES[0])
+FINE_SCALE_STEP = 1.01
+MIN_TEMPLATE_SIDE = 12
+TOP_K = 3
+REFINE_MARGIN = 4
+# Index fits are correlated at most this large (longest logo side, pixels)
+VERIFY_MAX_DIM = 256
+# When the index finds no logo, the whole catalog is template-matched if it
+# has at most FALLBACK_MAX_LOGOS logos, else the FALLBACK_CANDIDATES logos
+# it voted for most but couldn't verify
+FALLBACK_CANDIDATES = 3
+FALLBACK_MAX_LOGOS = 20
 
-def detect_logos(image: Image.Image) -> LogoDetectionData:
+
+def detect_logos(image: PageRaster) -> LogoDetectionData:
     """
     Fast logo detection - optimized for speed.
     """
     matches = []
     flag = False
-    
+
     try:
-        # Quick check if logos directory exists and has files
-        if not LOGOS_DIR.exists() or not any(LOGOS_DIR.iterdir()):
-            return LogoDetectionData(matches=[], flag=False)
-        
-        # Convert PIL to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        gray_image = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-        
-        # Resize for faster processing
-        h, w = gray_image.shape
-        if w > 800:
-            ratio = 800 / w
-            gray_image = cv2.resize(gray_image, (800, int(h * ratio)), interpolation=cv2.INTER_LINEAR)
-        
-        # Load reference logos (limit to first 10 for speed)
-        reference_logos = load_reference_logos(limit=10)
-        
+        # Reference logos are preloaded in memory (no disk access here)
+        reference_logos = get_logo_store().logos
+
         if not reference_logos:
             return LogoDetectionData(matches=[], flag=False)
-        
-        # Fast matching with early exit
-        for logo_name, logo_image in reference_logos.items():
-            confidence = match_logo_fast(gray_image, logo_image)
-            
-            if confidence >= LOGO_MATCH_THRESHOLD:
-                matches.append(LogoMatch(name=logo_name, confidence=confidence))
-                # Early exit if high confidence match found
-                if confidence > 0.8:
-                    break
-        
+
+        raster = PageRaster.from_any(image)
+        template_logos = reference_logos
+        if LOGO_MATCHER == "index":
+            index = get_logo_index()
+            # Descriptors are taken at the analysis resolution (shared grayscale)
+            found_logos, unverified = index.query(raster.gray)
+            missed = list(unverified[:FALLBACK_CANDIDATES])
+            for found in found_logos:
+                logo = reference_logos.get(found["name"])
+                if logo is None:
+                    continue
+                confidence = fit_confidence(raster.gray, logo, found["transform"])
+                if confidence >= LOGO_MATCH_THRESHOLD:
+                    x0, y0, x1, y1 = found["box"]
+                    matches.append(LogoMatch(
+                        name=found["name"],
+                        confidence=confidence,
+                        box=normalized_box(x0, y0, x1, y1, raster.width, raster.height),
+                        scale=found["scale"],
+                    ))
+                else:
+                    missed.append(found["name"])
+            names = list(index.featureless)
+            if not matches:
+                names = list(reference_logos) if len(reference_logos) <= FALLBACK_MAX_LOGOS else names + missed
+            template_logos = {name: reference_logos[name] for name in names if name in reference_logos}
+
+        if template_logos:
+            # Resize for faster processing (grayscale is shared with other
+            # analyzers); the pyramid is built once and reused for every logo
+            page = raster.downscaled_to_width(DETECTION_WIDTH, cv2.INTER_LINEAR)
+            pyramid = page.gray_pyramid(PYRAMID_LEVELS)
+
+            # Fast matching with early exit
+            for logo_name, logo in template_logos.items():
+                found = match_logo_pyramid(pyramid, logo)
+
+                if found is not None and found["confidence"] >= LOGO_MATCH_THRESHOLD:
+                    matches.append(LogoMatch(
+                        name=logo_name,
+                        confidence=found["confidence"],
+                        box=found["box"],
+                        # Pixels of the analysis raster per logo pixel, like the index
+                        scale=round(found["scale"] * raster.width / page.width, 4),
+                    ))
+                    # Early exit if high confidence match found (not when
+                    # standing in for the index: a look-alike logo earlier in
+                    # the catalog can pass 0.8 before the real one is tried)
+                    if found["confidence"] > 0.8 and LOGO_MATCHER != "index":
+                        break
+
         # Sort matches by confidence
         matches.sort(key=lambda x: x.confidence, reverse=True)
-        
+
         # Flag if all matches are low confidence
         if matches and all(m.confidence < 0.7 for m in matches):
             flag = True
-        
+
         return LogoDetectionData(matches=matches, flag=flag)
-        
+
     except Exception as e:
         print(f"Error in logo detection: {str(e)}")
         return LogoDetectionData(matches=[], flag=False)
 
 
-def load_reference_logos(limit: int = 10) -> dict:
-    """Load reference logos - limit for speed."""
-    logos = {}
-    
-    try:
-        if not LOGOS_DIR.exists():
-            return logos
-        
-        image_extensions = ['.png', '.jpg', '.jpeg', '.bmp']
-        count = 0
-        
-        for file_path in LOGOS_DIR.iterdir():
-            if count >= limit:
-                break
-            if file_path.suffix.lower() in image_extensions:
-                try:
-                    logo_image = cv2.imread(str(file_path), cv2.IMREAD_GRAYSCALE)
-                    if logo_image is not None:
-                        logo_name = file_path.stem
-                        logos[logo_name] = logo_image
-                        count += 1
-                except:
-                    continue
-                    
-    except Exception as e:
-        print(f"Error loading reference logos: {str(e)}")
-    
-    return logos
+def fit_confidence(gray: np.ndarray, logo: ReferenceLogo, transform: np.ndarray) -> float:
+    """
+    Correlation (TM_CCOEFF_NORMED, like the template matcher) between a logo
+    and the page region a logo-to-page transform maps it to.
+    """
+    height, width = logo.gray.shape[:2]
+    factor = min(1.0, VERIFY_MAX_DIM / max(height, width))
+    size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    # Page pixels sampled on the (reduced) logo grid
+    to_logo = np.float64([[factor, 0, 0], [0, factor, 0], [0, 0, 1]]) @ np.vstack([
+        cv2.invertAffineTransform(transform), [0, 0, 1]
+    ])
+    region = cv2.warpAffine(gray, to_logo[:2], size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    reference = logo.template(size[0])
+    if reference.shape != region.shape:
+        reference = cv2.resize(reference, size, interpolation=cv2.INTER_AREA)
+    score = cv2.matchTemplate(region, reference, cv2.TM_CCOEFF_NORMED)[0, 0]
+    return round(max(0.0, min(1.0, float(score))), 4)
+
 
+def normalized_box(x0: float, y0: float, x1: float, y1: float, width: int, height: int) -> List[float]:
+    """Pixel box as fractions of the page size, clipped to the page."""
+    return [
+        round(min(max(x0 / width, 0.0), 1.0), 4),
+        round(min(max(y0 / height, 0.0), 1.0), 4),
+        round(min(max(x1 / width, 0.0), 1.0), 4),
+        round(min(max(y1 / height, 0.0), 1.0), 4),
+    ]
 
-def match_logo_fast(certificate_image: np.ndarray, logo_image: np.ndarray) -> float:
-    """Fast logo matching using optimized template matching."""
+
+def match_logo_pyramid(pyramid: List[np.ndarray], logo: ReferenceLogo) -> Optional[dict]:
+    """
+    Find a logo on a grayscale page pyramid (see PageRaster.gray_pyramid).
+
+    Returns:
+        Dict with confidence (TM_CCOEFF_NORMED at full pyramid resolution),
+        box (normalized x0, y0, x1, y1) and scale (pyramid[0] pixels per
+        logo pixel), or None if the logo fits at no searched size
+    """
     try:
-        # Resize logo if needed
-        cert_h, cert_w = certificate_image.shape
-        logo_h, logo_w = logo_image.shape
-        
-        if logo_h > cert_h or logo_w > cert_w:
-            scale = min(cert_h / logo_h, cert_w / logo_w) * 0.9
-            new_w = int(logo_w * scale)
-            new_h = int(logo_h * scale)
-            logo_image = cv2.resize(logo_image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-        
-        # Fast template matching
-        result = cv2.matchTemplate(certificate_image, logo_image, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(result)
-        
-        return max(0.0, min(1.0, max_val))
-        
+        page_h, page_w = pyramid[0].shape[:2]
+        logo_h, logo_w = logo.gray.shape[:2]
+
+        # Coarse search: every scale on its coarsest usable level
+        candidates = []  # (score, level, scale, center_x, center_y) in pyramid[0] pixels
+        for fraction in LOGO_SCALES:
+            scale = page_w * fraction / logo_w
+            if logo_h * scale > page_h:
+                continue
+            level = _coarsest_level(len(pyramid), logo_w * scale, logo_h * scale)
+            if level is None:
+                continue
+            template = _template(logo, scale, level)
+            image = pyramid[level]
+            if template.shape[0] > image.shape[0] or template.shape[1] > image.shape[1]:
+                continue
+            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+            th, tw = template.shape[:2]
+            for score, x, y in _peaks(result, TOP_K, tw, th):
+                factor = 2 ** level
+                candidates.append((score, level, scale, (x + tw / 2) * factor, (y + th / 2) * factor))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        best = None
+        for score, level, scale, center_x, center_y in candidates[:TOP_K]:
+            step = SCALE_STEP
+            while level > 0:
+                level -= 1
+                step = math.sqrt(step)
+                refined = _refine(pyramid[level], logo, level, scale, step, center_x, center_y)
+                if refined is None:
+                    break
+                score, scale, center_x, center_y = refined
+            # A scale a few percent off costs a lot of correlation on detailed
+            # logos: keep halving the step (in log scale) at full resolution
+            while level == 0 and step > FINE_SCALE_STEP:
+                step = math.sqrt(step)
+                refined = _refine(pyramid[0], logo, 0, scale, step, center_x, center_y)
+                if refined is None:
+                    break
+                score, scale, center_x, center_y = refined
+            if level == 0 and (best is None or score > best[0]):
+                best = (score, scale, center_x, center_y)
+
+        if best is None:
+            return None
+        score, scale, center_x, center_y = best
+        half_w, half_h = logo_w * scale / 2, logo_h * scale / 2
+        return {
+            "confidence": max(0.0, min(1.0, float(score))),
+            "box": normalized_box(
+                center_x - half_w, center_y - half_h, center_x + half_w, center_y + half_h, page_w, page_h
+            ),
+            "scale": round(float(scale), 4),
+        }
+
     except Exception as e:
         print(f"Error matching logo: {str(e)}")
-        return 0.0
+        return None
+
+
+def _coarsest_level(levels: int, width: float, height: float) -> Optional[int]:
+    """Highest pyramid level at which the logo is still MIN_TEMPLATE_SIDE pixels."""
+    side = min(width, height)
+    for level in range(levels - 1, -1, -1):
+        if side / 2 ** level >= MIN_TEMPLATE_SIDE:
+            return level
+    return None
+
+
+def _template(logo: ReferenceLogo, scale: float, level: int) -> np.ndarray:
+    return logo.template(max(1, round(logo.gray.shape[1] * scale / 2 ** level)))
+
+
+def _peaks(result: np.ndarray, k: int, width: int, height: int) -> List[Tuple[float, int, int]]:
+    """Up to k best (score, x, y) of a match map, at least half a template apart."""
+    result = result.copy()
+    peaks = []
+    for _ in range(k):
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score <= -1.0:  # everything left is suppressed
+            break
+        peaks.append((float(score), x, y))
+        result[max(0, y - height // 2):y + height // 2 + 1, max(0, x - width // 2):x + width // 2 + 1] = -1.0
+    return peaks
+
+
+def _refine(
+    image: np.ndarray, logo: ReferenceLogo, level: int, scale: float, step: float,
+    center_x: float, center_y: float
+) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Best (score, scale, center_x, center_y) within REFINE_MARGIN pixels of a
+    coarser level's location, trying the scale and its neighbours one step away.
+    """
+    factor = 2 ** level
+    best = None
+    for trial in (scale / step, scale, scale * step):
+        template = _template(logo, trial, level)
+        th, tw = template.shape[:2]
+        left = int(round(center_x / factor - tw / 2))
+        top = int(round(center_y / factor - th / 2))
+        x0, y0 = max(0, left - REFINE_MARGIN), max(0, top - REFINE_MARGIN)
+        x1 = min(image.shape[1] - tw, left + REFINE_MARGIN)
+        y1 = min(image.shape[0] - th, top + REFINE_MARGIN)
+        if x1 < x0 or y1 < y0:
+            continue
+        window = image[y0:y1 + th, x0:x1 + tw]
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if best is None or score > best[0]:
+            best = (float(score), trial, (x0 + x + tw / 2) * factor, (y0 + y + th / 2) * factor)
+    return best
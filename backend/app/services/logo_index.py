@@ -0,0 +1,394 @@
+"""
+Feature-descriptor logo index.
+ORB keypoints and descriptors of every reference logo are extracted once and
+put into one FLANN LSH index. A page is matched by describing it once,
+looking its descriptors up in the index (cost grows sublinearly with the
+number of logos), and letting each match vote for the logo it came from and
+that logo's pose on the page (predicted from the matched keypoints' scale
+and orientation). Only the logos with the largest pose-consistent groups of
+matches are verified, by fitting a RANSAC similarity transform to them. The
+caller scores a fit by correlating the logo with the page region it maps to.
+
+The extracted features are saved to LOGO_INDEX_PATH and reused for logos
+whose file hasn't changed, so neither a restart nor adding one logo
+re-describes the whole catalog. (The LSH tables themselves are rebuilt on
+load: OpenCV can't reload a saved LSH index, and building it is cheap.)
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.config import LOGO_INDEX_PATH
+from app.services.logo_store import ReferenceLogo, get_logo_store
+
+FLANN_INDEX_LSH = 6
+_LSH_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=16, key_size=24, multi_probe_level=1)
+_SEARCH_PARAMS = dict(checks=32)
+
+# Logos are described at most this large (longest side, pixels), and again
+# at each of LOGO_DESCRIBE_SCALES of that size (down to LOGO_MIN_SIDE pixels):
+# ORB's own pyramid gives a logo's coarse levels few keypoints, too few to
+# find it printed at half size
+LOGO_FEATURE_MAX_DIM = 400
+LOGO_DESCRIBE_SCALES = (1.0, 0.7, 0.5, 0.35)
+LOGO_MIN_SIDE = 48
+LOGO_FEATURES = 300
+# ORB takes no keypoints within its patch size of the image border; logos are
+# padded by that much (with their own background) so their rims, which on a
+# page have surroundings, are described too
+LOGO_PADDING = 32
+# Page keypoints are spread over a PAGE_GRID x PAGE_GRID grid, at most
+# PAGE_FEATURES in all: left to ORB, the densest text takes every keypoint
+# and a logo in a corner gets none
+PAGE_FEATURES = 5000
+PAGE_GRID = 16
+# Logos with fewer keypoints can't be verified geometrically
+MIN_LOGO_FEATURES = 15
+# Lowe's ratio test, against the nearest of RATIO_NEIGHBOURS neighbours that
+# is a different point: another logo's, or the same logo's more than
+# DUPLICATE_RADIUS logo widths away (a logo point described at several scales
+# would otherwise reject itself); and an absolute cap on the Hamming
+# distance (of 256 bits)
+RATIO = 0.8
+RATIO_NEIGHBOURS = 4
+DUPLICATE_RADIUS = 0.05
+MAX_HAMMING = 64
+# Candidates: the TOP_K logos with the most matches agreeing on one pose of
+# the logo (raw vote counts favour logos whose lettering matches the body
+# text), at least MIN_INLIERS of them
+TOP_K = 5
+MIN_VOTES = 8
+MIN_INLIERS = 5
+# Matches agree on a pose when the logo centres they predict are within
+# POSE_RADIUS logo widths and their scales within a factor POSE_SCALE
+POSE_RADIUS = 0.25
+POSE_SCALE = 1.5
+
+INDEX_FORMAT = 2
+
+
+def create_orb(n_features: int):
+    return cv2.ORB_create(nfeatures=n_features)
+
+
+def keypoint_array(keypoints) -> np.ndarray:
+    """(N, 4) float32: x, y, size and angle (degrees) of each keypoint."""
+    return np.array([(*kp.pt, kp.size, kp.angle) for kp in keypoints], dtype=np.float32).reshape(-1, 4)
+
+
+def describe(gray: np.ndarray, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ORB keypoints (N, 4, see keypoint_array) and descriptors (N, 32) uint8."""
+    keypoints, descriptors = create_orb(n_features).detectAndCompute(gray, None)
+    if descriptors is None or not keypoints:
+        return np.empty((0, 4), np.float32), np.empty((0, 32), np.uint8)
+    return keypoint_array(keypoints), descriptors
+
+
+def describe_page(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ORB features of a page, keeping the strongest keypoints of each grid cell."""
+    orb = create_orb(PAGE_FEATURES * 4)
+    keypoints = orb.detect(gray, None)
+    if not keypoints:
+        return np.empty((0, 4), np.float32), np.empty((0, 32), np.uint8)
+    height, width = gray.shape[:2]
+    points = np.array([kp.pt for kp in keypoints], dtype=np.float32)
+    responses = np.array([kp.response for kp in keypoints], dtype=np.float32)
+    cells = (
+        np.minimum((points[:, 1] * PAGE_GRID / height).astype(np.int32), PAGE_GRID - 1) * PAGE_GRID
+        + np.minimum((points[:, 0] * PAGE_GRID / width).astype(np.int32), PAGE_GRID - 1)
+    )
+    # Rank within each cell by response, strongest first
+    order = np.lexsort((-responses, cells))
+    starts = np.searchsorted(cells[order], cells[order])
+    rank = np.arange(len(order)) - starts
+    # Blank cells (margins) leave their share to the others
+    occupied = len(np.unique(cells))
+    keep = order[rank < max(1, PAGE_FEATURES // occupied)]
+    keypoints, descriptors = orb.compute(gray, [keypoints[i] for i in keep])
+    if descriptors is None or not keypoints:
+        return np.empty((0, 4), np.float32), np.empty((0, 32), np.uint8)
+    return keypoint_array(keypoints), descriptors
+
+
+def describe_logo(logo: ReferenceLogo) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    """Features of a logo (all scales) in its original pixel coordinates, plus its size."""
+    height, width = logo.gray.shape[:2]
+    base = min(1.0, LOGO_FEATURE_MAX_DIM / max(height, width))
+    all_points, all_descriptors = [], []
+    for factor in LOGO_DESCRIBE_SCALES:
+        scale = base * factor
+        if min(height, width) * scale < LOGO_MIN_SIDE and all_points:
+            break
+        gray = logo.gray
+        if scale < 1.0:
+            gray = cv2.resize(
+                gray, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA
+            )
+        background = int(np.median(np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])))
+        padded = cv2.copyMakeBorder(
+            gray, LOGO_PADDING, LOGO_PADDING, LOGO_PADDING, LOGO_PADDING, cv2.BORDER_CONSTANT, value=background
+        )
+        points, descriptors = describe(padded, LOGO_FEATURES)
+        # Position and size back in original pixels; the angle is unchanged
+        points[:, :2] -= LOGO_PADDING
+        all_points.append(points / np.float32([scale, scale, scale, 1.0]))
+        all_descriptors.append(descriptors)
+    return np.concatenate(all_points), np.concatenate(all_descriptors), (width, height)
+
+
+class LogoIndex:
+    """
+    Features of all indexed logos as flat arrays: row i of points (x, y,
+    size, angle) and descriptors belongs to logo owners[i].
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        signatures: List[tuple],
+        sizes: np.ndarray,
+        points: np.ndarray,
+        descriptors: np.ndarray,
+        owners: np.ndarray,
+        featureless: List[str],
+        fingerprint: str,
+    ):
+        self.names = names
+        self.signatures = signatures  # (size, mtime_ns) of each logo's file
+        self.sizes = sizes  # (L, 2) width, height
+        self.points = points
+        self.descriptors = descriptors
+        self.owners = owners
+        self.featureless = featureless  # too few keypoints: template-match these
+        self.fingerprint = fingerprint
+        self._flann = None
+        if len(descriptors):
+            self._flann = cv2.flann_Index()
+            self._flann.build(descriptors, _LSH_PARAMS)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def build(cls, logos: Dict[str, ReferenceLogo], fingerprint: str, previous: Optional["LogoIndex"] = None) -> "LogoIndex":
+        """Index a logo set, reusing the features of unchanged logos from previous."""
+        reusable = previous.features_by_logo() if previous is not None else {}
+        names, signatures, sizes, points, descriptors, owners, featureless = [], [], [], [], [], [], []
+        for name in sorted(logos):
+            logo = logos[name]
+            cached = reusable.get(name)
+            if cached is not None and cached[0] == logo.signature:
+                _, logo_points, logo_descriptors, size = cached
+            else:
+                logo_points, logo_descriptors, size = describe_logo(logo)
+            if len(logo_descriptors) < MIN_LOGO_FEATURES:
+                featureless.append(name)
+                continue
+            owners.append(np.full(len(logo_descriptors), len(names), dtype=np.int32))
+            names.append(name)
+            signatures.append(logo.signature)
+            sizes.append(size)
+            points.append(logo_points)
+            descriptors.append(logo_descriptors)
+        return cls(
+            names,
+            signatures,
+            np.array(sizes, dtype=np.float32).reshape(-1, 2),
+            np.concatenate(points) if points else np.empty((0, 4), np.float32),
+            np.concatenate(descriptors) if descriptors else np.empty((0, 32), np.uint8),
+            np.concatenate(owners) if owners else np.empty(0, np.int32),
+            featureless,
+            fingerprint,
+        )
+
+    def features_by_logo(self) -> Dict[str, tuple]:
+        """name -> (signature, points, descriptors, size) for every indexed logo."""
+        features = {}
+        order = np.argsort(self.owners, kind="stable")
+        bounds = np.searchsorted(self.owners[order], np.arange(len(self.names) + 1))
+        for i, name in enumerate(self.names):
+            rows = order[bounds[i]:bounds[i + 1]]
+            features[name] = (
+                self.signatures[i], self.points[rows], self.descriptors[rows],
+                tuple(int(v) for v in self.sizes[i]),
+            )
+        return features
+
+    def save(self, path=LOGO_INDEX_PATH):
+        """Persist the features (atomically, other processes may be reading)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format=np.int32(INDEX_FORMAT),
+                names=np.array(self.names, dtype=str),
+                signatures=np.array(self.signatures, dtype=np.int64).reshape(-1, 2),
+                sizes=self.sizes,
+                points=self.points,
+                descriptors=self.descriptors,
+                owners=self.owners,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=LOGO_INDEX_PATH) -> Optional["LogoIndex"]:
+        """Features saved by save(), or None if there are none usable."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["format"]) != INDEX_FORMAT:
+                    return None
+                return cls(
+                    [str(name) for name in data["names"]],
+                    [tuple(int(v) for v in row) for row in data["signatures"]],
+                    data["sizes"],
+                    data["points"],
+                    data["descriptors"],
+                    data["owners"],
+                    [],
+                    "",
+                )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading logo index: {str(e)}")
+            return None
+
+    def query(self, gray: np.ndarray) -> Tuple[List[dict], List[str]]:
+        """
+        Indexed logos found on a grayscale page, best first.
+
+        Returns:
+            (found, unverified): found is a list of dicts with name, inliers,
+            box (x0, y0, x1, y1 in page pixels), scale (page pixels per logo
+            pixel) and transform (2x3, logo to page pixels); unverified names
+            the candidates that got enough votes but failed geometric
+            verification, best first
+        """
+        if self._flann is None:
+            return [], []
+        page_points, page_descriptors = describe_page(gray)
+        if len(page_descriptors) < MIN_VOTES:
+            return [], []
+
+        neighbours = min(RATIO_NEIGHBOURS, len(self.descriptors))
+        indices, distances = self._flann.knnSearch(page_descriptors, neighbours, params=_SEARCH_PARAMS)
+        indices = indices.reshape(len(page_descriptors), -1)
+        distances = distances.reshape(len(page_descriptors), -1).astype(np.float32)
+        best = indices[:, 0]
+        # The ratio test compares against the nearest neighbour that is a
+        # different point (none among the neighbours: the match is
+        # unambiguous). LSH returns -1 when it finds fewer than k neighbours.
+        rows_k = np.maximum(indices, 0)
+        owners_k = self.owners[rows_k]
+        apart = np.linalg.norm(self.points[rows_k, :2] - self.points[rows_k[:, :1], :2], axis=2)
+        other = (indices[:, 1:] >= 0) & (
+            (owners_k[:, 1:] != owners_k[:, :1])
+            | (apart[:, 1:] > DUPLICATE_RADIUS * self.sizes[owners_k[:, :1], 0])
+        )
+        other_distance = np.where(other, distances[:, 1:], np.inf).min(axis=1)
+        good = (best >= 0) & (distances[:, 0] <= MAX_HAMMING) & (distances[:, 0] < RATIO * other_distance)
+        page_rows = np.nonzero(good)[0]
+        logo_rows = best[good]
+        owners = self.owners[logo_rows]
+
+        votes = np.bincount(owners, minlength=len(self.names))
+        groups = []  # (consensus size, logo, page points, logo rows, consensus)
+        for candidate in np.nonzero(votes >= max(MIN_VOTES, MIN_INLIERS))[0]:
+            selected = owners == candidate
+            points, rows = page_points[page_rows[selected]], logo_rows[selected]
+            consensus = self._consistent_pose(candidate, points, self.points[rows])
+            groups.append((len(consensus), candidate, points, rows, consensus))
+        groups.sort(key=lambda group: (-group[0], group[1]))
+
+        found, unverified = [], []
+        for size, candidate, points, rows, consensus in groups[:TOP_K]:
+            match = self._verify(candidate, points, rows, consensus) if size >= MIN_INLIERS else None
+            if match is not None:
+                found.append(match)
+            else:
+                unverified.append(self.names[candidate])
+        found.sort(key=lambda m: m["inliers"], reverse=True)
+        return found, unverified
+
+    def _consistent_pose(self, candidate: int, page_points: np.ndarray, logo_points: np.ndarray) -> np.ndarray:
+        """
+        Indices of the largest group of matches that agree on where the logo
+        is: from its keypoint's size and angle, each match predicts the
+        logo's scale and centre on the page. Matches from text elsewhere on
+        the page scatter; the logo's own cluster.
+        """
+        width, height = self.sizes[candidate]
+        scales = page_points[:, 2] / np.maximum(logo_points[:, 2], 1e-6)
+        angles = np.radians(page_points[:, 3] - logo_points[:, 3])
+        offset = np.float32([width / 2, height / 2]) - logo_points[:, :2]
+        cos, sin = np.cos(angles), np.sin(angles)
+        centers = page_points[:, :2] + scales[:, None] * np.stack(
+            [cos * offset[:, 0] - sin * offset[:, 1], sin * offset[:, 0] + cos * offset[:, 1]], axis=1
+        )
+        distance = np.linalg.norm(centers[:, None, :] - centers[None, :, :], axis=2)
+        agree = (distance <= POSE_RADIUS * scales[:, None] * max(width, height)) & (
+            np.abs(np.log(scales[:, None] / scales[None, :])) <= np.log(POSE_SCALE)
+        )
+        return np.nonzero(agree[int(np.argmax(agree.sum(axis=1)))])[0]
+
+    def _verify(
+        self, candidate: int, page_points: np.ndarray, logo_rows: np.ndarray, consensus: np.ndarray
+    ) -> Optional[dict]:
+        """
+        Fit a similarity transform (scale, rotation, shift: how logos appear
+        on certificates) from the logo to the page, over the matches that
+        agree on its pose (consensus, see _consistent_pose).
+        """
+        logo_points = self.points[logo_rows]
+        transform, mask = cv2.estimateAffinePartial2D(
+            logo_points[consensus, :2], page_points[consensus, :2],
+            method=cv2.RANSAC, ransacReprojThreshold=5.0, maxIters=500, confidence=0.9999,
+        )
+        if transform is None:
+            return None
+        inliers = int(mask.sum())
+        if inliers < MIN_INLIERS:
+            return None
+        scale = float(np.hypot(transform[0, 0], transform[1, 0]))
+        if scale < 0.05:
+            return None
+
+        width, height = self.sizes[candidate]
+        corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+        projected = corners @ transform[:, :2].T + transform[:, 2]
+        x0, y0 = projected.min(axis=0)
+        x1, y1 = projected.max(axis=0)
+        return {
+            "name": self.names[candidate],
+            "inliers": inliers,
+            "box": (float(x0), float(y0), float(x1), float(y1)),
+            "scale": round(scale, 4),
+            "transform": transform,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_logo_index() -> LogoIndex:
+    """
+    Get the index of the current logo set. It is rebuilt (reusing unchanged
+    logos' features, from memory or from disk) when the logo store changes.
+    """
+    global _index
+    store = get_logo_store()
+    fingerprint = store.fingerprint
+    if _index is not None and _index.fingerprint == fingerprint:
+        return _index
+    with _index_lock:
+        if _index is None or _index.fingerprint != fingerprint:
+            previous = _index if _index is not None else LogoIndex.load()
+            index = LogoIndex.build(store.logos, fingerprint, previous)
+            try:
+                index.save()
+            except OSError as e:
+                print(f"Error saving logo index: {str(e)}")
+            _index = index
+    return _index
@@ -0,0 +1,211 @@
+"""
+In-memory reference logo store.
+Every reference logo in LOGOS_DIR is decoded once and kept with the forms the
+matchers need (grayscale, scaled to the detection width), so logo detection
+does no disk I/O. A background thread polls the directory and reloads only the
+files that were added, changed (size or mtime) or removed. Files that fail to
+decode are remembered by size and mtime and not read again until they change.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+import cv2
+import numpy as np
+from app.config import LOGOS_DIR, LOGO_RELOAD_INTERVAL
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# Pages are matched at this width (see logo_detection), so logos are scaled
+# down once to fit inside it
+DETECTION_WIDTH = 800
+# Resized copies kept per logo
+MAX_TEMPLATES = 64
+
+
+class ReferenceLogo:
+    """One reference logo and its precomputed forms."""
+
+    def __init__(self, name: str, path: str, size: int, mtime_ns: int, gray: np.ndarray):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.gray = gray
+        self.scaled = fit_width(gray, int(DETECTION_WIDTH * 0.9))
+        self._templates: Dict[int, np.ndarray] = {}
+
+    def template(self, width: int) -> np.ndarray:
+        """The logo resized to width pixels wide (memoized per width)."""
+        template = self._templates.get(width)
+        if template is None:
+            height = max(1, round(self.gray.shape[0] * width / self.gray.shape[1]))
+            source = self.scaled if width <= self.scaled.shape[1] else self.gray
+            template = cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+            if len(self._templates) >= MAX_TEMPLATES:
+                self._templates.clear()
+            self._templates[width] = template
+        return template
+
+    @property
+    def signature(self) -> tuple:
+        return self.size, self.mtime_ns
+
+
+def logo_names(paths) -> Dict[str, str]:
+    """Logo name of each file: its stem, or its file name if the stem is shared."""
+    stems = {path: os.path.splitext(os.path.basename(path))[0] for path in paths}
+    counts: Dict[str, int] = {}
+    for stem in stems.values():
+        counts[stem] = counts.get(stem, 0) + 1
+    return {
+        path: stem if counts[stem] == 1 else os.path.basename(path)
+        for path, stem in stems.items()
+    }
+
+
+def fit_width(gray: np.ndarray, max_width: int) -> np.ndarray:
+    """Image scaled down (never up) so it is at most max_width wide."""
+    height, width = gray.shape[:2]
+    if width <= max_width:
+        return gray
+    scale = max_width / width
+    return cv2.resize(gray, (max_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+class LogoStore:
+    """
+    Reference logos keyed by name: the file name without its extension, or
+    with it when several files share a stem (logo.png and logo.jpg). Readers
+    get an immutable snapshot; a refresh builds a new one, so detection never
+    waits on a reload.
+    """
+
+    def __init__(self, directory=LOGOS_DIR):
+        self.directory = directory
+        self._logos: Dict[str, ReferenceLogo] = {}
+        # (size, mtime_ns) of every image file at the last refresh, and of
+        # those that failed to decode
+        self._entries: Dict[str, tuple] = {}
+        self._failed: Dict[str, tuple] = {}
+        self._fingerprint = hashlib.sha256().hexdigest()[:16]
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloads = 0
+
+    @property
+    def logos(self) -> Dict[str, ReferenceLogo]:
+        """Current snapshot (don't mutate it)."""
+        return self._logos
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of the logo set's file names, sizes and mtimes."""
+        return self._fingerprint
+
+    def refresh(self) -> bool:
+        """
+        Bring the store in line with the directory, decoding only files that
+        are new or changed. Returns whether anything changed.
+        """
+        with self._lock:
+            entries = {}
+            try:
+                for entry in os.scandir(self.directory):
+                    if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file():
+                        stat = entry.stat()
+                        entries[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+            if entries == self._entries:
+                return False
+
+            current = {logo.path: logo for logo in self._logos.values()}
+            failed = {}
+            logos = {}
+            names = logo_names(entries)
+            for path, signature in sorted(entries.items()):
+                logo = current.get(path)
+                if logo is None or logo.signature != signature:
+                    if self._failed.get(path) == signature:
+                        failed[path] = signature
+                        continue
+                    logo = self._load(names[path], path, *signature)
+                    if logo is None:
+                        failed[path] = signature
+                        continue
+                elif logo.name != names[path]:
+                    # A file with the same stem was added or removed
+                    logo = ReferenceLogo(names[path], path, *signature, logo.gray)
+                logos[logo.name] = logo
+
+            sha = hashlib.sha256()
+            for path, (size, mtime_ns) in sorted(entries.items()):
+                sha.update(f"{os.path.basename(path)}:{size}:{mtime_ns};".encode("utf-8"))
+            self._entries = entries
+            self._failed = failed
+            self._logos = logos
+            self._fingerprint = sha.hexdigest()[:16]
+            self.reloads += 1
+            return True
+
+    @staticmethod
+    def _load(name: str, path: str, size: int, mtime_ns: int) -> Optional[ReferenceLogo]:
+        try:
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                print(f"Error loading reference logo {name}: not a readable image")
+                return None
+            return ReferenceLogo(name, path, size, mtime_ns, gray)
+        except Exception as e:
+            print(f"Error loading reference logo {name}: {str(e)}")
+            return None
+
+    def start_watcher(self, interval: float = LOGO_RELOAD_INTERVAL):
+        """Poll the directory for changes on a daemon thread."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="logo-store-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reloading reference logos: {str(e)}")
+
+    def stop_watcher(self):
+        """Stop the polling thread and wait for a refresh in progress."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_logo_store() -> LogoStore:
+    """Get the shared logo store, loading it and starting its watcher on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = LogoStore()
+                store.refresh()
+                store.start_watcher()
+                _store = store
+    return _store
+
+
+def shutdown_logo_store():
+    """Stop the store's watcher thread (called on application shutdown)."""
+    global _store
+    if _store is not None:
+        _store.stop_watcher()
+        _store = None
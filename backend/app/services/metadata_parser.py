@@ -1,19 +1,22 @@
 """
 PDF metadata parsing service.
-Extracts and analyzes PDF metadata for suspicious patterns.
+Extracts and analyzes PDF metadata for suspicious patterns, using the
+request's PdfDocumentSession so the upload isn't parsed a second time.
 """
-from PyPDF2 import PdfReader
-import io
 from datetime import datetime
+from typing import Union
 from app.models.schemas import MetadataData
+from app.services.pdf_document import PdfDocumentSession
 
+SUSPICIOUS_SOFTWARE = ['photoshop', 'gimp', 'inkscape', 'illustrator']
 
-def parse_metadata(pdf_content: bytes) -> MetadataData:
+
+def parse_metadata(pdf_content: Union[PdfDocumentSession, bytes]) -> MetadataData:
     """
     Parse PDF metadata and check for suspicious patterns.
     
     Args:
-        pdf_content: PDF file content as bytes
+        pdf_content: PdfDocumentSession for the upload (raw bytes also accepted)
         
     Returns:
         MetadataData object with metadata and flags
@@ -25,30 +28,28 @@ def parse_metadata(pdf_content: bytes) -> MetadataData:
     software = ""
     
     try:
-        # Read PDF from bytes
-        pdf_file = io.BytesIO(pdf_content)
-        reader = PdfReader(pdf_file)
+        session = PdfDocumentSession.from_any(pdf_content)
         
         # Extract metadata
-        metadata = reader.metadata
+        metadata = session.metadata
         
         if metadata:
             # Extract dates
-            if '/CreationDate' in metadata:
-                created_date = format_pdf_date(metadata['/CreationDate'])
+            if metadata.get('creationDate'):
+                created_date = format_pdf_date(metadata['creationDate'])
             
-            if '/ModDate' in metadata:
-                modified_date = format_pdf_date(metadata['/ModDate'])
+            if metadata.get('modDate'):
+                modified_date = format_pdf_date(metadata['modDate'])
             
             # Extract author
-            if '/Author' in metadata:
-                author = str(metadata['/Author'])
+            if metadata.get('author'):
+                author = str(metadata['author'])
             
             # Extract software
-            if '/Producer' in metadata:
-                software = str(metadata['/Producer'])
-            elif '/Creator' in metadata:
-                software = str(metadata['/Creator'])
+            if metadata.get('producer'):
+                software = str(metadata['producer'])
+            elif metadata.get('creator'):
+                software = str(metadata['creator'])
             
             # Check for suspicious patterns
             if created_date and modified_date:
@@ -61,12 +62,18 @@ def parse_metadata(pdf_content: bytes) -> MetadataData:
                         flags.append("PDF modified after creation date")
                 except:
                     pass
-            
-            # Check for suspicious software
-            if software:
-                suspicious_software = ['photoshop', 'gimp', 'inkscape', 'illustrator']
-                if any(sus in software.lower() for sus in suspicious_software):
-                    flags.append(f"Suspicious creation software: {software}")
+        
+        xmp = session.xmp
+        
+        # Check for suspicious software (Info dict and XMP)
+        tools = [software, xmp.get('producer', ''), xmp.get('creator_tool', '')]
+        for tool in tools:
+            if tool and any(sus in tool.lower() for sus in SUSPICIOUS_SOFTWARE):
+                flags.append(f"Suspicious creation software: {tool}")
+                break
+        
+        flags.extend(check_structure(session))
+        flags.extend(check_xmp_consistency(metadata or {}, xmp))
         
     except Exception as e:
         print(f"Error parsing metadata: {str(e)}")
@@ -81,6 +88,66 @@ def parse_metadata(pdf_content: bytes) -> MetadataData:
     )
 
 
+def check_structure(session: PdfDocumentSession) -> list:
+    """Flag incremental updates and xref anomalies from the raw byte scan."""
+    flags = []
+    structure = session.structure
+    
+    # Each signature is applied as its own incremental update, so only
+    # updates beyond the signatures are suspicious
+    unexplained_updates = structure.incremental_updates - structure.signatures
+    if unexplained_updates > 0:
+        flags.append(
+            f"PDF incrementally updated after creation "
+            f"({structure.revisions} revisions, {structure.xref_sections} xref sections)"
+        )
+    
+    # Every saved revision ends with its own xref section (linearized files
+    # add one more for the first page)
+    expected_sections = structure.revisions + (1 if structure.linearized else 0)
+    if structure.xref_sections > expected_sections:
+        flags.append(
+            f"More cross-reference sections than revisions "
+            f"({structure.xref_sections} xref sections, {structure.revisions} revisions)"
+        )
+    
+    return flags
+
+
+def check_xmp_consistency(info: dict, xmp: dict) -> list:
+    """Flag XMP metadata that disagrees with the Info dictionary."""
+    if not xmp:
+        return []
+    
+    mismatches = []
+    if xmp.get('producer') and info.get('producer') and xmp['producer'] != info['producer']:
+        mismatches.append("producer")
+    if xmp.get('creator_tool') and info.get('creator') and xmp['creator_tool'] != info['creator']:
+        mismatches.append("creator")
+    if not same_timestamp(info.get('creationDate', ''), xmp.get('create_date', '')):
+        mismatches.append("creation date")
+    if not same_timestamp(info.get('modDate', ''), xmp.get('modify_date', '')):
+        mismatches.append("modification date")
+    
+    if mismatches:
+        return [f"XMP metadata does not match document info ({', '.join(mismatches)})"]
+    return []
+
+
+def same_timestamp(pdf_date: str, xmp_date: str) -> bool:
+    """
+    Compare an Info-dict date (D:YYYYMMDDHHmmSS...) with an XMP date
+    (YYYY-MM-DDTHH:mm:ss...) to the minute. Missing values count as equal.
+    """
+    if not pdf_date or not xmp_date:
+        return True
+    if pdf_date.startswith('D:'):
+        pdf_date = pdf_date[2:]
+    info_digits = ''.join(c for c in pdf_date if c.isdigit())[:12]
+    xmp_digits = ''.join(c for c in xmp_date if c.isdigit())[:12]
+    return info_digits[:len(xmp_digits)] == xmp_digits[:len(info_digits)]
+
+
 def format_pdf_date(pdf_date: str) -> str:
     """Format PDF date string to readable format."""
     try:
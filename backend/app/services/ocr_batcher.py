@@ -0,0 +1,173 @@
+"""
+OCR recognition micro-batching.
+Text detection runs per page, but the recognizer is far cheaper per line
+when fed many lines at once. Concurrent requests queue their text-line
+crops here; a single worker thread collects them for a short window (or
+until the batch is full), runs one recognizer call for the whole batch and
+hands every caller back its own lines.
+"""
+import itertools
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, List
+import numpy as np
+
+# Recognizer: list of line crops -> list of (text, confidence), same order
+Recognizer = Callable[[List[np.ndarray]], List[tuple]]
+
+
+class OCRBatcher:
+    """Collects text-line crops from concurrent callers into recognizer batches."""
+
+    def __init__(self, recognize: Recognizer, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.recognize_batch = recognize
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()  # (caller_id, crop, future, enqueued_at) or None to stop
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._caller_ids = itertools.count()
+        self._active_callers = 0
+
+        self.batches = 0
+        self.lines = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.batch_sizes = Counter()
+
+    def recognize(self, crops: List[np.ndarray]) -> List[tuple]:
+        """
+        Recognize the text lines of one caller, batched with whatever other
+        callers submit at the same time. Blocks until all lines are done.
+
+        Returns:
+            (text, confidence) per crop, in the same order
+
+        Raises:
+            RuntimeError: if the batcher is stopped (also for lines still
+                queued when it stopped)
+        """
+        if not crops:
+            return []
+
+        futures = []
+        now = time.monotonic()
+        # Lines are queued under the lock so none can land behind stop()'s
+        # sentinel, where the worker would never pick them up
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("OCR batcher is stopped")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+                self._thread.start()
+            caller_id = next(self._caller_ids)
+            self._active_callers += 1
+            for crop in crops:
+                future = Future()
+                self._queue.put((caller_id, crop, future, now))
+                futures.append(future)
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        try:
+            return [future.result() for future in futures]
+        finally:
+            with self._lock:
+                self._active_callers -= 1
+
+    def stats(self) -> dict:
+        """Queue depth and batch size metrics."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "active_callers": self._active_callers,
+                "batches": self.batches,
+                "lines": self.lines,
+                "mean_batch_size": self.lines / self.batches if self.batches else 0.0,
+                "mean_wait_ms": self.total_wait * 1000 / self.lines if self.lines else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def stop(self):
+        """
+        Stop the worker thread once the lines already queued are done. Later
+        calls to recognize raise, and any line the worker didn't get to
+        fails instead of leaving its caller waiting.
+        """
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[2].done():
+                item[2].set_exception(RuntimeError("OCR batcher is stopped"))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch, stopping = self._collect(item)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _collect(self, first: tuple) -> tuple:
+        """
+        Grow a batch from the queue until it's full, the wait window closes,
+        or every caller currently waiting already has its lines in it.
+
+        Returns:
+            (batch, stopping)
+        """
+        batch = [first]
+        callers = {first[0]}
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and len(callers) < self._active_callers:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    # Nobody else to wait for: only take lines already queued
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            callers.add(item[0])
+        return batch, False
+
+    def _process(self, batch: List[tuple]):
+        started = time.monotonic()
+        crops = [crop for _, crop, _, _ in batch]
+        try:
+            results = self.recognize_batch(crops)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Recognizer returned {len(results)} results for {len(batch)} lines")
+        except Exception as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+        with self._lock:
+            self.batches += 1
+            self.lines += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self.total_wait += sum(started - enqueued_at for _, _, _, enqueued_at in batch)
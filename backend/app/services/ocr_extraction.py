@@ -1,39 +1,119 @@
 """
-Simple OCR mode using PaddleOCR.
+Simple OCR mode using the configured OCR engine (PaddleOCR by default).
 
-We ONLY extract the full raw_text and don't try to guess fields like
-name, course, issuer, date, or certificate_id. Those stay empty strings.
+The recognized lines (boxes, text, confidence) are kept in a LineTable and
+the structured fields (name, course, issuer, date, certificate_id) are filled
+from it by the rules in app.services.field_extraction.
+
+Born-digital PDFs are read from their embedded text layer instead; OCR only
+runs for scanned pages or for image regions the text layer doesn't cover.
 """
-from PIL import Image
-import io
+from typing import Optional
 from app.models.schemas import OCRData
-from app.ocr_utils import run_ocr
+from app.ocr_backends import run_ocr_engine, DEFAULT_ENGINE
+from app.services.field_extraction import extract_fields
+from app.services.text_layer import TextLayer
+from app.utils.line_table import LineTable
+from app.utils.page_raster import PageRaster
+from app.utils.ocr_preprocess import preprocess_for_ocr
+from app.config import OCR_TEXT_LAYER_MODE
 
 
-def extract_ocr_data(image: Image.Image) -> OCRData:
+def ocr_image(gray, engine: str, profiles: list) -> tuple:
     """
-    Extract text data from certificate image using PaddleOCR.
+    Preprocess a grayscale image with an adaptively chosen profile and OCR it.
 
     Returns:
-        OCRData with raw_text filled, all other fields left empty.
+        (lines, preprocess_ms), lines being a LineTable in the image's
+        coordinates; the chosen profile is appended to profiles
     """
-    try:
-        # Convert PIL Image to bytes for OCR
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format="PNG")
-        image_bytes = img_buffer.getvalue()
+    image, profile, elapsed_ms = preprocess_for_ocr(gray)
+    if profile not in profiles:
+        profiles.append(profile)
+    # Run the selected OCR engine (see app.ocr_backends)
+    lines = run_ocr_engine(image, engine)
+    height, width = gray.shape[:2]
+    return LineTable.from_lines(lines, width, height), elapsed_ms
+
+
+def extract_text(
+    raster: PageRaster,
+    text_layer: Optional[TextLayer] = None,
+    engine: str = DEFAULT_ENGINE,
+) -> dict:
+    """
+    Get the page text from the text layer, OCR (with the given engine), or both.
+
+    Returns:
+        Dict with raw_text, lines (LineTable in raster coordinates), source
+        ("text_layer", "hybrid" or "ocr"), preprocess_profile and preprocess_ms
+    """
+    source = "ocr"
+    if text_layer is not None and OCR_TEXT_LAYER_MODE != "off":
+        source = text_layer.source()
+
+    profiles = []
+    preprocess_ms = 0.0
+    if source == "ocr":
+        lines, preprocess_ms = ocr_image(raster.gray, engine, profiles)
+        raw_text = " ".join(lines.texts)
+    else:
+        parts = [text_layer.text]
+        tables = [LineTable.from_lines(text_layer.lines(), raster.width, raster.height)]
+        if source == "hybrid":
+            # OCR only the image regions the text layer doesn't cover
+            for x0, y0, x1, y1 in text_layer.ocr_regions():
+                crop = raster.gray[int(y0):int(y1) + 1, int(x0):int(x1) + 1]
+                region_lines, elapsed_ms = ocr_image(crop, engine, profiles)
+                preprocess_ms += elapsed_ms
+                if len(region_lines):
+                    parts.append(" ".join(region_lines.texts))
+                    tables.append(region_lines.offset(int(x0), int(y0)))
+        raw_text = "\n".join(parts)
+        lines = LineTable.concat(tables, raster.width, raster.height)
+
+    return {
+        "raw_text": raw_text,
+        "lines": lines,
+        "source": source,
+        "preprocess_profile": ",".join(profiles),
+        "preprocess_ms": round(preprocess_ms, 2),
+    }
+
 
-        # Run PaddleOCR (already defined in app.ocr_utils.run_ocr)
-        raw_text = run_ocr(image_bytes) or ""
+def extract_ocr_data(
+    image: PageRaster,
+    text_layer: Optional[TextLayer] = None,
+    engine: str = DEFAULT_ENGINE,
+) -> OCRData:
+    """
+    Extract text data from certificate image using the selected OCR engine.
+
+    Args:
+        image: Shared page raster (PIL images are also accepted)
+        text_layer: Embedded text of the page, mapped to raster coordinates
+        engine: OCR engine name (see app.ocr_backends)
+
+    Returns:
+        OCRData with raw_text and source filled, plus whichever structured
+        fields the rules found (with their confidences)
+    """
+    try:
+        text = extract_text(PageRaster.from_any(image), text_layer, engine)
+        fields, field_confidence = extract_fields(text["lines"])
 
-        # SIMPLE MODE: don't try to parse name/course/etc.
         return OCRData(
-            name="",
-            course="",
-            issuer="",
-            date="",
-            certificate_id="",
-            raw_text=raw_text.strip(),
+            name=fields.get("name", ""),
+            course=fields.get("course", ""),
+            issuer=fields.get("issuer", ""),
+            date=fields.get("date", ""),
+            certificate_id=fields.get("certificate_id", ""),
+            field_confidence=field_confidence,
+            raw_text=text["raw_text"].strip(),
+            source=text["source"],
+            engine="" if text["source"] == "text_layer" else engine,
+            preprocess_profile=text["preprocess_profile"],
+            preprocess_ms=text["preprocess_ms"],
         )
 
     except Exception as e:
@@ -0,0 +1,93 @@
+"""
+Multi-page result aggregation.
+Combines the per-page analyzer results of a multi-page certificate (e.g. a
+transcript or a diploma with a verification page) into the single set of
+results the trust evaluation scores.
+"""
+from typing import Dict, List
+from app.models.schemas import (
+    OCRData, QRData, LogoDetectionData, TamperReport
+)
+
+
+def aggregate_ocr(pages: List[OCRData]) -> OCRData:
+    """
+    Join page texts in page order; the source is shared or "hybrid" if mixed.
+    Each structured field comes from the page that found it most confidently.
+    """
+    if len(pages) == 1:
+        return pages[0]
+    raw_text = "\n\n".join(page.raw_text for page in pages if page.raw_text)
+    sources = {page.source for page in pages}
+    source = sources.pop() if len(sources) == 1 else "hybrid"
+    engine = next((page.engine for page in pages if page.engine), "")
+    profiles = []
+    for page in pages:
+        for profile in filter(None, page.preprocess_profile.split(",")):
+            if profile not in profiles:
+                profiles.append(profile)
+    fields = {}
+    field_confidence = {}
+    for page in pages:
+        for field, confidence in page.field_confidence.items():
+            if confidence > field_confidence.get(field, 0.0):
+                fields[field] = getattr(page, field)
+                field_confidence[field] = confidence
+    return OCRData(
+        **fields,
+        field_confidence=field_confidence,
+        raw_text=raw_text,
+        source=source,
+        engine=engine,
+        preprocess_profile=",".join(profiles),
+        preprocess_ms=round(sum(page.preprocess_ms for page in pages), 2),
+    )
+
+
+def aggregate_qr(pages: List[QRData]) -> QRData:
+    """First QR code that validates, else the first one found on any page."""
+    found = [page for page in pages if page.found]
+    for qr_data in found:
+        if qr_data.validation == "valid":
+            return qr_data
+    return found[0] if found else QRData()
+
+
+def aggregate_logos(pages: List[LogoDetectionData]) -> LogoDetectionData:
+    """Union of logo matches across pages, keeping each logo's best confidence."""
+    best = {}
+    for index, page in enumerate(pages):
+        for match in page.matches:
+            if match.name not in best or match.confidence > best[match.name].confidence:
+                best[match.name] = match.model_copy(update={"page": index})
+    matches = sorted(best.values(), key=lambda m: m.confidence, reverse=True)
+    # Same rule as detect_logos: flag if all matches are low confidence
+    flag = bool(matches) and all(m.confidence < 0.7 for m in matches)
+    return LogoDetectionData(matches=matches, flag=flag)
+
+
+def aggregate_tamper(pages: List[TamperReport]) -> TamperReport:
+    """
+    The most suspicious page decides the score and supplies the heatmap,
+    grid and copy-move regions.
+    """
+    worst = max(pages, key=lambda page: page.score)
+    report = TamperReport(
+        score=worst.score,
+        heatmap=worst.heatmap,
+        grid=worst.grid,
+        signals=worst.signals,
+        copy_move=worst.copy_move,
+        page_scores=[page.score for page in pages],
+    )
+    report._artifacts = worst._artifacts
+    return report
+
+
+def aggregate_feature_maps(pages: List[Dict[str, float]]) -> Dict[str, float]:
+    """Feature map compute times (ms) summed over pages, costliest first."""
+    total: Dict[str, float] = {}
+    for page in pages:
+        for name, ms in page.items():
+            total[name] = total.get(name, 0.0) + ms
+    return {name: round(ms, 2) for name, ms in sorted(total.items(), key=lambda item: item[1], reverse=True)}
@@ -0,0 +1,196 @@
+"""
+PDF document session.
+Parses an upload once per request and serves everything the analyzers need
+from that single parse: page count, Info-dict metadata, XMP metadata,
+rendering and text-layer access. Structural forensics (incremental updates,
+xref sections, signatures, raw XMP packet) come from one regex scan over
+the raw bytes rather than a second PDF parser.
+"""
+import re
+import threading
+from typing import Iterator, Optional, Union
+import fitz  # PyMuPDF
+from app.services.pdf_to_png import (
+    render_page, render_region, DEFAULT_RENDER_DPI
+)
+from app.services.text_layer import TextLayer, extract_text_layer
+from app.utils.page_raster import PageRaster
+
+# Every structural token we care about, matched in a single pass
+_STRUCTURE_TOKENS = re.compile(
+    rb"(?P<eof>%%EOF)"
+    rb"|(?:^|[\r\n])(?P<xref>xref)\s"
+    rb"|(?P<xref_stream>/Type\s*/XRef)\b"
+    rb"|(?P<linearized>/Linearized)\b"
+    rb"|(?P<signature>/ByteRange)\b"
+    rb"|(?P<xmp><x:xmpmeta\b.*?</x:xmpmeta>)",
+    re.S,
+)
+
+# XMP properties compared against the Info dictionary; both the element and
+# the attribute serializations are common
+_XMP_FIELDS = {
+    "producer": "pdf:Producer",
+    "creator_tool": "xmp:CreatorTool",
+    "create_date": "xmp:CreateDate",
+    "modify_date": "xmp:ModifyDate",
+}
+
+
+def _xmp_value(packet: str, name: str) -> str:
+    match = re.search(rf"<{name}>([^<]*)</{name}>|{name}=\"([^\"]*)\"", packet)
+    if not match:
+        return ""
+    return (match.group(1) or match.group(2) or "").strip()
+
+
+def parse_xmp(packet: str) -> dict:
+    """Pull the producer, creator tool and dates out of an XMP packet."""
+    if not packet:
+        return {}
+    return {key: _xmp_value(packet, name) for key, name in _XMP_FIELDS.items()}
+
+
+class PdfStructure:
+    """Result of the single byte scan over the raw PDF."""
+
+    def __init__(self, pdf_content: bytes):
+        self.eof_markers = 0
+        self.xref_tables = 0
+        self.xref_streams = 0
+        self.signatures = 0
+        self.linearized = False
+        xmp_packet = b""
+
+        for match in _STRUCTURE_TOKENS.finditer(pdf_content):
+            kind = match.lastgroup
+            if kind == "eof":
+                self.eof_markers += 1
+            elif kind == "xref":
+                self.xref_tables += 1
+            elif kind == "xref_stream":
+                self.xref_streams += 1
+            elif kind == "signature":
+                self.signatures += 1
+            elif kind == "linearized":
+                self.linearized = True
+            elif kind == "xmp":
+                # The last packet belongs to the latest revision
+                xmp_packet = match.group("xmp")
+
+        self.xmp_packet = xmp_packet.decode("utf-8", errors="replace")
+
+    @property
+    def xref_sections(self) -> int:
+        return self.xref_tables + self.xref_streams
+
+    @property
+    def revisions(self) -> int:
+        """Saved revisions; linearized files carry one extra %%EOF up front."""
+        return max(1, self.eof_markers - (1 if self.linearized else 0))
+
+    @property
+    def incremental_updates(self) -> int:
+        return self.revisions - 1
+
+
+class PdfDocumentSession:
+    """
+    One parsed PDF per request. The PyMuPDF document is opened lazily and
+    every access goes through the session's own lock: a document (and its
+    pages) mustn't be driven from several threads at once, but different
+    documents may be. PyMuPDF keeps the GIL while MuPDF runs, so MuPDF's
+    shared state never sees two threads either.
+    """
+
+    def __init__(self, pdf_content: bytes):
+        self.content = pdf_content
+        self._document = None
+        self._structure = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_any(cls, source: Union["PdfDocumentSession", bytes]) -> "PdfDocumentSession":
+        if isinstance(source, PdfDocumentSession):
+            return source
+        return cls(source)
+
+    @property
+    def document(self) -> fitz.Document:
+        if self._document is None:
+            with self._lock:
+                if self._document is None:
+                    self._document = fitz.open(stream=self.content, filetype="pdf")
+        return self._document
+
+    @property
+    def page_count(self) -> int:
+        with self._lock:
+            return self.document.page_count
+
+    @property
+    def metadata(self) -> dict:
+        """Info-dict metadata as reported by PyMuPDF."""
+        with self._lock:
+            return self.document.metadata or {}
+
+    @property
+    def structure(self) -> PdfStructure:
+        if self._structure is None:
+            self._structure = PdfStructure(self.content)
+        return self._structure
+
+    @property
+    def xmp(self) -> dict:
+        """XMP metadata, from the raw packet or (if it's compressed) the parsed document."""
+        packet = self.structure.xmp_packet
+        if not packet:
+            with self._lock:
+                packet = self.document.get_xml_metadata() or ""
+        return parse_xmp(packet)
+
+    def render_page(
+        self,
+        page_number: int = 0,
+        max_dim: Optional[int] = None,
+        dpi: int = DEFAULT_RENDER_DPI,
+        clip: Optional[fitz.Rect] = None,
+    ) -> PageRaster:
+        with self._lock:
+            return render_page(self.document[page_number], max_dim=max_dim, dpi=dpi, clip=clip)
+
+    def render_pages(self, max_dim: Optional[int] = None, dpi: int = DEFAULT_RENDER_DPI) -> Iterator[PageRaster]:
+        """Render pages one at a time, so only one page is held at once."""
+        for page_number in range(self.page_count):
+            yield self.render_page(page_number, max_dim=max_dim, dpi=dpi)
+
+    def render_region(self, page_number: int, region: tuple, raster_size: tuple, dpi: int = 400) -> PageRaster:
+        """
+        Render a region of a page at a higher DPI. region is (x0, y0, x1, y1)
+        in the pixels of a raster of raster_size (width, height) rendered
+        from the same page.
+        """
+        with self._lock:
+            page = self.document[page_number]
+            # Clip rectangles are in page.rect space, which only differs
+            # from the raster's pixels by scale
+            width, height = raster_size
+            rect = fitz.Rect(region) * fitz.Matrix(page.rect.width / width, page.rect.height / height)
+            return render_region(page, rect, dpi=dpi)
+
+    def text_layer(self, page_number: int, raster: PageRaster) -> TextLayer:
+        """Embedded text of a page, mapped onto a raster rendered from it."""
+        with self._lock:
+            return extract_text_layer(self.document[page_number], raster.width, raster.height)
+
+    def close(self):
+        if self._document is not None:
+            with self._lock:
+                self._document.close()
+            self._document = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,51 +1,122 @@
 """
 PDF to PNG conversion service - Optimized.
-Converts PDF certificate to PNG image for analysis.
+Renders PDF pages straight into NumPy arrays for analysis: the zoom matrix
+is computed for the requested size so no resize pass is needed, and the
+pixmap samples are wrapped without copying or PNG encoding.
 """
 from PIL import Image
 import fitz  # PyMuPDF
-import io
+import numpy as np
 from typing import Optional
+from app.utils.page_raster import PageRaster
 
+# PDF user space is 72 units per inch
+PDF_BASE_DPI = 72
+DEFAULT_RENDER_DPI = 200
 
-def convert_pdf_to_png(pdf_content: bytes, dpi: int = 200) -> Optional[Image.Image]:
+
+def render_zoom(page: fitz.Page, max_dim: Optional[int] = None, dpi: int = DEFAULT_RENDER_DPI) -> float:
+    """
+    Zoom factor for rendering a page at dpi, capped so the longest side of
+    the result is at most max_dim pixels.
+    """
+    zoom = dpi / PDF_BASE_DPI
+    if max_dim:
+        longest = max(page.rect.width, page.rect.height)
+        if longest > 0:
+            zoom = min(zoom, max_dim / longest)
+    return zoom
+
+
+def pixmap_to_array(pix: fitz.Pixmap) -> np.ndarray:
+    """
+    Wrap pixmap samples as an HxWxN uint8 array without copying. The array
+    is only valid while the pixmap is alive.
+    """
+    buffer = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    row_bytes = pix.width * pix.n
+    if pix.stride == row_bytes:
+        return buffer.reshape(pix.height, pix.width, pix.n)
+    # Padded rows: view past the padding instead of copying
+    return buffer.reshape(pix.height, pix.stride)[:, :row_bytes].reshape(pix.height, pix.width, pix.n)
+
+
+def render_page(
+    page: fitz.Page,
+    max_dim: Optional[int] = None,
+    dpi: int = DEFAULT_RENDER_DPI,
+    clip: Optional[fitz.Rect] = None,
+) -> PageRaster:
+    """
+    Render a page (or a clip rectangle of it) into a PageRaster.
+
+    Args:
+        page: PyMuPDF page
+        max_dim: Optional cap on the longest side of the full page, in pixels
+        dpi: Target resolution
+        clip: Optional region of the page, in PDF points of page.rect (i.e.
+            with the page rotation applied, like the rendered raster)
+
+    Returns:
+        PageRaster over the pixmap samples (the raster keeps the pixmap alive)
+    """
+    zoom = render_zoom(page, max_dim, dpi)
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False, clip=clip
+    )
+    return PageRaster(pixmap_to_array(pix), owner=pix)
+
+
+def raster_matrix(page: fitz.Page, raster_width: int, raster_height: int) -> fitz.Matrix:
+    """
+    Matrix from unrotated page coordinates (as used by get_text, image info
+    and clip rectangles) to the pixels of a raster rendered from the page.
+    page.rect already has the page rotation applied.
+    """
+    scale = fitz.Matrix(raster_width / page.rect.width, raster_height / page.rect.height)
+    return page.rotation_matrix * scale
+
+
+def render_region(page: fitz.Page, rect: fitz.Rect, dpi: int = 400) -> PageRaster:
+    """Render a small page region (e.g. a suspected QR code) at high resolution."""
+    return render_page(page, dpi=dpi, clip=rect & page.rect)
+
+
+def render_pdf_page(
+    pdf_content: bytes,
+    page_number: int = 0,
+    max_dim: Optional[int] = None,
+    dpi: int = DEFAULT_RENDER_DPI,
+) -> Optional[PageRaster]:
+    """
+    Open a PDF from bytes and render one page into a PageRaster.
+
+    Returns:
+        PageRaster or None if the PDF can't be opened or has no such page
+    """
+    try:
+        with fitz.open(stream=pdf_content, filetype="pdf") as pdf_document:
+            if page_number >= pdf_document.page_count:
+                return None
+            return render_page(pdf_document[page_number], max_dim=max_dim, dpi=dpi)
+    except Exception as e:
+        print(f"Error rendering PDF page: {str(e)}")
+        return None
+
+
+def convert_pdf_to_png(pdf_content: bytes, dpi: int = DEFAULT_RENDER_DPI) -> Optional[Image.Image]:
     """
     Convert PDF content to PNG image - optimized for speed.
-    
+
     Args:
         pdf_content: PDF file content as bytes
         dpi: Resolution for conversion (default 200 for speed)
-        
+
     Returns:
         PIL Image object or None if conversion fails
     """
-    try:
-        # Open PDF from bytes
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        
-        # Check if PDF has pages
-        if pdf_document.page_count == 0:
-            pdf_document.close()
-            return None
-        
-        # Get first page (certificates are usually single page)
-        page = pdf_document[0]
-        
-        # Convert page to image with optimized DPI (200 instead of 300 for speed)
-        mat = fitz.Matrix(dpi / 72, dpi / 72)  # 72 is default DPI
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image
-        img_data = pix.tobytes("png")
-        image = Image.open(io.BytesIO(img_data))
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        pdf_document.close()
-        return image
-        
-    except Exception as e:
-        print(f"Error converting PDF to PNG: {str(e)}")
+    # Get first page (certificates are usually single page)
+    raster = render_pdf_page(pdf_content, 0, dpi=dpi)
+    if raster is None:
         return None
+    return Image.fromarray(raster.rgb.copy())
@@ -0,0 +1,132 @@
+"""
+Process-pool analysis workers.
+Each worker process warms up the default OCR engine and the OpenCV
+detectors once at spawn, and reads the rendered page from shared memory
+instead of receiving pickled PNG bytes. Results come back as the pydantic
+models the services already return, with the cost of the feature maps each
+worker built.
+
+Only light imports live at module level so the heavy ones happen in
+init_worker, after the per-worker thread limits are set.
+"""
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class SharedPage:
+    """Rendered page pixels copied once into a shared memory block (parent side)."""
+
+    def __init__(self, raster):
+        pixels = raster.rgb
+        self._shm = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+        view = np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=self._shm.buf)
+        view[:] = pixels
+        del view
+        self.handle = (self._shm.name, pixels.shape, pixels.dtype.str)
+
+    def close(self):
+        """Release and unlink the shared block once all stages are done."""
+        self._shm.close()
+        self._shm.unlink()
+
+
+# Why this worker's OCR engine failed to load, if it did (see ping)
+_ocr_load_error = None
+
+
+def init_worker(cpu_threads: int = 1):
+    """
+    Initialize a worker process: cap native thread pools so N workers don't
+    oversubscribe the machine, then build the default OCR engine and the QR
+    detector and load the reference logos and their index. An OCR engine
+    that fails to load is recorded rather than raised (a failing initializer
+    breaks the whole pool); ping reports it.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(cpu_threads)
+    os.environ["OCR_CPU_THREADS"] = str(cpu_threads)
+
+    import cv2
+    cv2.setNumThreads(cpu_threads)
+
+    from app.qr_utils import get_qr_detector
+    from app.services.logo_index import get_logo_index
+
+    _load_ocr()
+    get_qr_detector()
+    get_logo_index()
+
+
+def _load_ocr():
+    global _ocr_load_error
+    from app.ocr_backends import get_backend, resolve_engine
+
+    try:
+        get_backend(resolve_engine()).load()
+        _ocr_load_error = None
+    except Exception as e:
+        print(f"Worker OCR warm-up error: {str(e)}")
+        _ocr_load_error = str(e)
+
+
+def ping() -> int:
+    """
+    Task used to make the pool spawn (and so warm up) a worker and check it
+    came up: an OCR engine that failed to load is retried once more here.
+
+    Raises:
+        RuntimeError: If the worker's OCR engine still can't be loaded
+    """
+    if _ocr_load_error is not None:
+        _load_ocr()
+        if _ocr_load_error is not None:
+            raise RuntimeError(f"Worker OCR engine failed to load: {_ocr_load_error}")
+    return os.getpid()
+
+
+def _stage_functions() -> dict:
+    from app.services.ocr_extraction import extract_ocr_data
+    from app.services.qr_verification import detect_qr_code
+    from app.services.logo_detection import detect_logos
+    from app.services.tamper_detection import detect_tampering
+
+    return {
+        "ocr": extract_ocr_data,
+        "qr": detect_qr_code,
+        "logo": detect_logos,
+        "tamper": detect_tampering,
+    }
+
+
+def run_page_stage(stage: str, handle: tuple, *args):
+    """
+    Run one page analyzer against a shared page.
+
+    Args:
+        stage: One of "ocr", "qr", "logo", "tamper"
+        handle: SharedPage.handle (name, shape, dtype)
+        *args: Extra picklable arguments for the analyzer (e.g. a TextLayer)
+
+    Returns:
+        (result, feature_timings): the analyzer's pydantic result model and
+        the compute time (ms) of the feature maps it built in this worker
+    """
+    name, shape, dtype = handle
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # doesn't take ownership; the parent unlinks the block in SharedPage.close
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from app.utils.page_raster import PageRaster
+
+        pixels = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        raster = PageRaster(pixels)
+        result = _stage_functions()[stage](raster, *args)
+        timings = raster.feature_timings()
+        del raster, pixels
+        return result, timings
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # A lingering view will be released with the process; not fatal
+            pass
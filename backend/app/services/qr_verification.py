@@ -1,91 +1,91 @@
 """
-QR code detection and verification service using pyzbar.
-Detects QR codes in certificate and validates their content.
+QR code detection and verification service.
+Detects QR codes in the certificate (a blocking, CPU-bound step run on the
+analysis workers) and validates their content on the event loop: URLs of
+known issuers are answered from the offline issuer registry, anything else
+through the async, cached URL verifier.
 """
-from PIL import Image
-import io
-import requests
+from typing import Optional
 from urllib.parse import urlparse
 from app.models.schemas import QRData
-from app.qr_utils import decode_qr_from_image
+from app.qr_utils import decode_qr_from_image, RegionRenderer
+from app.services.issuer_registry import get_issuer_registry
+from app.services.url_verifier import get_url_verifier
+from app.utils.page_raster import PageRaster
 
 
-def verify_qr_code(image: Image.Image) -> QRData:
+def detect_qr_code(image: PageRaster, render_region: Optional[RegionRenderer] = None) -> QRData:
     """
-    Detect and verify QR codes in certificate image using pyzbar.
+    Detect and decode the QR code in a certificate image. The content isn't
+    validated yet (see verify_qr_data).
     
     Args:
-        image: PIL Image object
+        image: Shared page raster (PIL images are also accepted)
+        render_region: Optional high-DPI renderer for regions of this page
         
     Returns:
-        QRData object with QR code information and validation status
+        QRData object with QR code information
     """
     try:
-        # Convert PIL Image to bytes
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        image_bytes = img_buffer.getvalue()
-        
-        # Decode QR codes using pyzbar
-        qr_results = decode_qr_from_image(image_bytes)
+        qr_results = decode_qr_from_image(PageRaster.from_any(image), render_region)
         
         if qr_results and len(qr_results) > 0:
             # Get the first QR code found
             qr_data = qr_results[0]
-            content = qr_data.get('data', '')
-            
-            # Validate QR code content
-            validation = validate_qr_content(content)
-            
-            return QRData(
-                found=True,
-                content=content,
-                validation=validation
-            )
+            return QRData(found=True, content=qr_data.get('data', ''))
         else:
             return QRData(found=False, content="", validation="unverifiable")
         
     except Exception as e:
-        print(f"Error in QR verification: {str(e)}")
+        print(f"Error in QR detection: {str(e)}")
         return QRData(found=False, content="", validation="unverifiable")
 
 
-def validate_qr_content(content: str) -> str:
-    """Validate QR code content."""
+async def verify_qr_data(qr_data: QRData) -> QRData:
+    """Validate the content of a detected QR code (network access only for unknown URLs)."""
+    if not qr_data.found:
+        return qr_data
+    try:
+        validation, issuer, source = await validate_qr_content(qr_data.content)
+    except Exception as e:
+        print(f"Error in QR verification: {str(e)}")
+        validation, issuer, source = "unverifiable", "", ""
+    return qr_data.model_copy(update={
+        "validation": validation,
+        "issuer": issuer,
+        "source": source,
+    })
+
+
+async def validate_qr_content(content: str) -> tuple:
+    """
+    Validate QR code content.
+
+    Returns:
+        (validation, issuer, source); source says what answered for URLs:
+        "registry", "cache" or "network" (empty for non-URL content)
+    """
     if not content:
-        return "unverifiable"
+        return "unverifiable", "", ""
     
     try:
         parsed = urlparse(content)
         if parsed.scheme in ['http', 'https']:
-            return verify_url(content)
+            issuer = get_issuer_registry().lookup(content)
+            if issuer:
+                return "valid", issuer, "registry"
+            validation, cached = await verify_url(content)
+            return validation, "", "cache" if cached else "network"
         else:
             if len(content) > 10 and any(c.isalnum() for c in content):
-                return "unverifiable"
-            return "invalid"
-    except:
+                return "unverifiable", "", ""
+            return "invalid", "", ""
+    except ValueError:
         if len(content.strip()) > 0:
-            return "unverifiable"
-        return "invalid"
+            return "unverifiable", "", ""
+        return "invalid", "", ""
 
 
-def verify_url(url: str, timeout: int = 3) -> str:
-    """Verify if URL is accessible - optimized with shorter timeout."""
-    try:
-        response = requests.head(url, timeout=timeout, allow_redirects=True)
-        if response.status_code == 200:
-            return "valid"
-        elif response.status_code in [301, 302, 303, 307, 308]:
-            final_url = response.headers.get('Location', url)
-            final_response = requests.head(final_url, timeout=timeout)
-            if final_response.status_code == 200:
-                return "valid"
-            return "invalid"
-        else:
-            return "invalid"
-    except requests.exceptions.Timeout:
-        return "unverifiable"
-    except requests.exceptions.ConnectionError:
-        return "invalid"
-    except:
-        return "unverifiable"
+async def verify_url(url: str) -> tuple:
+    """Verify if URL is accessible; returns (validation, answered_from_cache)."""
+    return await get_url_verifier().verify(url)
@@ -0,0 +1,193 @@
+"""
+Content-addressed analysis result cache.
+Results are keyed by the SHA-256 of the uploaded PDF plus a version of the
+analyzer configuration, so re-uploads of the same certificate skip the whole
+pipeline while config or logo-set changes invalidate old entries.
+Entries live in a memory LRU and, optionally, as JSON files on disk; both
+tiers are bounded in bytes and drop their least recently used entries first.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from app.models.schemas import CertificateAnalysisResponse
+from app.services.logo_store import get_logo_store
+from app.utils.disk_budget import DiskBudget
+from app.config import (
+    TRUST_WEIGHTS, LOGO_MATCH_THRESHOLD, OCR_TEXT_LAYER_MODE, OCR_PREPROCESS_PROFILE,
+    QR_DETECTION_MODE, LOGO_MATCHER, ANALYSIS_MAX_PAGES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DISK,
+    RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES
+)
+
+# Bump when analyzer output changes so stale on-disk entries are ignored
+CACHE_SCHEMA_VERSION = 19
+
+
+def logo_set_fingerprint() -> str:
+    """Fingerprint of the loaded reference logo set (file names, sizes and mtimes)."""
+    return get_logo_store().fingerprint
+
+
+def config_version(ocr_engine: str = "", analyzers: str = "") -> str:
+    """Version string for everything (besides the PDF) that affects a result."""
+    config = {
+        "schema": CACHE_SCHEMA_VERSION,
+        "weights": TRUST_WEIGHTS,
+        "logo_threshold": LOGO_MATCH_THRESHOLD,
+        "logos": logo_set_fingerprint(),
+        "logo_matcher": LOGO_MATCHER,
+        "text_layer": OCR_TEXT_LAYER_MODE,
+        "ocr_engine": ocr_engine,
+        "preprocess": OCR_PREPROCESS_PROFILE,
+        "qr_detection": QR_DETECTION_MODE,
+        "analyzers": analyzers,
+        "max_pages": ANALYSIS_MAX_PAGES,
+    }
+    encoded = json.dumps(config, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def make_cache_key(pdf_content: bytes, ocr_engine: str = "", analyzers: str = "") -> str:
+    """
+    Cache key for an upload: content hash plus analyzer config version
+    (including the request's analyzer selection, see analyzer_selection).
+    """
+    return f"{hashlib.sha256(pdf_content).hexdigest()}-{config_version(ocr_engine, analyzers)}"
+
+
+class AnalysisResultCache:
+    """
+    Two-tier result cache: an in-memory LRU bounded by total serialized size,
+    backed by an optional directory of JSON files bounded by disk_max_bytes
+    (0 = unbounded).
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[Path] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._disk = None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk = DiskBudget(self.disk_dir, disk_max_bytes)
+
+        self._entries = OrderedDict()  # key -> serialized response (bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CertificateAnalysisResponse]:
+        """Look up a cached response, promoting disk hits into memory."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if data is None and self.disk_dir is not None:
+            data = self._read_disk(key)
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._store_memory(key, data)
+
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        return CertificateAnalysisResponse.model_validate_json(data)
+
+    def put(self, key: str, response: CertificateAnalysisResponse):
+        """Store a response in memory (and on disk when enabled)."""
+        data = response.model_dump_json().encode("utf-8")
+        self._store_memory(key, data)
+        if self.disk_dir is not None:
+            self._write_disk(key, data)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self.disk_dir is not None,
+                **self._disk_stats(),
+            }
+
+    def _disk_stats(self) -> dict:
+        if self._disk is None:
+            return {}
+        return {
+            "disk_size_bytes": self._disk.size,
+            "disk_max_bytes": self._disk.max_bytes,
+            "disk_evictions": self._disk.evictions,
+        }
+
+    def _store_memory(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            # Evict least recently used entries until we fit
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            data = path.read_bytes()
+            self._disk.touch(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading cached result: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cached result: {str(e)}")
+            return
+        self._disk.added(len(data))
+
+
+# Lazy-initialized shared cache
+_cache = None
+
+
+def get_result_cache() -> AnalysisResultCache:
+    """Get the shared result cache, created on first use."""
+    global _cache
+    if _cache is None:
+        _cache = AnalysisResultCache(
+            max_bytes=RESULT_CACHE_MAX_BYTES,
+            disk_dir=RESULT_CACHE_DIR if RESULT_CACHE_DISK else None,
+            disk_max_bytes=RESULT_CACHE_DISK_MAX_BYTES,
+        )
+    return _cache
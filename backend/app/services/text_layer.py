@@ -0,0 +1,129 @@
+"""
+Embedded PDF text-layer extraction.
+Born-digital certificates already carry their text, so reading it from the
+PDF is far cheaper than running OCR on the rendered page. Word boxes are
+mapped into the coordinates of the rendered raster so scanned regions can
+still be cropped and sent to OCR.
+"""
+import fitz  # PyMuPDF
+from typing import List, Tuple
+from app.services.pdf_to_png import raster_matrix
+from app.config import (
+    TEXT_LAYER_MIN_WORDS, TEXT_LAYER_MAX_IMAGE_COVERAGE, TEXT_LAYER_MIN_REGION_AREA
+)
+
+# (x0, y0, x1, y1) in raster pixels
+Box = Tuple[float, float, float, float]
+
+
+class TextLayer:
+    """Words and image regions of one page, in raster pixel coordinates."""
+
+    def __init__(self, words: List[tuple], image_boxes: List[Box], width: float, height: float):
+        self.words = words  # (x0, y0, x1, y1, text, block_no, line_no)
+        self.image_boxes = image_boxes
+        self.width = width
+        self.height = height
+
+    @property
+    def text(self) -> str:
+        """Page text in reading order, one line per text line."""
+        lines = []
+        current_key = None
+        for x0, y0, x1, y1, word, block_no, line_no in self.words:
+            key = (block_no, line_no)
+            if key != current_key:
+                lines.append([])
+                current_key = key
+            lines[-1].append(word)
+        return "\n".join(" ".join(line) for line in lines)
+
+    def lines(self) -> List[tuple]:
+        """Text lines as (box, text, confidence), the same shape OCR engines return."""
+        lines = []
+        current_key = None
+        for x0, y0, x1, y1, word, block_no, line_no in self.words:
+            key = (block_no, line_no)
+            if key != current_key:
+                lines.append([[x0, y0, x1, y1], [word]])
+                current_key = key
+            else:
+                box = lines[-1][0]
+                box[0], box[1] = min(box[0], x0), min(box[1], y0)
+                box[2], box[3] = max(box[2], x1), max(box[3], y1)
+                lines[-1][1].append(word)
+        # Embedded text is exact, so every line gets full confidence
+        return [(tuple(box), " ".join(words), 1.0) for box, words in lines]
+
+    def image_coverage(self) -> float:
+        """Fraction of the page covered by embedded images (upper bound, overlaps counted twice)."""
+        page_area = self.width * self.height
+        if page_area <= 0:
+            return 0.0
+        covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in self.image_boxes)
+        return min(1.0, covered / page_area)
+
+    def has_usable_text(self) -> bool:
+        """Whether the layer holds real text rather than nothing or encoding garbage."""
+        if len(self.words) < TEXT_LAYER_MIN_WORDS:
+            return False
+        text = "".join(w[4] for w in self.words)
+        # Fonts without a ToUnicode map extract as replacement characters
+        garbage = text.count("�")
+        return garbage <= len(text) * 0.1
+
+    def ocr_regions(self) -> List[Box]:
+        """
+        Image regions large enough to hold text and containing no text-layer
+        words: these may be scanned or pasted-in content that needs OCR.
+        """
+        page_area = self.width * self.height
+        regions = []
+        for box in self.image_boxes:
+            x0, y0, x1, y1 = box
+            if (x1 - x0) * (y1 - y0) < page_area * TEXT_LAYER_MIN_REGION_AREA:
+                continue
+            has_words = any(
+                wx0 >= x0 and wy0 >= y0 and wx1 <= x1 and wy1 <= y1
+                for wx0, wy0, wx1, wy1, *_ in self.words
+            )
+            if not has_words:
+                regions.append(box)
+        return regions
+
+    def source(self) -> str:
+        """
+        Which extraction the page needs: "text_layer", "hybrid" (text layer
+        plus OCR of image regions) or "ocr" (scanned / image-only page).
+        """
+        if not self.has_usable_text():
+            return "ocr"
+        if self.image_coverage() >= TEXT_LAYER_MAX_IMAGE_COVERAGE:
+            return "ocr"
+        if self.ocr_regions():
+            return "hybrid"
+        return "text_layer"
+
+
+def extract_text_layer(page: fitz.Page, raster_width: int, raster_height: int) -> TextLayer:
+    """
+    Read the words and image placements of a page, mapped onto a raster of
+    the given size (as produced by pdf_to_png.render_page).
+    """
+    # get_text/get_image_info report unrotated page coordinates; rendering
+    # applies the page rotation, so apply it here too before scaling
+    matrix = raster_matrix(page, raster_width, raster_height)
+
+    words = []
+    for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words", sort=True):
+        rect = fitz.Rect(x0, y0, x1, y1) * matrix
+        words.append((rect.x0, rect.y0, rect.x1, rect.y1, word, block_no, line_no))
+
+    image_boxes = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) * matrix
+        rect &= fitz.Rect(0, 0, raster_width, raster_height)
+        if not rect.is_empty:
+            image_boxes.append((rect.x0, rect.y0, rect.x1, rect.y1))
+
+    return TextLayer(words, image_boxes, raster_width, raster_height)
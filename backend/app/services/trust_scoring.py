@@ -2,6 +2,7 @@
 Trust score calculation service.
 Calculates weighted trust score based on all analysis results.
 """
+from typing import Collection, Dict, Optional, Tuple
 from app.models.schemas import (
     OCRData, MetadataData, QRData, LogoDetectionData,
     TamperReport, TrustEvaluation
@@ -9,12 +10,25 @@ from app.models.schemas import (
 from app.config import TRUST_WEIGHTS
 
 
+# Range of each stage's score (see the calculate_*_score functions). A stage
+# that didn't run is left out of the weighted average (the weights of the
+# others are renormalized); while it may still run, the trust score can fall
+# anywhere its range allows (see score_bounds).
+STAGE_SCORE_RANGES = {
+    "ocr": (0.0, 100.0),
+    "metadata": (0.0, 100.0),
+    "qr": (0.0, 100.0),
+    "logo": (25.0, 100.0),
+    "tamper": (0.0, 100.0),
+}
+
+
 def calculate_trust_score(
-    ocr_data: OCRData,
-    metadata: MetadataData,
-    qr_data: QRData,
-    logo_data: LogoDetectionData,
-    tamper_report: TamperReport
+    ocr_data: Optional[OCRData] = None,
+    metadata: Optional[MetadataData] = None,
+    qr_data: Optional[QRData] = None,
+    logo_data: Optional[LogoDetectionData] = None,
+    tamper_report: Optional[TamperReport] = None
 ) -> TrustEvaluation:
     """
     Calculate weighted trust score based on all analysis results.
@@ -25,75 +39,114 @@ def calculate_trust_score(
         qr_data: QR verification results
         logo_data: Logo detection results
         tamper_report: Tamper detection results
+        (None for a stage that was skipped: it gives no reasons and its
+        weight is shared among the stages that ran)
         
     Returns:
         TrustEvaluation with trust score, verdict, and reasons
     """
-    scores = {}
+    scores = stage_scores(ocr_data, metadata, qr_data, logo_data, tamper_report)
     reasons = []
     
-    # 1. OCR Score (0-100)
-    ocr_score = calculate_ocr_score(ocr_data)
-    scores['ocr'] = ocr_score
-    if ocr_score < 50:
+    # 1. OCR
+    if ocr_data is not None and scores['ocr'] < 50:
         reasons.append("Missing or incomplete certificate information")
     
-    # 2. Metadata Score (0-100)
-    metadata_score = calculate_metadata_score(metadata)
-    scores['metadata'] = metadata_score
-    if metadata.flags:
+    # 2. Metadata
+    if metadata is not None and metadata.flags:
         reasons.extend(metadata.flags)
     
-    # 3. QR Score (0-100)
-    qr_score = calculate_qr_score(qr_data)
-    scores['qr'] = qr_score
-    if qr_data.found and qr_data.validation == 'invalid':
-        reasons.append("QR code verification failed")
-    elif not qr_data.found:
-        reasons.append("No QR code found for verification")
-    
-    # 4. Logo Score (0-100)
-    logo_score = calculate_logo_score(logo_data)
-    scores['logo'] = logo_score
-    if logo_data.flag:
-        reasons.append("Low confidence logo matches detected")
-    elif not logo_data.matches:
-        reasons.append("No recognized issuer logos found")
-    
-    # 5. Tamper Score (0-100, inverted - lower tamper = higher score)
-    tamper_score = calculate_tamper_score(tamper_report)
-    scores['tamper'] = tamper_score
-    if tamper_report.score > 0.7:
-        reasons.append("High tamper detection score detected")
-    elif tamper_report.score > 0.5:
-        reasons.append("Moderate tamper indicators found")
+    # 3. QR
+    if qr_data is not None:
+        if qr_data.found and qr_data.validation == 'invalid':
+            reasons.append("QR code verification failed")
+        elif not qr_data.found:
+            reasons.append("No QR code found for verification")
+    
+    # 4. Logo
+    if logo_data is not None:
+        if logo_data.flag:
+            reasons.append("Low confidence logo matches detected")
+        elif not logo_data.matches:
+            reasons.append("No recognized issuer logos found")
+    
+    # 5. Tamper
+    if tamper_report is not None:
+        if tamper_report.score > 0.7:
+            reasons.append("High tamper detection score detected")
+        elif tamper_report.score > 0.5:
+            reasons.append("Moderate tamper indicators found")
     
     # Calculate weighted average
-    total_score = (
-        scores['ocr'] * TRUST_WEIGHTS['ocr'] +
-        scores['metadata'] * TRUST_WEIGHTS['metadata'] +
-        scores['qr'] * TRUST_WEIGHTS['qr'] +
-        scores['logo'] * TRUST_WEIGHTS['logo'] +
-        scores['tamper'] * TRUST_WEIGHTS['tamper']
-    )
-    
+    total_score, _ = score_bounds(scores)
     trust_score = int(round(total_score))
     
-    # Determine verdict
-    if trust_score >= 80:
-        verdict = "Valid"
-    elif trust_score >= 60:
-        verdict = "Suspicious"
-    else:
-        verdict = "Fake"
-    
     return TrustEvaluation(
         trust_score=trust_score,
-        verdict=verdict,
+        verdict=verdict_for(trust_score),
         reasons=reasons
     )
 
 
+def stage_scores(
+    ocr_data: Optional[OCRData] = None,
+    metadata: Optional[MetadataData] = None,
+    qr_data: Optional[QRData] = None,
+    logo_data: Optional[LogoDetectionData] = None,
+    tamper_report: Optional[TamperReport] = None
+) -> Dict[str, Optional[float]]:
+    """Score (0-100) of every stage, None for the stages that didn't run."""
+    return {
+        'ocr': calculate_ocr_score(ocr_data) if ocr_data is not None else None,
+        'metadata': calculate_metadata_score(metadata) if metadata is not None else None,
+        'qr': calculate_qr_score(qr_data) if qr_data is not None else None,
+        'logo': calculate_logo_score(logo_data) if logo_data is not None else None,
+        # Inverted - lower tamper = higher score
+        'tamper': calculate_tamper_score(tamper_report) if tamper_report is not None else None,
+    }
+
+
+def score_bounds(scores: Dict[str, Optional[float]], pending: Collection[str] = ()) -> Tuple[float, float]:
+    """
+    Lowest and highest weighted trust score (unrounded) the stage scores
+    allow, over the stages that ran or are in pending (weights renormalized
+    to sum to one). Pending stages may still run and span their whole range;
+    other stages without a score don't count. With no stage at all, the
+    score is the neutral 50.
+    """
+    low = high = total = 0.0
+    for stage, weight in TRUST_WEIGHTS.items():
+        score = scores.get(stage)
+        if score is not None:
+            least = most = score
+        elif stage in pending:
+            least, most = STAGE_SCORE_RANGES[stage]
+        else:
+            continue
+        low += least * weight
+        high += most * weight
+        total += weight
+    if total <= 0:
+        return 50.0, 50.0
+    return low / total, high / total
+
+
+def verdict_for(trust_score: int) -> str:
+    """Verdict for a (rounded) trust score."""
+    if trust_score >= 80:
+        return "Valid"
+    elif trust_score >= 60:
+        return "Suspicious"
+    else:
+        return "Fake"
+
+
+def verdict_settled(scores: Dict[str, Optional[float]], pending: Collection[str]) -> bool:
+    """Whether the verdict is the same whatever the pending stages score."""
+    low, high = score_bounds(scores, pending)
+    return verdict_for(int(round(low))) == verdict_for(int(round(high)))
+
+
 def calculate_ocr_score(ocr_data: OCRData) -> float:
     """Calculate OCR completeness score."""
     fields = [
@@ -0,0 +1,143 @@
+"""
+Async URL verification for QR codes.
+Checks whether a certificate's verification URL resolves, without tying up
+an analysis worker: requests go through one pooled httpx client on the event
+loop, at most QR_VERIFY_PER_HOST at a time per host so one slow issuer site
+can't soak up every connection. Outcomes (failures included) are cached for
+a while, and concurrent checks of the same URL share one request.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import httpx
+from app.config import (
+    QR_VERIFY_TIMEOUT, QR_VERIFY_MAX_CONNECTIONS, QR_VERIFY_PER_HOST,
+    QR_VERIFY_CACHE_SIZE, QR_VERIFY_CACHE_TTL, QR_VERIFY_NEGATIVE_TTL
+)
+
+# Servers that don't implement HEAD answer with one of these; retry with GET
+_HEAD_UNSUPPORTED = {405, 501}
+
+
+class UrlVerifier:
+    """Pooled, per-host limited and cached URL checker bound to one event loop."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.client = httpx.AsyncClient(
+            timeout=QR_VERIFY_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=QR_VERIFY_MAX_CONNECTIONS,
+                max_keepalive_connections=QR_VERIFY_MAX_CONNECTIONS,
+            ),
+        )
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # url -> (validation, expires)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def verify(self, url: str) -> Tuple[str, bool]:
+        """
+        Check a URL.
+
+        Returns:
+            (validation, cached): "valid", "invalid" or "unverifiable", and
+            whether the answer came from the cache
+        """
+        cached = self._cache_get(url)
+        if cached is not None:
+            self.hits += 1
+            return cached, True
+        self.misses += 1
+
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._check(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        # Shield: one caller being cancelled mustn't cancel the others' check
+        return await asyncio.shield(task), False
+
+    async def _check(self, url: str) -> str:
+        host = (urlparse(url).hostname or "").lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(QR_VERIFY_PER_HOST)
+        async with limit:
+            validation = await self._request(url)
+        ttl = QR_VERIFY_CACHE_TTL if validation == "valid" else QR_VERIFY_NEGATIVE_TTL
+        self._cache_put(url, validation, ttl)
+        return validation
+
+    async def _request(self, url: str) -> str:
+        try:
+            response = await self.client.head(url)
+            if response.status_code in _HEAD_UNSUPPORTED:
+                async with self.client.stream("GET", url) as response:
+                    pass
+            return "valid" if response.status_code == 200 else "invalid"
+        except httpx.TimeoutException:
+            return "unverifiable"
+        except httpx.ConnectError:
+            return "invalid"
+        except Exception:
+            return "unverifiable"
+
+    def _cache_get(self, url: str) -> Optional[str]:
+        entry = self._cache.get(url)
+        if entry is None:
+            return None
+        validation, expires = entry
+        if expires < time.monotonic():
+            del self._cache[url]
+            return None
+        self._cache.move_to_end(url)
+        return validation
+
+    def _cache_put(self, url: str, validation: str, ttl: float):
+        if ttl <= 0 or QR_VERIFY_CACHE_SIZE <= 0:
+            return
+        self._cache[url] = (validation, time.monotonic() + ttl)
+        self._cache.move_to_end(url)
+        while len(self._cache) > QR_VERIFY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._cache),
+            "inflight": len(self._inflight),
+            "hosts": len(self._host_limits),
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_verifier = None
+
+
+def get_url_verifier() -> UrlVerifier:
+    """
+    Get the URL verifier of the running event loop, created on first use.
+    The client's connections belong to one loop, so a verifier is rebuilt
+    if it is used from another one (e.g. a script calling asyncio.run twice).
+    """
+    global _verifier
+    if _verifier is None or _verifier.loop is not asyncio.get_running_loop():
+        _verifier = UrlVerifier()
+    return _verifier
+
+
+async def close_url_verifier():
+    """Close the pooled client (called on application shutdown)."""
+    global _verifier
+    if _verifier is not None:
+        verifier, _verifier = _verifier, None
+        if verifier.loop is asyncio.get_running_loop():
+            await verifier.aclose()
@@ -0,0 +1,133 @@
+"""
+Startup warm-up and readiness.
+Preloads the default OCR engine, the QR detector and the reference logos in the
+background when the app starts, then pushes a synthetic certificate page
+through the page analyzers (on the worker processes in process mode) so the
+first real request doesn't pay for model loading or first-inference setup.
+The OCR stage must read the page's text: an engine that loads but can't
+recognize anything fails the warm-up. The readiness probe reports not-ready
+until this has finished.
+"""
+import asyncio
+import time
+import cv2
+import numpy as np
+from app.config import (
+    ANALYSIS_EXECUTOR_MODE, ANALYSIS_PROCESS_WORKERS,
+    WARMUP_ENABLED, WARMUP_MAX_ATTEMPTS, WARMUP_RETRY_DELAY
+)
+from app.ocr_backends import get_backend, resolve_engine
+from app.qr_utils import get_qr_detector
+from app.services.logo_index import get_logo_index
+from app.services.analysis_executor import (
+    run_blocking, run_in_process, run_page_analyzers
+)
+from app.services.process_workers import ping
+from app.utils.page_raster import PageRaster
+
+
+class WarmupState:
+    """Progress of the startup warm-up, as reported by the readiness probe."""
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | ready | failed
+        self.steps = {}  # step -> elapsed milliseconds
+        self.attempts = 0
+        self.error = ""
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "steps": dict(self.steps),
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+_state = WarmupState()
+
+
+def get_warmup_state() -> WarmupState:
+    """Get the warm-up state shared with the readiness probe."""
+    return _state
+
+
+def synthetic_certificate() -> PageRaster:
+    """A plain certificate-like page: a few lines of text and a QR code."""
+    page = np.full((850, 1200, 3), 255, dtype=np.uint8)
+    lines = [
+        ("CERTIFICATE OF COMPLETION", 1.6, 120),
+        ("This is to certify that", 1.0, 260),
+        ("Jane Doe", 1.4, 340),
+        ("has successfully completed the course", 1.0, 420),
+        ("Issued 01 January 2024", 0.9, 700),
+    ]
+    for text, scale, y in lines:
+        cv2.putText(page, text, (120, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2, cv2.LINE_AA)
+
+    # Not a URL, so the QR stage doesn't go out to the network
+    qr = cv2.QRCodeEncoder.create().encode("EDUCRED-WARMUP-0001")
+    qr = cv2.resize(qr, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    height, width = qr.shape[:2]
+    page[600:600 + height, 950:950 + width] = cv2.cvtColor(qr, cv2.COLOR_GRAY2RGB)
+    return PageRaster(page)
+
+
+async def _timed(step: str, work):
+    started = time.perf_counter()
+    result = await work
+    _state.steps[step] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def _warm_up_once():
+    ocr_engine = resolve_engine()
+    if ANALYSIS_EXECUTOR_MODE == "process":
+        # Page analyzers run in the workers, and each worker builds its own
+        # models in its initializer: spawn them all now (ping raises if a
+        # worker's OCR engine didn't load)
+        await _timed("process_pool", asyncio.gather(
+            *(run_in_process(ping) for _ in range(ANALYSIS_PROCESS_WORKERS))
+        ))
+    else:
+        # Each getter is a thread-safe lazy singleton, so load them concurrently
+        await asyncio.gather(
+            _timed("ocr_model", run_blocking(get_backend(ocr_engine).load)),
+            _timed("qr_detector", run_blocking(get_qr_detector)),
+            _timed("logos", run_blocking(get_logo_index)),
+        )
+    page = await run_blocking(synthetic_certificate)
+    results = await _timed("inference", run_page_analyzers(page, ocr_engine=ocr_engine))
+    # The analyzers report their errors as empty results rather than raising
+    if not results["ocr_data"].raw_text:
+        raise RuntimeError(f"OCR engine {ocr_engine} read no text on the warm-up page")
+
+
+async def warm_up():
+    """
+    Run the warm-up in the background, retrying transient failures (e.g. a
+    model download timing out). Marks the service ready when done.
+    """
+    if not WARMUP_ENABLED:
+        _state.status = "ready"
+        return
+
+    _state.status = "running"
+    while True:
+        _state.attempts += 1
+        try:
+            await _warm_up_once()
+            _state.status = "ready"
+            _state.error = ""
+            return
+        except Exception as e:
+            print(f"Error during warm-up: {str(e)}")
+            _state.error = str(e)
+            if _state.attempts >= WARMUP_MAX_ATTEMPTS:
+                _state.status = "failed"
+                return
+            await asyncio.sleep(WARMUP_RETRY_DELAY)
@@ -0,0 +1,99 @@
+"""
+Size cap for cache directories.
+The result cache and the artifact store keep one or more files per entry in a
+directory. A DiskBudget tracks how many bytes they have written there and,
+once the directory goes over its cap, deletes whole entries, least recently
+used first (by file mtime; reads touch their files), until it is back under
+PRUNE_TO of the cap, so a burst of writes doesn't rescan the directory on
+every put.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Pruning stops at this fraction of the cap
+PRUNE_TO = 0.9
+
+
+def entry_of_file(file_name: str) -> str:
+    """Entry of a file: the file itself."""
+    return file_name
+
+
+def prune_directory(
+    directory: Path, max_bytes: int, entry_of: Callable[[str], str] = entry_of_file
+) -> Tuple[int, int]:
+    """
+    Delete the least recently used entries of a directory (its files grouped
+    by entry_of(file name); subdirectories and in-progress .tmp files are left
+    alone) until the rest fits in max_bytes. max_bytes <= 0 deletes nothing.
+
+    Returns:
+        (bytes left, entries deleted)
+    """
+    entries: Dict[str, List] = {}  # entry -> [last used (ns), size, paths]
+    try:
+        with os.scandir(directory) as scan:
+            for item in scan:
+                if item.name.endswith(".tmp") or not item.is_file():
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                entry = entries.setdefault(entry_of(item.name), [0, 0, []])
+                entry[0] = max(entry[0], stat.st_mtime_ns)
+                entry[1] += stat.st_size
+                entry[2].append(item.path)
+    except OSError as e:
+        print(f"Error scanning cache directory: {str(e)}")
+        return 0, 0
+
+    size = sum(entry[1] for entry in entries.values())
+    deleted = 0
+    if max_bytes <= 0:
+        return size, deleted
+    for _, entry_size, paths in sorted(entries.values(), key=lambda entry: entry[0]):
+        if size <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error pruning cache file: {str(e)}")
+        size -= entry_size
+        deleted += 1
+    return size, deleted
+
+
+class DiskBudget:
+    """Bytes written to a cache directory, pruned back under a cap."""
+
+    def __init__(self, directory: Path, max_bytes: int, entry_of: Callable[[str], str] = entry_of_file):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entry_of = entry_of
+        self._lock = threading.Lock()
+        self.evictions = 0
+        # Entries left over from earlier runs count against the cap too
+        self.size, _ = prune_directory(directory, max_bytes, entry_of)
+
+    def added(self, nbytes: int):
+        """Account for a write, pruning the directory if it went over the cap."""
+        with self._lock:
+            self.size += nbytes
+            if self.max_bytes <= 0 or self.size <= self.max_bytes:
+                return
+            self.size, deleted = prune_directory(self.directory, int(self.max_bytes * PRUNE_TO), self.entry_of)
+            self.evictions += deleted
+
+    @staticmethod
+    def touch(path: Path):
+        """Mark a file as just used, so pruning keeps it longer."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
@@ -0,0 +1,108 @@
+"""
+Array-backed table of text lines.
+Keeps the lines of a page (from OCR or from the PDF text layer) as parallel
+NumPy arrays of boxes and confidences plus a list of strings, so positional
+queries ("the line below this one", "lines in the top third") are a few
+vectorized comparisons instead of loops over per-line objects.
+"""
+from typing import Iterable, List, Sequence, Tuple
+import numpy as np
+
+# (box, text, confidence); box is (x0, y0, x1, y1) or a sequence of corner points
+Line = Tuple[Sequence, str, float]
+
+
+def box_from_points(box: Sequence) -> Tuple[float, float, float, float]:
+    """Axis-aligned (x0, y0, x1, y1) of a box given as corners or as a 4-tuple."""
+    points = np.asarray(box, dtype=np.float32)
+    if points.ndim == 1:
+        return tuple(float(v) for v in points[:4])
+    return (
+        float(points[:, 0].min()), float(points[:, 1].min()),
+        float(points[:, 0].max()), float(points[:, 1].max()),
+    )
+
+
+class LineTable:
+    """Text lines of one page in reading order, in page pixel coordinates."""
+
+    def __init__(self, boxes: np.ndarray, texts: List[str], confidences: np.ndarray, width: float, height: float):
+        self.boxes = boxes  # (N, 4) float32: x0, y0, x1, y1
+        self.texts = texts
+        self.confidences = confidences  # (N,) float32, 0..1
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[Line], width: float, height: float) -> "LineTable":
+        """Build a table from (box, text, confidence) lines, dropping empty ones."""
+        boxes, texts, confidences = [], [], []
+        for box, text, confidence in lines:
+            text = " ".join(str(text).split())
+            if text:
+                boxes.append(box_from_points(box))
+                texts.append(text)
+                confidences.append(float(confidence))
+        return cls(
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+            texts,
+            np.asarray(confidences, dtype=np.float32),
+            width,
+            height,
+        )
+
+    @classmethod
+    def concat(cls, tables: List["LineTable"], width: float, height: float) -> "LineTable":
+        """Lines of several tables (e.g. text layer plus OCR'd regions) as one."""
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.from_lines([], width, height)
+        return cls(
+            np.concatenate([table.boxes for table in tables]),
+            [text for table in tables for text in table.texts],
+            np.concatenate([table.confidences for table in tables]),
+            width,
+            height,
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def offset(self, dx: float, dy: float) -> "LineTable":
+        """Same lines moved by (dx, dy), e.g. from a crop into page coordinates."""
+        return LineTable(
+            self.boxes + np.float32([dx, dy, dx, dy]), self.texts, self.confidences,
+            self.width, self.height,
+        )
+
+    @property
+    def heights(self) -> np.ndarray:
+        return self.boxes[:, 3] - self.boxes[:, 1]
+
+    @property
+    def relative_tops(self) -> np.ndarray:
+        """Top of each line as a fraction of the page height."""
+        return self.boxes[:, 1] / max(self.height, 1)
+
+    def below(self, index: int, max_gap: float = 2.5) -> np.ndarray:
+        """
+        Lines under line index that overlap it horizontally and start within
+        max_gap line heights of its bottom, nearest first.
+        """
+        box = self.boxes[index]
+        line_height = max(box[3] - box[1], 1.0)
+        gaps = self.boxes[:, 1] - box[3]
+        overlaps = np.minimum(self.boxes[:, 2], box[2]) - np.maximum(self.boxes[:, 0], box[0])
+        mask = (gaps >= -0.5 * line_height) & (gaps <= max_gap * line_height) & (overlaps > 0)
+        mask[index] = False
+        candidates = np.nonzero(mask)[0]
+        return candidates[np.argsort(gaps[candidates], kind="stable")]
+
+    def right_of(self, index: int) -> np.ndarray:
+        """Lines on the same text row to the right of line index, nearest first."""
+        box = self.boxes[index]
+        centers = (self.boxes[:, 1] + self.boxes[:, 3]) / 2
+        mask = (centers >= box[1]) & (centers <= box[3]) & (self.boxes[:, 0] >= box[2] - 1)
+        mask[index] = False
+        candidates = np.nonzero(mask)[0]
+        return candidates[np.argsort(self.boxes[candidates, 0], kind="stable")]
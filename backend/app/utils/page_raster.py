@@ -0,0 +1,160 @@
+"""
+Shared page raster.
+Holds the rendered page as one RGB ndarray and lazily computes (and memoizes)
+the grayscale, BGR and downscaled variants and the feature maps (edges,
+pyramids, anything registered through feature()) the analyzers need, so each
+request decodes the page once and every analyzer reuses the same buffers.
+Each map's compute time is recorded, see feature_timings().
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Union
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class PageRaster:
+    """Rendered certificate page with memoized pixel variants."""
+
+    def __init__(self, rgb: np.ndarray, owner=None):
+        if rgb.ndim != 3 or rgb.shape[2] != 3 or rgb.dtype != np.uint8:
+            raise ValueError("PageRaster expects an HxWx3 uint8 RGB array")
+        self.rgb = rgb
+        # Object whose memory rgb points into (e.g. a PyMuPDF pixmap)
+        self._owner = owner
+        self._variants = {}
+        self._timings: Dict[str, float] = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "PageRaster":
+        """Wrap a PIL image (converted to RGB if needed)."""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return cls(np.asarray(image))
+
+    @classmethod
+    def from_any(cls, image: Union["PageRaster", Image.Image, np.ndarray, bytes]) -> "PageRaster":
+        """Accept a PageRaster, PIL image, RGB ndarray or encoded image bytes."""
+        if isinstance(image, PageRaster):
+            return image
+        if isinstance(image, Image.Image):
+            return cls.from_image(image)
+        if isinstance(image, (bytes, bytearray)):
+            decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if decoded is None:
+                raise ValueError("Could not decode image bytes")
+            return cls(cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB))
+        if isinstance(image, np.ndarray):
+            return cls(image)
+        raise TypeError(f"Unsupported image type: {type(image).__name__}")
+
+    @property
+    def width(self) -> int:
+        return self.rgb.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.rgb.shape[0]
+
+    @property
+    def size(self) -> tuple:
+        """(width, height), same convention as PIL."""
+        return self.width, self.height
+
+    def _memo(self, key, compute: Callable):
+        """Compute a variant once, even when several analyzer threads ask at once."""
+        variant = self._variants.get(key)
+        if variant is not None:
+            return variant
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            variant = self._variants.get(key)
+            if variant is None:
+                start = time.perf_counter()
+                variant = compute()
+                name = _map_name(key)
+                self._timings[name] = self._timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+                self._variants[key] = variant
+        return variant
+
+    def feature(self, name: str, compute: Callable):
+        """
+        A named feature map of this page, computed by compute() on first use
+        and shared by every analyzer asking for the same name afterwards.
+        """
+        return self._memo(name, compute)
+
+    def feature_timings(self) -> Dict[str, float]:
+        """
+        Compute time (ms) of every map computed so far, including those of
+        the downscaled variants (named "<width>x<height>/<map>").
+        """
+        timings = dict(self._timings)
+        for variant in list(self._variants.values()):
+            if isinstance(variant, PageRaster):
+                prefix = f"{variant.width}x{variant.height}/"
+                for name, ms in variant.feature_timings().items():
+                    timings[prefix + name] = timings.get(prefix + name, 0.0) + ms
+        return timings
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self._memo("gray", lambda: cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY))
+
+    @property
+    def bgr(self) -> np.ndarray:
+        return self._memo("bgr", lambda: cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR))
+
+    @property
+    def edges(self) -> np.ndarray:
+        """Canny edge map (50, 150) of the grayscale page."""
+        return self._memo("edges", lambda: cv2.Canny(self.gray, 50, 150))
+
+    def gray_pyramid(self, levels: int) -> List[np.ndarray]:
+        """Grayscale page halved levels - 1 times: [full size, 1/2, 1/4, ...]."""
+        def build():
+            pyramid = [self.gray]
+            for _ in range(levels - 1):
+                if min(pyramid[-1].shape[:2]) < 2:
+                    break
+                pyramid.append(cv2.pyrDown(pyramid[-1]))
+            return pyramid
+        return self._memo(("gray_pyramid", levels), build)
+
+    def downscaled(self, max_dim: int, interpolation: int = cv2.INTER_AREA) -> "PageRaster":
+        """Page scaled so its longest side is at most max_dim (self if it already fits)."""
+        longest = max(self.width, self.height)
+        if longest <= max_dim:
+            return self
+        ratio = max_dim / longest
+        return self._resized(int(self.width * ratio), int(self.height * ratio), interpolation)
+
+    def downscaled_to_width(self, max_width: int, interpolation: int = cv2.INTER_AREA) -> "PageRaster":
+        """Page scaled so its width is at most max_width (self if it already fits)."""
+        if self.width <= max_width:
+            return self
+        ratio = max_width / self.width
+        return self._resized(max_width, int(self.height * ratio), interpolation)
+
+    def _resized(self, width: int, height: int, interpolation: int) -> "PageRaster":
+        return self._memo(
+            ("resized", width, height, interpolation),
+            lambda: PageRaster(cv2.resize(self.rgb, (width, height), interpolation=interpolation)),
+        )
+
+    def to_image(self) -> Image.Image:
+        """PIL view of the RGB pixels (for encoding previews)."""
+        return Image.fromarray(self.rgb)
+
+
+def _map_name(key) -> str:
+    """Readable name of a memo key: "gray", "gray_pyramid/3", "resized/800x565"."""
+    if not isinstance(key, tuple):
+        return str(key)
+    if key[0] == "resized":
+        return f"resized/{key[1]}x{key[2]}"
+    return "/".join(str(part) for part in key)
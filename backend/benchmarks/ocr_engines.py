@@ -0,0 +1,195 @@
+"""
+OCR engine comparison benchmark.
+
+Runs every OCR engine over the same sample set and reports per-page latency,
+memory and text accuracy (1 - character/word error rate against a reference).
+
+Samples are PDFs and images in a directory. The reference text of a sample
+is read from a .txt file with the same name when there is one; otherwise
+born-digital PDFs use their embedded text layer. Samples without either
+are timed but not scored.
+
+Each engine runs in a fresh process so its memory numbers aren't mixed up
+with the other engines' models.
+
+Usage (from backend/):
+    python -m benchmarks.ocr_engines SAMPLES_DIR [--engines paddle,onnx,tesseract]
+                                                 [--repeat 3] [--json]
+"""
+import argparse
+import json
+import multiprocessing
+import re
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+PDF_SUFFIXES = {".pdf"}
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form used for scoring."""
+    return " ".join(text.lower().split())
+
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    """Levenshtein distance between two sequences (characters or words)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_item in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_item in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_item != hyp_item),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def error_rates(reference: str, hypothesis: str) -> Tuple[float, float]:
+    """(character error rate, word error rate) of hypothesis against reference."""
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    cer = edit_distance(list(reference), list(hypothesis)) / max(1, len(reference))
+    ref_words, hyp_words = reference.split(), hypothesis.split()
+    wer = edit_distance(ref_words, hyp_words) / max(1, len(ref_words))
+    return cer, wer
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_samples(samples_dir: Path) -> List[Tuple[str, object, Optional[str]]]:
+    """Render every sample the way the pipeline does: (name, raster, reference)."""
+    from app.services.pdf_document import PdfDocumentSession
+    from app.services.analysis_pipeline import ANALYSIS_MAX_DIM
+    from app.utils.page_raster import PageRaster
+
+    samples = []
+    for path in sorted(samples_dir.iterdir()):
+        suffix = path.suffix.lower()
+        if suffix not in PDF_SUFFIXES | IMAGE_SUFFIXES:
+            continue
+        truth_path = path.with_suffix(".txt")
+        reference = truth_path.read_text(encoding="utf-8") if truth_path.exists() else None
+
+        if suffix in IMAGE_SUFFIXES:
+            samples.append((path.name, PageRaster.from_any(path.read_bytes()), reference))
+            continue
+
+        with PdfDocumentSession(path.read_bytes()) as session:
+            for page_number in range(session.page_count):
+                raster = session.render_page(page_number, max_dim=ANALYSIS_MAX_DIM)
+                page_reference = reference
+                if page_reference is None:
+                    text_layer = session.text_layer(page_number, raster)
+                    if text_layer.has_usable_text():
+                        page_reference = text_layer.text
+                # Copy out of the pixmap so the raster outlives the document
+                samples.append((f"{path.name}#{page_number + 1}", PageRaster(raster.rgb.copy()), page_reference))
+    return samples
+
+
+def benchmark_engine(engine: str, samples_dir: str, repeat: int) -> dict:
+    """Benchmark one engine (runs in its own process)."""
+    from app.ocr_backends import get_backend
+    from app.utils.ocr_preprocess import preprocess_for_ocr
+
+    backend = get_backend(engine)
+    if not backend.available():
+        return {"engine": engine, "available": False}
+
+    # Same adaptive preprocessing as the pipeline, done once up front so only
+    # the engine itself is timed
+    samples = [
+        (name, preprocess_for_ocr(raster.gray)[0], reference)
+        for name, raster, reference in load_samples(Path(samples_dir))
+    ]
+    baseline_mb = peak_rss_mb()
+
+    started = time.perf_counter()
+    backend.load()
+    load_ms = (time.perf_counter() - started) * 1000
+    loaded_mb = peak_rss_mb()
+
+    latencies, cers, wers = [], [], []
+    for name, image, reference in samples:
+        # First call per page is a warm-up and isn't timed
+        text = backend.recognize(image)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            backend.recognize(image)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if reference:
+            cer, wer = error_rates(reference, text)
+            cers.append(cer)
+            wers.append(wer)
+
+    latencies.sort()
+    return {
+        "engine": engine,
+        "available": True,
+        "pages": len(samples),
+        "scored_pages": len(cers),
+        "load_ms": round(load_ms, 1),
+        "latency_mean_ms": round(statistics.fmean(latencies), 1) if latencies else None,
+        "latency_p50_ms": round(latencies[len(latencies) // 2], 1) if latencies else None,
+        "latency_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None,
+        "model_mb": round(loaded_mb - baseline_mb, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "char_accuracy": round(1 - statistics.fmean(cers), 4) if cers else None,
+        "word_accuracy": round(1 - statistics.fmean(wers), 4) if wers else None,
+    }
+
+
+def print_table(results: List[dict]):
+    columns = [
+        ("engine", "engine"), ("pages", "pages"), ("load_ms", "load ms"),
+        ("latency_p50_ms", "p50 ms"), ("latency_p95_ms", "p95 ms"),
+        ("model_mb", "model MB"), ("peak_rss_mb", "peak MB"),
+        ("char_accuracy", "char acc"), ("word_accuracy", "word acc"),
+    ]
+    rows = [[label for _, label in columns]]
+    for result in results:
+        if not result["available"]:
+            rows.append([result["engine"], "not installed"] + [""] * (len(columns) - 2))
+            continue
+        rows.append(["-" if result[key] is None else str(result[key]) for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare OCR engines on a sample set")
+    parser.add_argument("samples_dir", type=Path, help="Directory of PDFs/images (+ optional .txt references)")
+    parser.add_argument("--engines", default="paddle,onnx,tesseract", help="Comma-separated engine names")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per page")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.samples_dir.is_dir():
+        parser.error(f"Not a directory: {args.samples_dir}")
+
+    results = []
+    for engine in re.split(r"\s*,\s*", args.engines.strip()):
+        # spawn: a clean interpreter per engine, so memory is measured in isolation
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(benchmark_engine, engine, str(args.samples_dir), args.repeat).result())
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Analysis pipeline: uploads longer than ANALYSIS_MAX_PAGES.
+"""
+import asyncio
+import fitz
+from app.services import analysis_pipeline
+
+
+def make_pdf(pages: int) -> bytes:
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page(width=300, height=200)
+        page.insert_text((40, 100), f"Certificate page {number + 1}", fontsize=14)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def test_pages_past_the_limit_are_reported(monkeypatch):
+    monkeypatch.setattr(analysis_pipeline, "ANALYSIS_MAX_PAGES", 2)
+    monkeypatch.setattr(analysis_pipeline, "RESULT_CACHE_ENABLED", False)
+
+    response = asyncio.run(analysis_pipeline.analyze_pdf(make_pdf(3), analyzers=["metadata"]))
+
+    assert response.page_count == 3
+    assert response.analyzed_pages == 2
+    assert "Only the first 2 of 3 pages were analyzed" in response.trust_evaluation.reasons
+
+
+def test_short_upload_has_no_page_limit_reason(monkeypatch):
+    monkeypatch.setattr(analysis_pipeline, "RESULT_CACHE_ENABLED", False)
+
+    response = asyncio.run(analysis_pipeline.analyze_pdf(make_pdf(2), analyzers=["metadata"]))
+
+    assert response.analyzed_pages == response.page_count == 2
+    assert not any("pages were analyzed" in reason for reason in response.trust_evaluation.reasons)
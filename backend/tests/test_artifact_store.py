@@ -0,0 +1,82 @@
+"""
+Artifact store: encoded storage, transcoding and the disk tier.
+"""
+import os
+import numpy as np
+from app.services.artifact_store import ArtifactStore, decode_artifact, render_artifact
+
+
+def make_artifacts(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    preview = np.full((300, 400, 3), 240, np.uint8)
+    preview[50:250, 50:350] = rng.integers(0, 255, (1, 1, 3), dtype=np.uint8)
+    return {
+        "preview": preview,
+        "heatmap": np.zeros((300, 400, 3), np.uint8),
+        "grid": rng.integers(0, 256, (35, 50), dtype=np.uint8),
+    }
+
+
+def test_artifacts_are_stored_encoded():
+    store = ArtifactStore(max_bytes=1 << 20)
+    artifacts = make_artifacts()
+
+    store.put("a", artifacts)
+    stored = store.get("a")
+
+    assert all(isinstance(data, bytes) for data in stored.values())
+    assert store.stats()["size_bytes"] < sum(pixels.nbytes for pixels in artifacts.values()) / 10
+    # The grid is lossless, images come back close to the original
+    np.testing.assert_array_equal(decode_artifact("grid", stored["grid"]), artifacts["grid"])
+    preview = decode_artifact("preview", stored["preview"])
+    assert preview.shape == artifacts["preview"].shape
+    assert np.abs(preview.astype(int) - artifacts["preview"]).mean() < 3
+
+
+def test_render_serves_stored_bytes_or_transcodes():
+    store = ArtifactStore(max_bytes=1 << 20)
+    store.put("a", make_artifacts())
+    data = store.get("a")["preview"]
+
+    assert render_artifact("preview", data, "webp", 80) == (data, "image/webp")
+    content, media_type = render_artifact("preview", data, "png", 80, max_dim=100)
+    assert media_type == "image/png"
+    assert content[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_disk_tier_survives_eviction_and_restart(tmp_path):
+    store = ArtifactStore(max_bytes=1, disk_dir=tmp_path)  # too small to keep anything in memory
+    store.put("a", make_artifacts())
+
+    restarted = ArtifactStore(max_bytes=1 << 20, disk_dir=tmp_path)
+    stored = restarted.get("a")
+
+    assert set(stored) == {"preview", "heatmap", "grid"}
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("missing") is None
+
+
+def test_memory_tier_evicts_least_recently_used():
+    store = ArtifactStore(max_bytes=1 << 20)
+    store.put("a", make_artifacts())
+    store.max_bytes = store.stats()["size_bytes"] * 2
+    store.put("b", make_artifacts())
+    store.put("c", make_artifacts())
+
+    assert store.get("a") is None
+    assert store.stats()["evictions"] == 1
+
+
+def test_disk_tier_prunes_whole_analyses(tmp_path):
+    store = ArtifactStore(max_bytes=1, disk_dir=tmp_path)
+    store.put("a", make_artifacts(0))
+    size = sum(path.stat().st_size for path in tmp_path.iterdir())
+    for path in tmp_path.iterdir():
+        os.utime(path, ns=(10**9, 10**9))
+
+    bounded = ArtifactStore(max_bytes=1, disk_dir=tmp_path, disk_max_bytes=int(size * 1.5))
+    bounded.put("b", make_artifacts(1))
+
+    assert bounded.get("a") is None
+    assert set(bounded.get("b")) == {"preview", "heatmap", "grid"}
+    assert bounded.stats()["disk_evictions"] == 1
@@ -0,0 +1,84 @@
+"""
+Copy-move detection on a rendered text page.
+"""
+import cv2
+import fitz
+import numpy as np
+import pytest
+from app.services.copy_move import detect_copy_move
+from app.utils.page_raster import PageRaster
+
+WORDS = [
+    "certificate", "awarded", "completion", "university", "course", "program",
+    "hereby", "certifies", "honours", "degree", "faculty", "registrar", "with",
+]
+
+
+@pytest.fixture(scope="module")
+def page() -> np.ndarray:
+    """A rendered A4 page of running text with a title, RGB at 110 dpi."""
+    rng = np.random.default_rng(0)
+    document = fitz.open()
+    pdf_page = document.new_page()
+    pdf_page.insert_text((72, 90), "Certificate of Completion", fontsize=24, fontname="helv")
+    for line in range(20):
+        text = " ".join(rng.choice(WORDS, 8))
+        pdf_page.insert_text((72, 140 + 16 * line), text, fontsize=11, fontname="tiro")
+    pdf_page.draw_line((72, 480), (520, 480))
+    for line in range(3):
+        pdf_page.insert_text((72, 700 + 18 * line), " ".join(rng.choice(WORDS, 4)), fontsize=13, fontname="hebo")
+    pixmap = pdf_page.get_pixmap(dpi=110)
+    document.close()
+    return np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)[:, :, :3].copy()
+
+
+def make_seal(size: int = 180) -> np.ndarray:
+    seal = np.full((size, size, 3), 255, np.uint8)
+    center = size // 2
+    cv2.circle(seal, (center, center), center - 5, (30, 30, 160), 3)
+    cv2.circle(seal, (center, center), center - 25, (30, 30, 160), 2)
+    cv2.putText(seal, "SEAL", (center - 45, center + 10), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 160), 2)
+    return seal
+
+
+def contains(box, x, y, width, height, page_shape, tolerance=0.03):
+    """Whether a normalized box covers the pixel rectangle (within tolerance)."""
+    page_h, page_w = page_shape[:2]
+    return (
+        box[0] <= x / page_w + tolerance and box[1] <= y / page_h + tolerance
+        and box[2] >= (x + width) / page_w - tolerance and box[3] >= (y + height) / page_h - tolerance
+    )
+
+
+def test_clean_page_has_no_copies(page):
+    assert detect_copy_move(PageRaster(page)) == []
+
+
+def test_duplicated_seal_is_found(page):
+    forged = page.copy()
+    seal = make_seal()
+    forged[760:940, 90:270] = seal
+    forged[760:940, 620:800] = seal
+
+    regions = detect_copy_move(PageRaster(forged))
+
+    assert len(regions) == 1
+    assert contains(regions[0]["source"], 90, 760, 180, 180, forged.shape)
+    assert contains(regions[0]["target"], 620, 760, 180, 180, forged.shape)
+
+
+@pytest.mark.parametrize("quality", [None, 75])
+def test_copied_text_block_is_found(page, quality):
+    forged = page.copy()
+    # Two lines of the signature block pasted into the blank area
+    forged[800:856, 140:500] = page[1048:1104, 100:460]
+    if quality is not None:
+        _, encoded = cv2.imencode(".jpg", forged, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        forged = cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+
+    regions = detect_copy_move(PageRaster(forged))
+
+    assert len(regions) == 1
+    boxes = sorted([regions[0]["source"], regions[0]["target"]], key=lambda box: box[1])
+    assert contains(boxes[0], 140, 800, 360, 56, forged.shape, tolerance=0.05)
+    assert contains(boxes[1], 100, 1048, 360, 56, forged.shape, tolerance=0.05)
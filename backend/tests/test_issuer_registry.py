@@ -0,0 +1,55 @@
+"""
+Issuer lookup by verification URL host and path prefix.
+"""
+import json
+import pytest
+from app.config import ISSUER_REGISTRY_PATH
+from app.services.issuer_registry import IssuerRegistry
+
+
+@pytest.fixture
+def registry():
+    return IssuerRegistry([
+        {"name": "Example", "hosts": ["example.org"], "path_prefixes": ["/verify/"]},
+        {"name": "Example Badges", "hosts": ["example.org"], "path_prefixes": ["/verify/badges/"]},
+        {"name": "Example Labs", "hosts": ["labs.example.org"], "path_prefixes": ["/certs/"]},
+        {"name": "Anywhere", "hosts": ["anywhere.test"]},
+    ])
+
+
+@pytest.mark.parametrize("url, issuer", [
+    ("https://example.org/verify/123", "Example"),
+    ("https://www.example.org/verify/123", "Example"),
+    ("https://EXAMPLE.org./verify/123", "Example"),
+    ("https://learn.example.org/verify/123", "Example"),
+    ("http://a.b.example.org/verify/123", "Example"),
+    # Longest matching prefix wins, whatever the registration order
+    ("https://example.org/verify/badges/9", "Example Badges"),
+    # A subdomain with its own entry takes precedence over its parent
+    ("https://labs.example.org/certs/7", "Example Labs"),
+    ("https://labs.example.org/verify/7", "Example"),
+    # No path prefixes registers the whole host
+    ("https://anywhere.test/whatever", "Anywhere"),
+])
+def test_lookup_matches(registry, url, issuer):
+    assert registry.lookup(url) == issuer
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.org/about",
+    "https://example.org/verifyx/1",
+    "https://badexample.org/verify/1",
+    "https://example.org.evil.test/verify/1",
+    "ftp://example.org/verify/1",
+    "example.org/verify/1",
+    "https://[bad/verify/1",
+])
+def test_lookup_misses(registry, url):
+    assert registry.lookup(url) is None
+
+
+def test_bundled_registry_has_no_catch_all_entries():
+    with open(ISSUER_REGISTRY_PATH, encoding="utf-8") as f:
+        entries = json.load(f)["issuers"]
+
+    assert all(entry.get("path_prefixes") and "/" not in entry["path_prefixes"] for entry in entries)
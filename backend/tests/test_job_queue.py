@@ -0,0 +1,87 @@
+"""
+Job queue leases: heartbeats, stale-job recovery and progress writes.
+"""
+import asyncio
+import time
+import pytest
+from app.services import job_queue
+from app.services.job_queue import JobQueue, ProgressWriter
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", tmp_path / "jobs", concurrency=1, max_attempts=2, lease_seconds=1)
+    yield queue
+    queue._conn.close()
+
+
+def set_heartbeat(queue: JobQueue, job_id: str, heartbeat_at: float):
+    queue._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (heartbeat_at, job_id))
+
+
+def test_recover_stale_requeues_or_fails_expired_jobs(queue):
+    retried = queue.submit("a.pdf", b"%PDF a")
+    exhausted = queue.submit("b.pdf", b"%PDF b")
+    alive = queue.submit("c.pdf", b"%PDF c")
+    ours = queue.submit("d.pdf", b"%PDF d")
+    for _ in range(4):
+        queue.claim()
+    queue._conn.execute("UPDATE jobs SET attempts = 2 WHERE id = ?", (exhausted,))
+    for job_id in (retried, exhausted, ours):
+        set_heartbeat(queue, job_id, time.time() - 10)
+
+    assert queue.recover_stale(exclude=[ours]) == 2
+
+    assert queue.get(retried)["status"] == "queued"
+    assert queue.get(exhausted)["status"] == "failed"
+    assert not queue._pdf_path(exhausted).exists()
+    assert queue.get(alive)["status"] == "running"
+    assert queue.get(ours)["status"] == "running"
+    # Already recovered: a second pass finds nothing
+    assert queue.recover_stale(exclude=[ours]) == 0
+
+
+def test_progress_writer_records_transitions_in_order(queue):
+    job_id = queue.submit("a.pdf", b"%PDF")
+
+    async def run():
+        progress = ProgressWriter(queue, job_id)
+        for stage in ("render", "ocr", "qr"):
+            progress(stage, "running")
+            progress(stage, "done")
+        progress("logo", "running")
+        await progress.flushed()
+
+    asyncio.run(run())
+
+    recorded = queue.get(job_id)["progress"]
+    assert recorded["render"] == recorded["ocr"] == recorded["qr"] == "done"
+    assert recorded["logo"] == "running"
+    assert recorded["scoring"] == "pending"
+
+
+def test_running_jobs_keep_their_lease(queue, monkeypatch):
+    async def slow_analysis(file_content, progress=None, ocr_engine=None):
+        progress("render", "running")
+        # Longer than the lease, without any further progress
+        await asyncio.sleep(2.5)
+        raise job_queue.AnalysisError("done waiting")
+
+    monkeypatch.setattr(job_queue, "analyze_pdf", slow_analysis)
+    job_id = queue.submit("a.pdf", b"%PDF")
+
+    async def run():
+        queue.start()
+        try:
+            await asyncio.sleep(2.0)
+            # Another process looking for stale jobs must not take it over
+            return queue.recover_stale(), queue.get(job_id)
+        finally:
+            await queue.stop()
+
+    recovered, job = asyncio.run(run())
+
+    assert recovered == 0
+    assert job["status"] == "running"
+    assert job["attempts"] == 1
+    assert time.time() - job["heartbeat_at"] < 1
@@ -0,0 +1,123 @@
+"""
+Logo detection on pages with a reference logo pasted into running text.
+"""
+import cv2
+import numpy as np
+import pytest
+from app.services import logo_detection
+from app.services.logo_index import LogoIndex
+from app.services.logo_store import ReferenceLogo, DETECTION_WIDTH
+from app.utils.page_raster import PageRaster
+
+
+def make_seal(seed: int, size: int = 240) -> np.ndarray:
+    """A synthetic issuer seal: rings, a star and lettering around the rim."""
+    rng = np.random.default_rng(seed)
+    seal = np.full((size, size), 255, np.uint8)
+    center = size // 2
+    cv2.circle(seal, (center, center), center - 4, 0, 3)
+    cv2.circle(seal, (center, center), center - 22, 0, 2)
+    points = int(rng.integers(5, 9))
+    angles = np.linspace(0, 2 * np.pi, 2 * points, endpoint=False) + rng.uniform(0, 1)
+    radii = np.where(np.arange(2 * points) % 2 == 0, center - 40, rng.uniform(25, 45))
+    star = np.stack([center + radii * np.cos(angles), center + radii * np.sin(angles)], axis=1)
+    cv2.fillPoly(seal, [star.astype(np.int32)], int(rng.integers(0, 120)))
+    letters = [chr(65 + int(i)) for i in rng.integers(0, 26, 14)]
+    for i, letter in enumerate(letters):
+        angle = 2 * np.pi * i / len(letters)
+        x = int(center + (center - 14) * np.cos(angle)) - 6
+        y = int(center + (center - 14) * np.sin(angle)) + 5
+        cv2.putText(seal, letter, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, 0, 1)
+    return seal
+
+
+def make_text_page(width: int = 1200, height: int = 850) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    page = np.full((height, width), 250, np.uint8)
+    words = ["certificate", "awarded", "completion", "university", "course", "program", "date"]
+    for y in range(60, height - 30, 40):
+        cv2.putText(page, " ".join(rng.choice(words, 6)), (40, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+    return page
+
+
+class FakeStore:
+    def __init__(self, logos):
+        self.logos = logos
+        self.fingerprint = str(len(logos))
+
+
+@pytest.fixture
+def catalog(monkeypatch, request):
+    """A store and index of request.param synthetic seals, wired into logo_detection."""
+    logos = {
+        f"seal{i}": ReferenceLogo(f"seal{i}", f"seal{i}.png", 1, i, make_seal(i))
+        for i in range(request.param)
+    }
+    store = FakeStore(logos)
+    index = LogoIndex.build(logos, store.fingerprint)
+    monkeypatch.setattr(logo_detection, "get_logo_store", lambda: store)
+    monkeypatch.setattr(logo_detection, "get_logo_index", lambda: index)
+    monkeypatch.setattr(logo_detection, "LOGO_MATCHER", "index")
+    return logos
+
+
+def paste(page: np.ndarray, logo: np.ndarray, scale: float, x: int, y: int) -> PageRaster:
+    logo = cv2.resize(logo, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    page = page.copy()
+    page[y:y + logo.shape[0], x:x + logo.shape[1]] = logo
+    return PageRaster(cv2.cvtColor(page, cv2.COLOR_GRAY2RGB))
+
+
+@pytest.mark.parametrize("catalog", [1, 20], indirect=True)
+@pytest.mark.parametrize("scale", [1.0, 0.75, 0.5])
+def test_index_finds_pasted_logo(catalog, scale):
+    name = f"seal{len(catalog) // 2}"
+    raster = paste(make_text_page(), catalog[name].gray, scale, 800, 420)
+
+    result = logo_detection.detect_logos(raster)
+
+    assert result.matches, "pasted logo not found"
+    best = result.matches[0]
+    assert best.name == name
+    assert best.confidence >= 0.7
+    assert not result.flag
+    assert best.scale == pytest.approx(scale, rel=0.05)
+    x0, y0, x1, y1 = best.box
+    size = 240 * scale
+    assert x0 * raster.width == pytest.approx(800, abs=size * 0.1)
+    assert y0 * raster.height == pytest.approx(420, abs=size * 0.1)
+    assert x1 * raster.width == pytest.approx(800 + size, abs=size * 0.1)
+    assert y1 * raster.height == pytest.approx(420 + size, abs=size * 0.1)
+
+
+@pytest.mark.parametrize("catalog", [20], indirect=True)
+def test_text_page_without_logo_has_no_match(catalog):
+    raster = PageRaster(cv2.cvtColor(make_text_page(), cv2.COLOR_GRAY2RGB))
+
+    assert logo_detection.detect_logos(raster).matches == []
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.75, 0.5])
+def test_pyramid_recovers_logo_scale(scale):
+    logo = ReferenceLogo("seal", "seal.png", 1, 0, make_seal(10))
+    raster = paste(make_text_page(), logo.gray, scale, 800, 420)
+    page = raster.downscaled_to_width(DETECTION_WIDTH, cv2.INTER_LINEAR)
+
+    found = logo_detection.match_logo_pyramid(page.gray_pyramid(logo_detection.PYRAMID_LEVELS), logo)
+
+    assert found is not None
+    assert found["scale"] * raster.width / page.width == pytest.approx(scale, rel=0.015)
+    assert found["confidence"] >= 0.9
+
+
+def test_index_save_load_round_trip(tmp_path):
+    logos = {f"seal{i}": ReferenceLogo(f"seal{i}", f"seal{i}.png", 1, i, make_seal(i)) for i in range(3)}
+    index = LogoIndex.build(logos, "fingerprint")
+    path = tmp_path / "logo_index.npz"
+
+    index.save(path)
+    loaded = LogoIndex.load(path)
+
+    assert loaded.names == index.names
+    np.testing.assert_array_equal(loaded.points, index.points)
+    np.testing.assert_array_equal(loaded.descriptors, index.descriptors)
@@ -0,0 +1,85 @@
+"""
+Reference logo store: incremental reloads, undecodable files and logo naming.
+"""
+import os
+import cv2
+import numpy as np
+from app.services import logo_store
+from app.services.logo_store import LogoStore
+
+
+def write_logo(path, value: int = 0):
+    image = np.full((40, 60), 255, np.uint8)
+    cv2.rectangle(image, (10, 10), (50, 30), value, -1)
+    assert cv2.imwrite(str(path), image)
+
+
+def test_refresh_loads_only_changed_files(tmp_path):
+    write_logo(tmp_path / "a.png")
+    write_logo(tmp_path / "b.png")
+    store = LogoStore(tmp_path)
+
+    assert store.refresh()
+    assert sorted(store.logos) == ["a", "b"]
+    first = store.logos["a"]
+    assert not store.refresh()
+
+    write_logo(tmp_path / "b.png", 100)
+    os.utime(tmp_path / "b.png", ns=(1, 1))
+    assert store.refresh()
+    assert store.logos["a"] is first
+    assert store.logos["b"].mtime_ns == 1
+
+    os.remove(tmp_path / "b.png")
+    assert store.refresh()
+    assert list(store.logos) == ["a"]
+
+
+def test_undecodable_file_is_not_read_again_until_it_changes(tmp_path, monkeypatch):
+    write_logo(tmp_path / "good.png")
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    reads = []
+    imread = cv2.imread
+    monkeypatch.setattr(logo_store.cv2, "imread", lambda path, *args: reads.append(path) or imread(path, *args))
+    store = LogoStore(tmp_path)
+
+    assert store.refresh()
+    assert list(store.logos) == ["good"]
+    fingerprint = store.fingerprint
+    reads.clear()
+    assert not store.refresh()
+    assert reads == []
+    assert store.fingerprint == fingerprint
+
+    write_logo(tmp_path / "broken.png")
+    os.utime(tmp_path / "broken.png", ns=(2, 2))
+    assert store.refresh()
+    assert reads == [str(tmp_path / "broken.png")]
+    assert sorted(store.logos) == ["broken", "good"]
+
+
+def test_files_sharing_a_stem_are_kept_apart(tmp_path):
+    write_logo(tmp_path / "seal.png")
+    store = LogoStore(tmp_path)
+    store.refresh()
+    assert list(store.logos) == ["seal"]
+
+    write_logo(tmp_path / "seal.jpg", 100)
+    store.refresh()
+    assert sorted(store.logos) == ["seal.jpg", "seal.png"]
+    assert store.logos["seal.png"].path == str(tmp_path / "seal.png")
+
+    os.remove(tmp_path / "seal.jpg")
+    store.refresh()
+    assert list(store.logos) == ["seal"]
+
+
+def test_stop_watcher_ends_the_thread(tmp_path):
+    store = LogoStore(tmp_path)
+    store.start_watcher(interval=60)
+    watcher = store._watcher
+
+    store.stop_watcher()
+
+    assert not watcher.is_alive()
+    assert store._watcher is None
@@ -0,0 +1,79 @@
+"""
+OCR recognition batching: batched results and shutdown behaviour.
+"""
+import threading
+import numpy as np
+import pytest
+from app.services.ocr_batcher import OCRBatcher
+
+
+def crops(*values):
+    return [np.full((4, 4), value, np.uint8) for value in values]
+
+
+def echo(batch):
+    return [(str(int(crop[0, 0])), 1.0) for crop in batch]
+
+
+def test_recognize_returns_lines_in_order():
+    batcher = OCRBatcher(echo, max_batch_size=2)
+    try:
+        assert batcher.recognize(crops(1, 2, 3)) == [("1", 1.0), ("2", 1.0), ("3", 1.0)]
+    finally:
+        batcher.stop()
+    assert batcher.stats()["lines"] == 3
+
+
+def test_recognize_after_stop_raises():
+    batcher = OCRBatcher(echo)
+    batcher.recognize(crops(1))
+    batcher.stop()
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        batcher.recognize(crops(2))
+
+
+def test_stop_fails_lines_the_worker_never_took():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(batch):
+        started.set()
+        release.wait(5)
+        return echo(batch)
+
+    batcher = OCRBatcher(slow, max_batch_size=1)
+    results = {}
+
+    def call(name, value):
+        try:
+            results[name] = batcher.recognize(crops(value))
+        except RuntimeError as e:
+            results[name] = e
+
+    first = threading.Thread(target=call, args=("first", 1))
+    first.start()
+    assert started.wait(5)
+    # Make the worker exit after the current batch, leaving the next line
+    # queued with nobody to take it
+    batcher._queue.put(None)
+    second = threading.Thread(target=call, args=("second", 2))
+    second.start()
+    while batcher.stats()["queue_depth"] < 2:
+        pass
+    release.set()
+    first.join(5)
+    batcher.stop()
+    second.join(5)
+
+    assert not second.is_alive()
+    assert results["first"] == [("1", 1.0)]
+    assert isinstance(results["second"], RuntimeError)
+
+
+def test_short_recognizer_result_fails_every_line():
+    batcher = OCRBatcher(lambda batch: echo(batch)[:-1], max_batch_size=4)
+    try:
+        with pytest.raises(RuntimeError, match="results for"):
+            batcher.recognize(crops(1, 2, 3))
+    finally:
+        batcher.stop()
@@ -0,0 +1,48 @@
+"""
+PdfDocumentSession locking: one lock per document, not one for all of them.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import fitz
+from app.services.pdf_document import PdfDocumentSession
+
+
+def make_pdf(pages: int, label: str) -> bytes:
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 100), f"{label} page {number}", fontsize=28)
+        page.draw_circle((300, 400), 40 + 10 * number)
+    content = document.tobytes()
+    document.close()
+    return content
+
+
+def digest(session: PdfDocumentSession, page_number: int) -> str:
+    return hashlib.md5(session.render_page(page_number, max_dim=400).rgb.tobytes()).hexdigest()
+
+
+def test_documents_do_not_share_a_lock():
+    with PdfDocumentSession(make_pdf(1, "a")) as busy, PdfDocumentSession(make_pdf(1, "b")) as other:
+        rendered = threading.Event()
+        with busy._lock:
+            # Another thread renders its own document while this one is held
+            thread = threading.Thread(target=lambda: (other.render_page(0, max_dim=200), rendered.set()))
+            thread.start()
+            assert rendered.wait(timeout=10)
+        thread.join()
+
+
+def test_concurrent_renders_match_sequential_ones():
+    contents = [make_pdf(3, label) for label in ("first", "second", "third")]
+    with PdfDocumentSession(contents[0]) as a, PdfDocumentSession(contents[1]) as b, \
+            PdfDocumentSession(contents[2]) as c:
+        sessions = [a, b, c]
+        expected = {(i, page): digest(session, page) for i, session in enumerate(sessions) for page in range(3)}
+        jobs = [(i, page) for _ in range(4) for i in range(3) for page in range(3)]
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda job: digest(sessions[job[0]], job[1]), jobs))
+
+        assert results == [expected[job] for job in jobs]
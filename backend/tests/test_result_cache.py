@@ -0,0 +1,52 @@
+"""
+Result cache: the size-bounded disk tier.
+"""
+import os
+from app.models.schemas import (
+    CertificateAnalysisResponse, OCRData, MetadataData, QRData, LogoDetectionData,
+    TamperReport, TrustEvaluation
+)
+from app.services.result_cache import AnalysisResultCache
+
+
+def make_response(text: str) -> CertificateAnalysisResponse:
+    return CertificateAnalysisResponse(
+        ocr=OCRData(raw_text=text), metadata=MetadataData(), qr=QRData(),
+        logo_detection=LogoDetectionData(), tamper_report=TamperReport(), trust_evaluation=TrustEvaluation(),
+    )
+
+
+def age(path, seconds: int):
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+def test_disk_tier_prunes_least_recently_used(tmp_path):
+    entry_size = len(make_response("x" * 1000).model_dump_json())
+    # Memory holds nothing, disk holds three entries
+    cache = AnalysisResultCache(max_bytes=1, disk_dir=tmp_path, disk_max_bytes=entry_size * 3)
+    for i, key in enumerate("abc"):
+        cache.put(key, make_response(key * 1000))
+        age(tmp_path / f"{key}.json", i + 1)
+    # A disk hit makes "a" the most recently used
+    assert cache.get("a").ocr.raw_text == "a" * 1000
+
+    cache.put("d", make_response("d" * 1000))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.json", "d.json"]
+    assert cache.get("b") is None
+    assert cache.stats()["disk_evictions"] == 2
+    assert cache.stats()["disk_size_bytes"] <= entry_size * 3
+
+
+def test_disk_cap_applies_to_entries_from_earlier_runs(tmp_path):
+    cache = AnalysisResultCache(max_bytes=1 << 20, disk_dir=tmp_path)
+    for i, key in enumerate("abc"):
+        cache.put(key, make_response(key * 1000))
+        age(tmp_path / f"{key}.json", i + 1)
+    (tmp_path / "artifacts").mkdir()
+
+    entry_size = (tmp_path / "a.json").stat().st_size
+    restarted = AnalysisResultCache(max_bytes=1 << 20, disk_dir=tmp_path, disk_max_bytes=entry_size * 2)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["artifacts", "b.json", "c.json"]
+    assert restarted.get("c").ocr.raw_text == "c" * 1000
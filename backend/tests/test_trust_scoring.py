@@ -0,0 +1,65 @@
+"""
+Trust score weighting over the stages that ran, and the cascade's bounds.
+"""
+import pytest
+from app.models.schemas import MetadataData, QRData, TamperReport, LogoDetectionData, LogoMatch
+from app.services.trust_scoring import (
+    calculate_trust_score, score_bounds, stage_scores, verdict_settled
+)
+
+
+def test_single_clean_stage_scores_its_own_score():
+    clean = MetadataData(created_date="2024-01-01", flags=[])
+
+    evaluation = calculate_trust_score(metadata=clean)
+
+    assert evaluation.trust_score == 100
+    assert evaluation.verdict == "Valid"
+
+
+def test_skipped_stages_share_their_weight():
+    scores = stage_scores(qr_data=QRData(found=True, validation="valid"), tamper_report=TamperReport(score=0.5))
+
+    low, high = score_bounds(scores)
+
+    # qr 100 (weight 0.20) and tamper 50 (weight 0.25)
+    assert low == high == pytest.approx((100 * 0.20 + 50 * 0.25) / 0.45)
+
+
+def test_no_stage_is_neutral():
+    assert score_bounds({}) == (50.0, 50.0)
+
+
+def test_pending_stages_span_their_range():
+    scores = stage_scores(
+        metadata=MetadataData(created_date="2024-01-01", flags=[]),
+        qr_data=QRData(found=True, validation="valid"),
+        tamper_report=TamperReport(score=0.0),
+    )
+
+    low, high = score_bounds(scores, pending=["logo", "ocr"])
+
+    assert low == pytest.approx((100 * 0.6 + 25 * 0.2) / 1.0)
+    assert high == pytest.approx(100)
+    assert not verdict_settled(scores, ["logo", "ocr"])
+
+
+def test_cascade_settles_clearly_fake_documents_early():
+    scores = stage_scores(
+        metadata=MetadataData(flags=["a", "b", "c", "d", "e"]),
+        qr_data=QRData(found=True, validation="invalid"),
+        tamper_report=TamperReport(score=1.0),
+    )
+
+    assert verdict_settled(scores, ["logo", "ocr"])
+
+
+def test_last_pending_stage_settles_within_its_range():
+    scores = stage_scores(
+        metadata=MetadataData(created_date="2024-01-01", flags=[]),
+        qr_data=QRData(found=True, validation="valid"),
+        logo_data=LogoDetectionData(matches=[LogoMatch(name="seal", confidence=0.9, box=[0, 0, 1, 1])]),
+        tamper_report=TamperReport(score=0.0),
+    )
+
+    assert verdict_settled(scores, ["ocr"])
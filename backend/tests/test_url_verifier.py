@@ -0,0 +1,150 @@
+"""
+URL verification against a local stub HTTP server.
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services import url_verifier
+from app.services.url_verifier import UrlVerifier
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /ok answers 200, /missing 404, /no-head-405 and /no-head-501 reject HEAD
+    with that status and answer GET with 200; /slow holds each request
+    for a moment. Requests and peak concurrency are recorded on the server.
+    """
+
+    def do_HEAD(self):
+        self.respond()
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            path = self.path.split("?")[0]
+            if path == "/slow":
+                time.sleep(0.2)
+            if path.startswith("/no-head-") and self.command == "HEAD":
+                status = int(path.rsplit("-", 1)[1])
+            elif path == "/missing":
+                status = 404
+            else:
+                status = 200
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(url_verifier, "QR_VERIFY_MAX_CONNECTIONS", 16)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.active = httpd.peak = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def run(coroutine_function):
+    """Run coroutine_function(verifier) with a fresh verifier on a new loop."""
+    async def main():
+        verifier = UrlVerifier()
+        try:
+            return await coroutine_function(verifier)
+        finally:
+            await verifier.aclose()
+    return asyncio.run(main())
+
+
+def test_valid_and_invalid_urls(server):
+    async def check(verifier):
+        return await verifier.verify(f"{server.url}/ok"), await verifier.verify(f"{server.url}/missing")
+
+    assert run(check) == (("valid", False), ("invalid", False))
+    assert server.requests == [("HEAD", "/ok"), ("HEAD", "/missing")]
+
+
+@pytest.mark.parametrize("status", [405, 501])
+def test_head_unsupported_falls_back_to_get(server, status):
+    path = f"/no-head-{status}"
+
+    result = run(lambda verifier: verifier.verify(server.url + path))
+
+    assert result == ("valid", False)
+    assert server.requests == [("HEAD", path), ("GET", path)]
+
+
+def test_outcomes_are_cached_until_their_ttl(server, monkeypatch):
+    monkeypatch.setattr(url_verifier, "QR_VERIFY_CACHE_TTL", 60)
+    monkeypatch.setattr(url_verifier, "QR_VERIFY_NEGATIVE_TTL", 10)
+    now = [1000.0]
+    monkeypatch.setattr(url_verifier, "time", type("Clock", (), {"monotonic": staticmethod(lambda: now[0])}))
+
+    async def check(verifier):
+        results = [await verifier.verify(f"{server.url}/ok"), await verifier.verify(f"{server.url}/missing")]
+        now[0] += 30  # past the negative TTL only
+        results += [await verifier.verify(f"{server.url}/ok"), await verifier.verify(f"{server.url}/missing")]
+        now[0] += 31  # past the positive TTL too
+        results.append(await verifier.verify(f"{server.url}/ok"))
+        return results, verifier.stats()
+
+    results, stats = run(check)
+
+    assert results == [
+        ("valid", False), ("invalid", False),
+        ("valid", True), ("invalid", False),
+        ("valid", False),
+    ]
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+    assert len(server.requests) == 4
+
+
+def test_negative_outcomes_are_cached(server, monkeypatch):
+    monkeypatch.setattr(url_verifier, "QR_VERIFY_NEGATIVE_TTL", 60)
+
+    async def check(verifier):
+        return [await verifier.verify(f"{server.url}/missing") for _ in range(3)]
+
+    assert run(check) == [("invalid", False), ("invalid", True), ("invalid", True)]
+    assert server.requests == [("HEAD", "/missing")]
+
+
+def test_concurrent_checks_of_one_url_share_a_request(server):
+    async def check(verifier):
+        return await asyncio.gather(*(verifier.verify(f"{server.url}/slow") for _ in range(5)))
+
+    assert run(check) == [("valid", False)] * 5
+    assert server.requests == [("HEAD", "/slow")]
+
+
+def test_requests_per_host_are_limited(server, monkeypatch):
+    monkeypatch.setattr(url_verifier, "QR_VERIFY_PER_HOST", 2)
+
+    async def check(verifier):
+        return await asyncio.gather(*(verifier.verify(f"{server.url}/slow?{i}") for i in range(6)))
+
+    assert run(check) == [("valid", False)] * 6
+    assert len(server.requests) == 6
+    assert server.peak == 2
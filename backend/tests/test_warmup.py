@@ -0,0 +1,82 @@
+"""
+Warm-up readiness: OCR engines that fail to load or to read aren't ready.
+"""
+import asyncio
+import pytest
+from app.models.schemas import OCRData
+from app.services import process_workers, warmup
+
+
+class FailingBackend:
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    def load(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("model download timed out")
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    def install(failures: int) -> FailingBackend:
+        backend = FailingBackend(failures)
+        monkeypatch.setattr("app.ocr_backends.get_backend", lambda engine: backend)
+        monkeypatch.setattr("app.ocr_backends.resolve_engine", lambda tier=None: "paddle")
+        monkeypatch.setattr(process_workers, "_ocr_load_error", None)
+        return backend
+    return install
+
+
+def test_worker_reports_ocr_load_failure(backend):
+    backend(failures=2)
+    process_workers._load_ocr()
+
+    with pytest.raises(RuntimeError, match="model download timed out"):
+        process_workers.ping()
+
+
+def test_worker_retries_ocr_load_on_ping(backend):
+    backend(failures=1)
+    process_workers._load_ocr()
+
+    assert process_workers.ping() > 0
+    assert process_workers._ocr_load_error is None
+
+
+@pytest.fixture
+def thread_warmup(monkeypatch):
+    """Thread-mode warm-up with the model loads stubbed out and a fresh state."""
+    monkeypatch.setattr(warmup, "ANALYSIS_EXECUTOR_MODE", "thread")
+    monkeypatch.setattr(warmup, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(warmup, "WARMUP_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_DELAY", 0)
+    monkeypatch.setattr(warmup, "get_backend", lambda engine: FailingBackend(0))
+    monkeypatch.setattr(warmup, "get_qr_detector", lambda: None)
+    monkeypatch.setattr(warmup, "get_logo_index", lambda: None)
+    monkeypatch.setattr(warmup, "_state", warmup.WarmupState())
+
+    def analyzers_reading(text: str):
+        async def run_page_analyzers(page, ocr_engine=None):
+            return {"ocr_data": OCRData(raw_text=text), "feature_maps": {}}
+        monkeypatch.setattr(warmup, "run_page_analyzers", run_page_analyzers)
+    return analyzers_reading
+
+
+def test_warmup_fails_when_ocr_reads_nothing(thread_warmup):
+    thread_warmup("")
+
+    asyncio.run(warmup.warm_up())
+
+    state = warmup.get_warmup_state()
+    assert state.status == "failed"
+    assert state.attempts == 2
+    assert "read no text" in state.error
+
+
+def test_warmup_is_ready_when_ocr_reads_the_page(thread_warmup):
+    thread_warmup("CERTIFICATE OF COMPLETION")
+
+    asyncio.run(warmup.warm_up())
+
+    assert warmup.get_warmup_state().ready
@@ -1,5 +1,5 @@
-const HeatmapVisualization = ({ heatmapImage, tamperScore }) => {
-  if (!heatmapImage) return null
+const HeatmapVisualization = ({ heatmapUrl, heatmapImage, tamperScore }) => {
+  if (!heatmapUrl && !heatmapImage) return null
 
   const getScoreColor = (score) => {
     if (score > 0.7) return 'text-red-600 bg-red-50 border-red-300'
@@ -34,7 +34,7 @@ const HeatmapVisualization = ({ heatmapImage, tamperScore }) => {
         {/* Heatmap Image with Overlay */}
         <div className="relative border-2 border-gray-200 rounded-lg overflow-hidden group">
           <img
-            src={`data:image/png;base64,${heatmapImage}`}
+            src={heatmapUrl || `data:image/png;base64,${heatmapImage}`}
             alt="Tamper detection heatmap"
             className="w-full h-auto transition-transform duration-300 group-hover:scale-105"
           />
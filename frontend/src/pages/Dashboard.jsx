@@ -9,7 +9,7 @@ import HeatmapVisualization from '../components/HeatmapVisualization'
 import TrustScore from '../components/TrustScore'
 import VerdictBadge from '../components/VerdictBadge'
 import LoadingSpinner from '../components/LoadingSpinner'
-import { analyzeCertificate } from '../services/api'
+import { analyzeCertificate, artifactUrl } from '../services/api'
 
 const Dashboard = () => {
   const [isProcessing, setIsProcessing] = useState(false)
@@ -121,9 +121,10 @@ const Dashboard = () => {
             </div>
 
             {/* Certificate Preview */}
-            {analysisResult.certificate_preview && (
+            {(analysisResult.analysis_id || analysisResult.certificate_preview) && (
               <div className="animate-fadeIn delay-200">
                 <CertificatePreview
+                  previewUrl={analysisResult.analysis_id && artifactUrl(analysisResult.analysis_id, 'preview')}
                   previewImage={analysisResult.certificate_preview}
                 />
               </div>
@@ -149,6 +150,7 @@ const Dashboard = () => {
             {analysisResult.tamper_report && (
               <div className="animate-fadeIn delay-500">
                 <HeatmapVisualization
+                  heatmapUrl={analysisResult.analysis_id && artifactUrl(analysisResult.analysis_id, 'heatmap')}
                   heatmapImage={analysisResult.tamper_report.heatmap}
                   tamperScore={analysisResult.tamper_report.score}
                 />
@@ -36,6 +36,18 @@ export const analyzeCertificate = async (file) => {
   }
 }
 
+/**
+ * URL of an image kept for an analysis (fetched lazily, cached by the browser)
+ * @param {string} analysisId - analysis_id of a CertificateAnalysisResponse
+ * @param {'preview'|'heatmap'} artifact
+ * @param {Object} [params] - format ('webp'|'jpeg'|'png'), quality, max_dim
+ * @returns {string}
+ */
+export const artifactUrl = (analysisId, artifact, params = {}) => {
+  const query = new URLSearchParams({ format: 'webp', ...params })
+  return `${API_BASE_URL}/api/analyses/${encodeURIComponent(analysisId)}/${artifact}?${query}`
+}
+
 /**
  * Health check endpoint
  * @returns {Promise} Health status
@@ -10,7 +10,12 @@
  * @property {string} issuer
  * @property {string} date
  * @property {string} certificate_id
+ * @property {Object<string, number>} field_confidence - field -> 0..1, for the fields that were found
  * @property {string} raw_text
+ * @property {'text_layer'|'hybrid'|'ocr'} source
+ * @property {string} engine - OCR engine that ran, empty if the text layer sufficed
+ * @property {string} preprocess_profile - none | fast_binarize | denoise_binarize | deskew
+ * @property {number} preprocess_ms
  */
 
 /**
@@ -27,12 +32,17 @@
  * @property {boolean} found
  * @property {string} content
  * @property {'valid'|'invalid'|'unverifiable'} validation
+ * @property {string} issuer - known issuer the URL belongs to, from the issuer registry
+ * @property {''|'registry'|'cache'|'network'} source - what answered the URL check
  */
 
 /**
  * @typedef {Object} LogoMatch
  * @property {string} name
  * @property {number} confidence
+ * @property {number[]} box - x0, y0, x1, y1 as fractions of the page size (empty if unknown)
+ * @property {number} scale - page pixels per reference logo pixel
+ * @property {number} page - index of the page the logo was found on
  */
 
 /**
@@ -41,10 +51,21 @@
  * @property {boolean} flag
  */
 
+/**
+ * @typedef {Object} CopyMoveRegion
+ * @property {number[]} source - x0, y0, x1, y1 as fractions of the page size
+ * @property {number[]} target - where the copy was placed, same units
+ * @property {number} pairs - matched blocks supporting the pair
+ */
+
 /**
  * @typedef {Object} TamperReport
  * @property {number} score
- * @property {string} heatmap - base64 encoded image
+ * @property {string} heatmap - base64 encoded PNG, only with ?include=heatmap (else GET /api/analyses/{analysis_id}/heatmap)
+ * @property {number[][]} grid - anomaly 0..1 per page cell, rows top to bottom
+ * @property {Object<string, number>} signals - strongest robust z-score per signal (noise, ela), copy_move score
+ * @property {CopyMoveRegion[]} copy_move - duplicated regions, strongest first
+ * @property {number[]} page_scores - per page, for multi-page certificates
  */
 
 /**
@@ -54,15 +75,25 @@
  * @property {string[]} reasons
  */
 
+/**
+ * @typedef {Object} AnalysisDiagnostics
+ * @property {Object<string, number>} feature_maps - shared page map -> compute time (ms), summed over pages
+ */
+
 /**
  * @typedef {Object} CertificateAnalysisResponse
- * @property {string} certificate_preview - base64 encoded PNG
+ * @property {string} analysis_id - key of the page images served under /api/analyses/{analysis_id}/{preview|heatmap}
+ * @property {string} certificate_preview - base64 encoded PNG, only with ?include=preview
  * @property {OCRData} ocr
  * @property {MetadataData} metadata
  * @property {QRData} qr
  * @property {LogoDetectionData} logo_detection
  * @property {TamperReport} tamper_report
  * @property {TrustEvaluation} trust_evaluation
+ * @property {number} page_count
+ * @property {number} analyzed_pages - pages checked: the first ANALYSIS_MAX_PAGES of page_count
+ * @property {string[]} skipped_stages - analyzers that didn't run (metadata, qr, tamper, logo, ocr): not selected, or settled by the cascade
+ * @property {AnalysisDiagnostics} diagnostics
  */
 
 export {}